@@ -0,0 +1,361 @@
+"""
+Benchmarks the codec, the server fan-out, the game model and the client rendering
+
+Every benchmark runs a fixed number of operations, --repeat times, and keeps the best run, so that the results are
+comparable across commits on the same machine. The results are printed as JSON, and may be compared with the results
+of a previous run with --compare, a benchmark slower by more than --threshold being reported as a regression.
+
+    comm: comm.send then comm.recv or comm.Decoder over a socket pair, for each message shape and codec
+    server: ClientHandler dispatch and Room broadcast of each action, with 8 players in the room, skipped if the server
+        cannot be imported
+    model: random games of BENCH_STEPS transitions played on model.State, as for the balance simulations
+    render: game.Game.update_display under the SDL dummy video driver, with the hits and misses of game.TEXT_CACHE,
+        skipped if the game cannot be created
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+
+import comm
+import model
+
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+_N_PLAYERS = 8  # See server._N_PLAYERS
+BENCH_STEPS = 100  # The number of transitions of a game in bench_model
+
+MESSAGES = {
+    'token': ['token', 3, [412, 230]],
+    'dices': ['dices', [3, 5]],
+    'draw': ['draw', 2, 1, 7],
+    'event': ['event', 1234, ['token', 3, [412, 230]]],
+    'snapshot': ['snapshot', 1234,
+                 [[455, 270], [60, 430], [446, 291], [90, 430], [425, 300], [120, 430], [404, 291], [150, 430],
+                  [395, 270], [60, 460], [404, 249], [90, 460], [425, 240], [120, 460], [446, 249], [150, 460]],
+                 [3, 5],
+                 [[0, 2, False, []], [2, 1, True, [[2, 4]]], [1, 0, False, []], [0, 4, False, [[0, 1], [2, 7]]],
+                  [2, 3, False, []], [1, 2, True, []], [0, 0, False, []], [1, 3, False, [[0, 12]]]],
+                 [3, 0, 5, 1, 4, 2], 6],
+}
+""" The messages exchanged during a game """
+
+
+def timeit(func, number, repeat):
+    """
+    Args:
+        func (Callable[[int], Any]): runs the benchmarked operation the given number of times
+        number (int): the number of operations per run
+        repeat (int): the number of runs
+
+    Returns:
+        float: the best time per operation, in seconds
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(number)
+        best = min(best, time.perf_counter() - start)
+    return best / number
+
+
+def server_room():
+    """
+    Opens a room on a server that does not listen, with a fixed seed
+
+    Returns:
+        server.Room:
+    """
+    import server
+    return server.Server('', 0, seed=0).room('bench')
+
+
+class BenchTransport:
+    """
+    A transport that only counts the bytes written, to measure the server without the network
+
+    Attributes:
+        written (int)
+    """
+
+    def __init__(self):
+        self.written = 0
+
+    def write(self, data):
+        self.written += len(data)
+
+    def is_closing(self):
+        return False
+
+    def get_write_buffer_size(self):
+        return 0
+
+    def close(self):
+        pass
+
+
+def bench_comm(number, repeat):
+    """
+    Args:
+        number (int): the number of messages per run
+        repeat (int): the number of runs
+
+    Returns:
+        Dict[str, dict]: the time per message and the throughput, by codec, message and receiver
+    """
+    batch = 64  # The messages are sent by batches, to stay under the socket buffer size
+    results = {}
+    a, b = socket.socketpair()
+    try:
+        for codec in comm.CODECS:
+            for name, data in MESSAGES.items():
+                size = len(comm.encode(data, codec))
+                for receiver in ('recv', 'decoder'):
+                    decoder = comm.Decoder()
+
+                    def run(n):
+                        for k in range(0, n, batch):
+                            m = min(batch, n - k)
+                            for _ in range(m):
+                                comm.send(a, data, codec)
+                            for _ in range(m):
+                                comm.recv(b) if receiver == 'recv' else decoder.recv(b)
+
+                    t = timeit(run, number, repeat)
+                    results['{0}.{1}.{2}'.format(codec.NAME, name, receiver)] = {
+                        'us_per_msg': 1e6 * t, 'msgs_per_s': 1 / t, 'bytes_per_msg': size}
+    finally:
+        a.close()
+        b.close()
+    return results
+
+
+def bench_server(number, repeat):
+    """
+    Args:
+        number (int): the number of actions per run
+        repeat (int): the number of runs
+
+    Returns:
+        Dict[str, dict]: the time per action and the bytes sent per action, by client kind and action,
+            or the reason why the benchmark was skipped
+    """
+    try:
+        import server
+    except Exception as e:  # Missing dependency
+        return {'skipped': repr(e)}
+
+    results = {}
+    for kind, codec, features in (('binary-seq', comm.BinaryCodec, ['snapshot', 'seq']),
+                                  ('json-legacy', comm.JsonCodec, [])):
+        room = server_room()
+        s = room.server
+        handlers = []
+        for _ in range(_N_PLAYERS):
+            handler = server.ClientHandler(s)
+            handler.transport = BenchTransport()
+            handler.join(room.room_id, features)
+            handler.codec = codec
+            handlers.append(handler)
+        sender = handlers[0]
+
+        for name, data in (('token', ['token', 0, [412, 230]]), ('dices', ['dices']),
+                           ('draw', ['draw', 1]), ('turn', ['turn'])):
+            frame = comm.encode(data, codec)
+
+            def run(n):
+                room.game.cards = [list(range(len(pile))) * (n // len(pile) + 1) for pile in model.CARDS]
+                for _ in range(n):
+                    sender.feed(frame)
+
+            written = sum(handler.transport.written for handler in handlers)
+            t = timeit(run, number, repeat)
+            written = sum(handler.transport.written for handler in handlers) - written
+            results['{0}.{1}'.format(kind, name)] = {
+                'us_per_action': 1e6 * t, 'actions_per_s': 1 / t, 'bytes_out_per_action': written / (number * repeat)}
+    return results
+
+
+def bench_model(number, repeat):
+    """
+    Args:
+        number (int): the number of games per run
+        repeat (int): the number of runs
+
+    Returns:
+        Dict[str, dict]: the time per game and per transition
+    """
+    rng = random.Random(0)
+
+    def run(n):
+        for _ in range(n):
+            state = model.deal(_N_PLAYERS, rng)
+            for k in range(BENCH_STEPS):
+                i = rng.randrange(_N_PLAYERS)
+                action = k % 6
+                if action == 0:
+                    model.move(state, 2 * i, (rng.randrange(1600), rng.randrange(900)))
+                elif action == 1:
+                    model.roll(state, model.roll_dices(rng))
+                elif action == 2:
+                    model.draw(state, i, rng.randrange(len(model.CARDS)))
+                elif action == 3:
+                    j = rng.randrange(_N_PLAYERS)
+                    if state.characters[j].equipments:
+                        model.take(state, i, j, 0)
+                elif action == 4:
+                    model.reveal(state, i)
+                else:
+                    model.turn(state)
+
+    t = timeit(run, number, repeat)
+    return {'random-game': {'us_per_game': 1e6 * t, 'games_per_s': 1 / t, 'us_per_step': 1e6 * t / BENCH_STEPS}}
+
+
+def bench_render(number, repeat):
+    """
+    Args:
+        number (int): the number of frames per run
+        repeat (int): the number of runs
+
+    Returns:
+        Dict[str, dict]: the time per frame, by scene, or the reason why the benchmark was skipped
+    """
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    try:
+        import game
+        import session
+        room = server_room()
+
+        class BenchSession(session.Session):
+            def __init__(self):
+                super().__init__()
+                self.i = 0
+
+            def poll(self):
+                pass
+
+            def send_message(self, data):
+                pass
+
+        cwd = os.getcwd()
+        os.chdir(_ROOT)
+        try:
+            state = room.game.dump()
+            g = game.Game(BenchSession(), state['tokens_center'], state['dices_val'], state['characters'],
+                          state['areas'], state['active_player'])
+        finally:
+            os.chdir(cwd)
+    except Exception as e:  # No pygame, or no display for the Tk root
+        return {'skipped': repr(e)}
+
+    def idle(n):
+        for _ in range(n):
+            g.update_display()
+
+    def token(n):
+        for k in range(n):
+            g.tokens[0].center = (100 + k % 800, 100 + k % 500)
+            g.update_display()
+
+    def dices(n):
+        for k in range(n):
+            if k % 30 == 0:
+                g.dices[0].roll_to(1 + k % 4)
+                g.dices[1].roll_to(1 + k % 6)
+            g.update_display()
+
+    def zoom(n):
+        g.flag_zoom = True
+        try:
+            idle(n)
+        finally:
+            g.flag_zoom = False
+
+    results = {}
+    for name, run in (('idle', idle), ('token', token), ('dices', dices), ('zoom', zoom)):
+        t = timeit(run, number, repeat)
+        results[name] = {'ms_per_frame': 1e3 * t, 'fps': 1 / t}
+    results['text_cache_hits'], results['text_cache_misses'] = game.TEXT_CACHE.hits, game.TEXT_CACHE.misses
+    return results
+
+
+BENCHMARKS = {'comm': (bench_comm, 2000), 'server': (bench_server, 2000), 'model': (bench_model, 2000),
+              'render': (bench_render, 100)}
+""" The benchmarks, with their default number of operations per run """
+
+
+def regressions(previous, current, threshold):
+    """
+    Args:
+        previous (dict): the results of a previous run
+        current (dict): the results of this run
+        threshold (float): the relative slowdown considered as a regression
+
+    Returns:
+        List[str]: the benchmarks slower than in the previous run
+    """
+    slower = []
+    for bench, results in current['results'].items():
+        for name, values in results.items():
+            old = previous.get('results', {}).get(bench, {}).get(name)
+            if not isinstance(values, dict) or not isinstance(old, dict):
+                continue
+            key = next(k for k in values if k.startswith(('us_per', 'ms_per')))
+            if key in old and values[key] > old[key] * (1 + threshold):
+                slower.append("{0}.{1}: {2:.3g} -> {3:.3g} {4}".format(bench, name, old[key], values[key], key))
+    return slower
+
+
+def git_commit():
+    """
+    Returns:
+        str: the current commit, or None if it is unknown
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=_ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Shadow Hunters benchmarks")
+    parser.add_argument('benchmarks', nargs='*', metavar='BENCHMARK',
+                        help="the benchmarks to run among {0}, defaults to all of them".format(', '.join(BENCHMARKS)))
+    parser.add_argument('--number', type=float, default=1, help="scale the number of operations per run")
+    parser.add_argument('--repeat', type=int, default=5, help="the number of runs, the best one being kept")
+    parser.add_argument('--output', metavar='FILE', help="write the results to this file instead of printing them")
+    parser.add_argument('--compare', metavar='FILE', help="compare with the results of a previous run")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="the relative slowdown reported as a regression, defaults to 10%%")
+    args = parser.parse_args()
+    for bench in args.benchmarks:
+        if bench not in BENCHMARKS:
+            parser.error("unknown benchmark '{0}'".format(bench))
+
+    report = {'commit': git_commit(), 'python': platform.python_version(), 'machine': platform.machine(),
+              'results': {}}
+    for bench in args.benchmarks or BENCHMARKS:
+        func, number = BENCHMARKS[bench]
+        report['results'][bench] = func(max(1, int(args.number * number)), args.repeat)
+
+    text = json.dumps(report, indent=2)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            slower = regressions(json.load(f), report, args.threshold)
+        for line in slower:
+            print("Regression: {0}".format(line), file=sys.stderr)
+        sys.exit(1 if slower else 0)
@@ -1,51 +1,111 @@
 import select
 import socket
+import sys
+import threading
 
 import card
 import comm
 import game
+import model
+import session
 
 
-class Client(socket.socket):
+class Client(session.Session, socket.socket):
     """
     Game client
 
     Attributes:
-        i (int): the client index in the server
+        address (Tuple[str, int]): the server address
         game (game.GameThread): the running content
+        polled (threading.Event): set once the received data is polled, see Client.watch
+        watching (bool): whether Client.watch runs
+        wakeup (Tuple[socket.socket, socket.socket]): a socket pair waking Client.watch when the socket is reconnected
+            or closed, see Client.notify_watch
     """
 
-    def __init__(self, host, port):
+    def __init__(self, host, port, room=''):
         """
         Args:
             host (str):
             port (int):
+            room (str): the room to join on the server
+        """
+        session.Session.__init__(self, room)
+        socket.socket.__init__(self)
+        self.address = host, port
+        self.game = None
+        self.polled = threading.Event()
+        self.polled.set()
+        self.watching = False
+        self.wakeup = socket.socketpair()
+
+        state = self.join()
+        if state is None:
+            self.close()
+            print("Cannot reach the server")
+            return
+
+        self.game = game.Game(self, *state)
+        self.watching = True
+        threading.Thread(target=self.watch, daemon=True).start()
+        self.game.run()
+
+    def join(self, resume=False):
         """
-        super().__init__()
-        self.connect((host, port))
+        Connects to the server, joins the room and negotiates the codec
+
+        Args:
+            resume (bool): whether to resume from the last received event, when reconnecting
+
+        Returns:
+            tuple: the game state (tokens_center, dices_val, characters, areas, active_player),
+                an empty tuple when resuming, the snapshot or the missed events being handled by Client.handle_message,
+                or None if the server cannot be joined
+        """
+        self.decoder = comm.Decoder()
+        self.codec = comm.JsonCodec
 
         self.setblocking(True)
         try:
-            self.i = comm.recv(self)
-        except ConnectionRefusedError:
-            self.i = b''
-        if self.i == b'' or self.i == -1:
-            self.close()
-            print("Cannot reach the server")
-            return
-        tokens_center = comm.recv(self)
-        dices_val = comm.recv(self)
-        characters = comm.recv(self)
-        areas = comm.recv(self)
-        active_player = comm.recv(self)
+            self.connect(self.address)
+            comm.send(self, self.join_message(resume))
+            welcome = self.decoder.recv(self)
+        except OSError:
+            welcome = b''
+        if welcome == b'' or welcome == -1:
+            return None
+        if self.handle_welcome(welcome):
+            if not resume:
+                _, self.version, *state = self.decoder.recv(self)
+            else:
+                state = ()
+        else:  # The server does not support snapshots
+            self.i = welcome
+            state = [self.decoder.recv(self) for _ in range(5)]
+        comm.send(self, self.codec_message())
         self.setblocking(False)
+        return tuple(state)
 
-        self.game = game.Game(self, tokens_center, dices_val, characters, areas, active_player)
-        self.game.run()
+    def reconnect(self):
+        """
+        Reconnects to the server after a connection loss, receiving only the missed events if possible
+
+        Returns:
+            bool: whether the client is back in the game, with the same player index
+        """
+        if self.epoch is None:
+            return False
+        i = self.i
+        socket.socket.close(self)
+        socket.socket.__init__(self)
+        print("Reconnecting to the server")
+        joined = self.join(resume=True) is not None and self.i == i
+        self.notify_watch()
+        return joined
 
     def poll(self):
         """
-        Tries to read data from the server
+        Tries to read data from the server, marking the game scene as changed if some messages are handled
 
         Returns:
             None
@@ -53,111 +113,117 @@ class Client(socket.socket):
 
         r, _, _ = select.select([self], [], [], 0)
         if r:
-            msg = comm.recv(self)
-            if msg == b'':
+            try:
+                connected = self.decoder.read_from(self)
+            except OSError:
+                connected = False
+            if not connected:
                 print("Lost connection from server")
-                self.close()
+                if not self.reconnect():
+                    self.close()
                 return
 
-            if msg[0] == 'token':
-                self.game.tokens[msg[1]].center = msg[2]
-            elif msg[0] == 'dices':
-                self.game.dices[0].roll_to(msg[1][0])
-                self.game.dices[1].roll_to(msg[1][1])
-            elif msg[0] == 'reveal':
-                self.game.characters[msg[1]].revealed = True
-            elif msg[0] == 'turn':
-                self.game.active_player.i = msg[1]
-            elif msg[0] == 'draw':
-                if card.TYPES[msg[2]] == card.CardVision:
-                    if self.i == msg[1]:
-                        self.send_vision(msg[3], self.game.cards[msg[2]].draw(msg[3], msg[1]))
-                else:
-                    self.game.cards[msg[2]].draw(msg[3], msg[1])
-            elif msg[0] == 'vision':
-                self.game.cards[card.TYPES.index(card.CardVision)].answer(msg[1], msg[2])
-            elif msg[0] == 'take':
-                self.game.characters[msg[1]].equipments.append(self.game.characters[msg[2]].equipments.pop(msg[3]))
-            else:
-                print(msg)
+            for msg in self.decoder.frames():
+                self.handle_message(msg)
+            self.game.invalidate()
+        self.polled.set()
 
-    def close(self):
+    def watch(self):
         """
-        Closes the client
+        Wakes the game when some data is received from the server, so that an idle game does not poll the socket
+
+        Runs in its own thread, blocking on the socket without timeout, and waits for the received data to be polled
+        before watching the socket again. The thread is woken by Client.notify_watch when the socket changes.
 
         Returns:
             None
         """
-        self.game.running = False
-        super().close()
+        while self.watching:
+            self.polled.wait()
+            try:
+                r, _, _ = select.select([self, self.wakeup[0]], [], [])
+            except (OSError, ValueError):  # The socket is being reconnected, until Client.notify_watch
+                r, _, _ = select.select([self.wakeup[0]], [], [])
+            if self.wakeup[0] in r:
+                self.wakeup[0].recv(64)
+            elif r:
+                self.polled.clear()
+                self.game.wake()
 
-    def send_token(self, i):
+    def notify_watch(self):
         """
-        Send the coordinates of the token i
-
-        Args:
-            i (int):
+        Wake Client.watch, to watch the reconnected socket or to stop
 
         Returns:
             None
         """
-        comm.send(self, ['token', i, self.game.tokens[i].center])
+        self.wakeup[1].send(b'\0')
 
-    def roll_dice(self):
-        """
-        Ask for a dice roll
+    def on_token(self, i, center):
+        self.game.tokens[i].center = center
 
-        Returns:
-            None
-        """
-        comm.send(self, ['dices'])
+    def on_dices(self, dices_val):
+        self.game.dices[0].roll_to(dices_val[0])
+        self.game.dices[1].roll_to(dices_val[1])
 
-    def reveal(self):
-        """
-        Ask to reveal the character
+    def on_reveal(self, i, character=None):
+        self.game.characters[i].revealed = True
 
-        Returns:
-            None
-        """
-        comm.send(self, ['reveal'])
+    def on_turn(self, active_player):
+        self.game.active_player.i = active_player
 
-    def end_turn(self):
-        """
-        Ask to end the turn
+    def on_draw(self, i_player, i_type, i_card):
+        if i_type == model.VISION:
+            if self.i == i_player:
+                self.send_vision(i_card, self.game.cards[i_type].draw(i_card, i_player))
+        else:
+            self.game.cards[i_type].draw(i_card, i_player)
 
-        Returns:
-            None
-        """
-        comm.send(self, ['turn'])
+    def on_vision(self, i_card, i_from):
+        self.game.cards[model.VISION].answer(i_card, i_from)
 
-    def draw(self, i):
-        """
-        Ask to draw a card from pile i
+    def on_take(self, i_player, i_from, i_equipment):
+        self.game.characters[i_player].equipments.append(self.game.characters[i_from].equipments.pop(i_equipment))
 
-        Args:
-            i (int):
+    def on_snapshot(self, tokens_center, dices_val, characters, areas, active_player):
+        self.game.set_board(characters, areas)  # The snapshot may come from another game, when resuming
+        for token, center in zip(self.game.tokens, tokens_center):
+            token.center = center
+        for dice, value in zip(self.game.dices, dices_val):
+            dice.value = value
+        for character, data in zip(self.game.characters, characters):
+            character.revealed = data[2]
+            character.equipments = [(card.TYPES[e[0]], e[1]) for e in data[3]]
+        self.game.active_player.i = active_player
+
+    def close(self):
+        """
+        Closes the client
 
         Returns:
             None
         """
-        comm.send(self, ['draw', i])
+        if self.game is not None:
+            self.game.running = False
+        self.watching = False
+        self.notify_watch()
+        socket.socket.close(self)
+
+    def send_message(self, data):
+        comm.send(self, data, self.codec)
 
-    def send_vision(self, i_vision, i_player):
+    def send_token(self, i):
         """
-        Send the vision i_vision to the player i_player
+        Send the coordinates of the token i
 
         Args:
-            i_vision (int):
-            i_player (int):
+            i (int):
 
         Returns:
             None
         """
-        comm.send(self, ['vision', i_vision, i_player])
-
-    def take_equipment(self, i_player, i_equipment):
-        comm.send(self, ['take', i_player, i_equipment])
+        self.move_token(i, self.game.tokens[i].center)
 
 
 if __name__ == '__main__':
-    Client('', 1616)
+    Client('', 1616, *sys.argv[1:2])
@@ -1,39 +1,245 @@
 """
-The data is first encoded in JSON format, then converted to bytes.
+The data is first encoded by a codec, in JSON format by default, then converted to bytes.
 The send message is then the length of the converted data, the separator, then the converted data
+
+Two codecs are available:
+    JsonCodec: the data is encoded in JSON format, understood by every peer
+    BinaryCodec: the frequent messages are packed with integer opcodes, with a fallback to JSON for the others
+The codecs are negotiated after the connection: the client sends ['codec', names] with the codec names it supports,
+and the server answers ['codec', name] with the chosen one. A peer uses the binary codec only once it knows
+the other peer supports it, so old peers keep receiving JSON.
+The received data is decoded whatever the codec, a binary payload starting with its opcode, a control character
+that never starts a JSON document as produced by json.dumps.
+
+The Decoder reads the messages without blocking, buffering the received bytes until a frame is complete.
+A frame longer than MAX_FRAME is refused, so that a peer cannot make the other one buffer without limit.
 """
 
 import json
+import struct
 
 _HEADER_SEP = b'\xFF'  # Separator between the header and the message
 _DEBUG_COMM = False  # Enable debug
 
+MAX_FRAME = 1 << 20  # Maximum length of a message, in bytes
 
-def send(sock, data):
+
+class FrameError(RuntimeError):
     """
-    Send some data on the given socket
+    Raised when the received stream is corrupted, or announces a message longer than MAX_FRAME
+    """
+
+
+class JsonCodec:
+    """
+    Encodes the data in JSON format
+    """
+
+    NAME = 'json'
+
+    @staticmethod
+    def encode(data):
+        """
+        Args:
+            data (any): object that can be serialised in JSON format
+
+        Returns:
+            bytes: the payload
+        """
+        return json.dumps(data).encode()
+
+    @staticmethod
+    def decode(payload):
+        """
+        Args:
+            payload (Union[bytes, bytearray]):
+
+        Returns:
+            any:
+        """
+        return json.loads(payload)
+
+
+class BinaryCodec:
+    """
+    Packs the game messages with struct
+
+    The payload is the opcode, the index of the message name in BinaryCodec.OPCODES, on one byte, then the fields:
+        'token': the token index on a signed byte, then the coordinates quantized to two int16
+        'dices': nothing, or the two dice values on signed bytes
+        'event': the sequence number on an uint32, then the payload of the stamped message
+        'tokens': the number of moves on an unsigned byte, then every move packed as a 'token' message without opcode
+        other names: every field on a signed byte
+    A message that cannot be packed that way is encoded in JSON after the opcode 0
+    The 'tokens' opcode is only sent to the peers supporting the 'tokens' feature, see server
+    """
+
+    NAME = 'binary1'
+
+    OPCODES = ['json', 'token', 'dices', 'reveal', 'turn', 'draw', 'vision', 'take', 'event', 'tokens']
+
+    _OPCODE = struct.Struct('<B')
+    _TOKEN = struct.Struct('<Bbhh')
+    _EVENT = struct.Struct('<BI')
+    _BATCH = struct.Struct('<BB')
+    _MOVE = struct.Struct('<bhh')
+    _FIELDS = [struct.Struct('<B' + n * 'b') for n in range(4)]
+
+    @classmethod
+    def encode(cls, data):
+        """
+        Args:
+            data (any): object that can be serialised in JSON format
+
+        Returns:
+            bytes: the payload
+        """
+        try:
+            op = cls.OPCODES.index(data[0], 1)
+            if op == 1 and len(data) == 3:
+                return cls._TOKEN.pack(op, data[1], round(data[2][0]), round(data[2][1]))
+            if op == 2 and len(data) <= 2:
+                return cls._FIELDS[2 * (len(data) - 1)].pack(op, *data[1:] and data[1])
+            if op == 8 and len(data) == 3:
+                return cls._EVENT.pack(op, data[1]) + cls.encode(data[2])
+            if op == 9 and len(data) == 2:
+                return cls._BATCH.pack(op, len(data[1])) + b''.join(
+                    cls._MOVE.pack(i, round(center[0]), round(center[1])) for i, center in data[1])
+            if 2 < op < 8:
+                return cls._FIELDS[len(data) - 1].pack(op, *data[1:])
+        except (TypeError, ValueError, KeyError, IndexError, struct.error):
+            pass
+        return cls._OPCODE.pack(0) + JsonCodec.encode(data)
+
+    @classmethod
+    def decode(cls, payload):
+        """
+        Args:
+            payload (Union[bytes, bytearray]):
+
+        Returns:
+            any:
+        """
+        op = payload[0]
+        if op == 0:
+            return JsonCodec.decode(payload[1:])
+        if op == 1:
+            _, i, x, y = cls._TOKEN.unpack(payload)
+            return ['token', i, [x, y]]
+        if op == 8:
+            return ['event', cls._EVENT.unpack_from(payload)[1], cls.decode(payload[cls._EVENT.size:])]
+        if op == 9:
+            moves = (cls._MOVE.unpack_from(payload, cls._BATCH.size + k * cls._MOVE.size) for k in range(payload[1]))
+            return ['tokens', [[i, [x, y]] for i, x, y in moves]]
+        fields = list(cls._FIELDS[len(payload) - 1].unpack(payload)[1:])
+        if op == 2:
+            return ['dices', fields] if fields else ['dices']
+        return [cls.OPCODES[op]] + fields
+
+
+CODECS = [BinaryCodec, JsonCodec]
+""" The available codecs, by order of preference """
+
+
+def negotiate(names):
+    """
+    Choose the preferred codec among the given codec names
+
+    Args:
+        names (List[str]): the codec names supported by the peer
+
+    Returns:
+        Union[Type[JsonCodec], Type[BinaryCodec]]: the chosen codec, JsonCodec if none is supported
+    """
+    for codec in CODECS:
+        if codec.NAME in names:
+            return codec
+    return JsonCodec
+
+
+def unbatch(data):
+    """
+    Split a batch of token moves ['tokens', [[i, center], ...]] into 'token' messages,
+    for the peers not supporting the 'tokens' feature
+
+    Args:
+        data (list): a message
+
+    Returns:
+        List[list]: the token moves of the batch, or the message itself if it is not a batch
+    """
+    if data[0] == 'tokens':
+        return [['token', i, center] for i, center in data[1]]
+    return [data]
+
+
+def decode(payload):
+    """
+    Decode a payload, whatever its codec
+
+    Args:
+        payload (Union[bytes, bytearray]):
+
+    Returns:
+        any:
+    """
+    if payload[0] < 0x20:
+        return BinaryCodec.decode(payload)
+    return JsonCodec.decode(payload)
+
+
+def encode(data, codec=JsonCodec):
+    """
+    Encode some data into a frame, ready to be sent
 
     Args:
-        sock (Union[socket.socket, asyncore.dispatcher]):
         data (any): object that can be serialised in JSON format
+        codec (Union[Type[JsonCodec], Type[BinaryCodec]]):
 
     Returns:
-        int: the message length, with the header
+        bytes: the frame, with the header
     """
+    msg = codec.encode(data)
+    return '{0}'.format(len(msg)).encode() + _HEADER_SEP + msg
+
 
-    msg = json.dumps(data)
-    msg = '{0}'.format(len(msg)).encode() + _HEADER_SEP + msg.encode()
+def send_frame(sock, frame):
+    """
+    Send an already encoded frame on the given socket
+
+    Args:
+        sock (Union[socket.socket, asyncore.dispatcher]):
+        frame (Union[bytes, memoryview]): a frame returned by encode
+
+    Returns:
+        int: the frame length
+    """
     tot = 0
-    while tot < len(msg):
-        sent = sock.send(msg[tot:])
+    while tot < len(frame):
+        sent = sock.send(frame[tot:])
         if sent == 0:
             raise RuntimeError("socket connection broken")
         if _DEBUG_COMM:
-            print("Send {0} bytes: {1}".format(sent, msg[tot:tot + sent]))
+            print("Send {0} bytes: {1}".format(sent, bytes(frame[tot:tot + sent])))
         tot += sent
     return tot
 
 
+def send(sock, data, codec=JsonCodec):
+    """
+    Send some data on the given socket
+
+    Args:
+        sock (Union[socket.socket, asyncore.dispatcher]):
+        data (any): object that can be serialised in JSON format
+        codec (Union[Type[JsonCodec], Type[BinaryCodec]]):
+
+    Returns:
+        int: the message length, with the header
+    """
+    return send_frame(sock, memoryview(encode(data, codec)))
+
+
 def recv(sock):
     """
     Receive some data from the socket
@@ -51,6 +257,8 @@ def recv(sock):
             return b''
         header += chunk
     msg_len = int(header[:-1])
+    if msg_len > MAX_FRAME:
+        raise FrameError("frame of {0} bytes is too large".format(msg_len))
 
     msg = b''
     tot = 0
@@ -62,4 +270,137 @@ def recv(sock):
             print("Recv {0} bytes: {1}".format(len(chunk), chunk))
         msg += chunk
         tot += len(chunk)
-    return json.loads(msg.decode())
+    return decode(msg)
+
+
+class Decoder:
+    """
+    Incremental frame decoder
+
+    The decoder owns a reusable receive buffer, that is filled with large reads,
+    and yields every complete message already buffered.
+    It does not perform any IO by itself, except in the helpers Decoder.read_from and Decoder.recv.
+
+    Attributes:
+        buffer (bytearray): the receive buffer
+        start (int): the position of the first unread byte in the buffer
+        end (int): the position after the last received byte in the buffer
+    """
+
+    BUFFER_SIZE = 65536  # Initial buffer size, and minimum free space requested before a read
+    MAX_HEADER = 20  # Maximum header length, a longer header means the stream is corrupted
+
+    def __init__(self):
+        self.buffer = bytearray(self.BUFFER_SIZE)
+        self._view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+
+    def get_buffer(self, sizehint=-1):
+        """
+        Get a writable view on the free part of the buffer, compacting or growing the buffer if needed
+
+        Args:
+            sizehint (int): the minimum free space wanted, defaults to Decoder.BUFFER_SIZE
+
+        Returns:
+            memoryview:
+        """
+        sizehint = max(sizehint, self.BUFFER_SIZE)
+        if self.start == self.end:
+            self.start = self.end = 0
+        if len(self.buffer) - self.end < sizehint:
+            pending = self.end - self.start
+            if pending + sizehint <= len(self.buffer):
+                self.buffer[:pending] = self.buffer[self.start:self.end]
+            else:  # The buffer cannot be resized while exported, so a new one is allocated
+                buffer = bytearray(pending + sizehint)
+                buffer[:pending] = self.buffer[self.start:self.end]
+                self.buffer = buffer
+                self._view = memoryview(self.buffer)
+            self.start, self.end = 0, pending
+        return self._view[self.end:]
+
+    def buffer_updated(self, nbytes):
+        """
+        Notify the decoder that nbytes were written in the view returned by Decoder.get_buffer
+
+        Args:
+            nbytes (int):
+
+        Returns:
+            None
+        """
+        self.end += nbytes
+
+    def feed(self, data):
+        """
+        Append some received bytes to the buffer
+
+        Args:
+            data (bytes):
+
+        Returns:
+            None
+        """
+        self.get_buffer(len(data))[:len(data)] = data
+        self.buffer_updated(len(data))
+
+    def frames(self):
+        """
+        Yields every complete message in the buffer
+
+        Yields:
+            any: the decoded data
+
+        Raises:
+            FrameError: if the stream is corrupted, or announces a message longer than MAX_FRAME
+        """
+        while True:
+            sep = self.buffer.find(_HEADER_SEP, self.start, self.end)
+            if sep < 0:
+                if self.end - self.start > self.MAX_HEADER:
+                    raise FrameError("corrupted stream")
+                return
+            msg_len = int(self.buffer[self.start:sep])
+            if msg_len > MAX_FRAME:
+                raise FrameError("frame of {0} bytes is too large".format(msg_len))
+            if sep + 1 + msg_len > self.end:
+                return
+            msg = self.buffer[sep + 1:sep + 1 + msg_len]
+            if _DEBUG_COMM:
+                print("Recv {0} bytes: {1}".format(msg_len, msg))
+            self.start = sep + 1 + msg_len
+            yield decode(msg)
+
+    def read_from(self, sock):
+        """
+        Read as much as possible from the socket into the buffer, with a single system call
+
+        Args:
+            sock (socket.socket):
+
+        Returns:
+            bool: False if the connection is closed
+        """
+        n = sock.recv_into(self.get_buffer())
+        self.buffer_updated(n)
+        return n > 0
+
+    def recv(self, sock):
+        """
+        Blocking receive of the next message
+
+        The bytes received after this message are kept in the buffer
+
+        Args:
+            sock (socket.socket):
+
+        Returns:
+            any: the retrieved data, or b'' if the connection is closed
+        """
+        while True:
+            for msg in self.frames():
+                return msg
+            if not self.read_from(sock):
+                return b''
@@ -1,17 +1,19 @@
+import bisect
+import collections
 import math
 import os
 import random
 import tkinter
 
 import card
+import model
 
 os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"  # To hide pygame message
 import pygame  # noqa: E402
 import popup  # noqa: E402
 
-PLAYERS = [('Red', (255, 0, 0)), ('Green', (0, 255, 0)), ('Blue', (0, 0, 255)), ('White', (255, 255, 255)),
-           ('Orange', (250, 150, 50)), ('Yellow', (255, 255, 0)), ('Purple', (100, 0, 200)), ('Black', (20, 20, 20))]
-""" List of the player, where a player is represented by the tuple (name (str), color_rgb (Tuple[int, int, int])) """
+PLAYERS = model.PLAYERS
+""" List of the player, see model.PLAYERS """
 
 
 class Game:
@@ -27,22 +29,32 @@ class Game:
         bg (pygame.Surface): background, with the area cards
         zoom (pygame.Surface)
         flag_zoom (bool)
+        zoom_shown (bool): whether the zoom is on the screen
+        dirty (List[pygame.Rect]): the screen areas to redraw on the next update, besides the drawables changes
+        invalid (bool): whether the scene may have changed since the last update, see Game.invalidate
 
         cards (List[Card]): the three card decks, list of three Card instances
         tokens (List[Token]): the 2 * server._N_PLAYERS Token instances
         owned_tokens (List[Token]): the 2 Token instances owned by the player
+        token_order (TokenOrder): the tokens, in drawing order
         dices (List[Dice]): the 2 Dice instances
         characters (List[Character]): the server._N_PLAYERS Character instances
         active_player (ActivePlayer)
+        widgets (List[Drawable]): the drawables below the tokens
+        board (tuple): the dealt characters and area cards, see Game.board_of
+        hit_grid (HitGrid): the objects the player may click on
     """
 
-    W, H = 1600, 900  # Width and height of the graphic window
+    W, H = model.BOARD_W, model.BOARD_H  # Width and height of the graphic window
 
     ZOOM_W, ZOOM_H = 600, 350  # Width and height of the rendered zoom area
     ZOOM_SCALE = 2.5
 
     FRAME_RATE = 30
 
+    EXPOSE_EVENTS = (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED)
+    WAKE_EVENT = pygame.event.custom_type()  # Posted when some data is received from the server, see Game.wake
+
     BACKGROUND_COLOR = (200, 200, 200)
 
     def __init__(self, c, tokens_center, dices_val, characters, areas, active_player):
@@ -68,25 +80,24 @@ class Game:
         self.screen = pygame.display.set_mode((self.W, self.H), flags=pygame.HWSURFACE | pygame.DOUBLEBUF)
         pygame.display.set_caption('Shadow Hunters, player {0}'.format(PLAYERS[self.client.i][0]))
 
-        self.bg = self.screen.copy()
-        self.bg.fill(self.BACKGROUND_COLOR)
-        self.bg.blit(pygame.image.load("resources/background.jpg"), (0, 0))
-
         self.cards = [card.TYPES[0]((800, 25), self), card.TYPES[1]((1000, 25), self), card.TYPES[2]((1200, 25), self)]
-        for c in self.cards:
-            c.draw_on(self.bg)
-
-        for i in range(len(areas)):
-            Area(areas[i], i).draw_on(self.bg)
+        self.bg = self.screen.copy()
+        self.draw_background(areas)
 
         self.zoom = pygame.Surface((int(self.ZOOM_W / self.ZOOM_SCALE),
                                     int(self.ZOOM_H / self.ZOOM_SCALE)), flags=pygame.HWSURFACE | pygame.DOUBLEBUF)
         self.flag_zoom = False
+        self.zoom_shown = False
+        self.dirty = [self.screen.get_rect()]
+        self.invalid = True
 
         self.tokens = []
+        self.token_order = TokenOrder()
         for i in range(len(characters)):
             self.tokens.append(Token(PLAYERS[i][1], tokens_center[2 * i]))
             self.tokens.append(Token(PLAYERS[i][1], tokens_center[2 * i + 1]))
+        for token in self.tokens:
+            self.token_order.add(token)
         self.owned_tokens = [self.tokens[2 * self.client.i], self.tokens[2 * self.client.i + 1]]
 
         self.dices = [Dice(3, 4, ((self.ZOOM_W + self.W - 4 * (Character.WIDTH + 30)) / 2, 600), dices_val[0]),
@@ -101,6 +112,75 @@ class Game:
 
         self.active_player = ActivePlayer(active_player, self.client.i)
 
+        self.widgets = self.dices + self.characters + [self.active_player]
+
+        self.board = self.board_of(characters, areas)
+
+        self.hit_grid = HitGrid()
+        static = [(c, c.card_back.get_rect(topleft=c.nw_position)) for c in self.cards] + \
+            [(c, c.bounds()) for c in self.characters] + \
+            [(self.active_player, self.active_player.end_turn.get_rect(midbottom=ActivePlayer.S_POSITION))]
+        for k, (target, rect) in enumerate(static):
+            self.hit_grid.add(target, rect, (HitGrid.STATIC, k))
+        self.token_order.index = self.hit_grid
+        for token in self.owned_tokens:
+            self.hit_grid.add(token, token.bounds(), self.token_order.depth(token))
+
+    def draw_background(self, areas):
+        """
+        Draw the background, with the card decks and the area cards
+
+        Args:
+            areas (List[int]): order of the 6 area cards
+
+        Returns:
+            None
+        """
+        self.bg.fill(self.BACKGROUND_COLOR)
+        self.bg.blit(pygame.image.load("resources/background.jpg"), (0, 0))
+        for c in self.cards:
+            c.draw_on(self.bg)
+        for i in range(len(areas)):
+            Area(areas[i], i).draw_on(self.bg)
+
+    @staticmethod
+    def board_of(characters, areas):
+        """
+        Args:
+            characters (List[Tuple[int, int, bool]]): see Game
+            areas (List[int]): see Game
+
+        Returns:
+            tuple: what is dealt at the start of a game, the characters identities and the order of the area cards
+        """
+        return [list(character[:2]) for character in characters], list(areas)
+
+    def set_board(self, characters, areas):
+        """
+        Rebuild the character cards and the area cards if they changed,
+        when the room started another game, see client.Client.on_snapshot
+
+        Args:
+            characters (List[Tuple[int, int, bool]]): see Game
+            areas (List[int]): see Game
+
+        Returns:
+            None
+        """
+        board = self.board_of(characters, areas)
+        if board == self.board:
+            return
+        self.board = board
+        self.draw_background(areas)
+        for i in range(len(characters)):
+            old = self.characters[i]
+            self.characters[i] = Character(*characters[i], nw_position=old.nw_position, i_player=i, game=self)
+            self.widgets[self.widgets.index(old)] = self.characters[i]
+            rect, depth = self.hit_grid.entries[old]
+            self.hit_grid.remove(old)
+            self.hit_grid.add(self.characters[i], rect, depth)
+        self.invalidate(full=True)
+
     def run(self):
         """
         Runs the game
@@ -109,7 +189,7 @@ class Game:
             check for server input
             handle events
             update token position, if necessary
-            update display
+            update display, or wait for an event if nothing changed, see Game.refresh
 
         Returns:
             None
@@ -120,6 +200,7 @@ class Game:
             self.client.poll()
 
             for event in pygame.event.get():
+                self.invalidate(event.type in self.EXPOSE_EVENTS)
                 if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_q):
                     self.client.close()
                 if event.type == pygame.KEYDOWN and event.key == pygame.K_z:
@@ -130,23 +211,15 @@ class Game:
                     if self.characters[self.client.i].reveal():
                         self.client.reveal()
                 if event.type == pygame.MOUSEBUTTONDOWN:
-                    for token in sorted(self.owned_tokens, key=lambda t: (t.center[1], t.center[0]), reverse=True):
-                        if token.collide(event.pos):
-                            token.hold = True
-                            break
-                    if any(token.hold for token in self.owned_tokens):
-                        continue
-
-                    if self.active_player.collide(event.pos):
+                    target = self.hit_grid.at(event.pos)
+                    if target in self.owned_tokens:
+                        target.grab(event.pos)
+                    elif target is self.active_player:
                         self.client.end_turn()
-
-                    for i in range(len(self.cards)):
-                        if self.cards[i].collide(event.pos):
-                            self.client.draw(i)
-
-                    for c in self.characters:
-                        if c.collide(event.pos):
-                            c.inventory()
+                    elif target in self.cards:
+                        self.client.draw(self.cards.index(target))
+                    elif target in self.characters:
+                        target.inventory()
                 if event.type == pygame.MOUSEBUTTONUP:
                     for i in (2 * self.client.i, 2 * self.client.i + 1):
                         token = self.tokens[i]
@@ -155,31 +228,94 @@ class Game:
                             self.client.send_token(i)
 
             for token in self.owned_tokens:
-                if token.hold:
+                if token.hold and token.center != pygame.mouse.get_pos():
                     token.center = pygame.mouse.get_pos()
+                    self.invalidate()
+
+            self.refresh()
 
+    def invalidate(self, full=False):
+        """
+        Mark the scene as changed, so that it is updated on the next frame
+
+        Args:
+            full (bool): whether to redraw the whole screen, when the window was exposed
+
+        Returns:
+            None
+        """
+        self.invalid = True
+        if full:
+            self.dirty.append(self.screen.get_rect())
+
+    def refresh(self, timeout=None):
+        """
+        Ends a frame: updates the display at Game.FRAME_RATE if the scene is invalid,
+        or else waits for an event without rendering, the data from the server waking the game, see Game.wake.
+        The awaited event is put back in the queue, for the next frame.
+
+        Args:
+            timeout (int): the longest wait for an event in ms, defaults to no limit
+
+        Returns:
+            None
+        """
+        if self.invalid:
             self.update_display()
             self.clock.tick(self.FRAME_RATE)
+            return
+        event = pygame.event.wait() if timeout is None else pygame.event.wait(timeout)
+        if event.type != pygame.NOEVENT:
+            pygame.event.post(event)
 
-    def update_display(self):
+    def wake(self):
         """
-        Update the screen
+        Wake the game waiting for an event, called from any thread
 
         Returns:
             None
         """
-        self.screen.blit(self.bg, (0, 0))
+        pygame.event.post(pygame.event.Event(self.WAKE_EVENT))
 
-        for dice in self.dices:
-            dice.draw_on(self.screen)
+    def update_display(self):
+        """
+        Update the screen, redrawing only the areas that changed since the last update
 
-        for character in self.characters:
-            character.draw_on(self.screen)
+        Every drawable reports the areas it changed, see Drawable.changes. Each of those areas is restored from the
+        background, the drawables overlapping it are drawn again, clipped to it, and only those areas are pushed to the
+        display.
 
-        self.active_player.draw_on(self.screen)
+        The scene stays invalid while a dice is rolling.
 
-        for token in sorted(self.tokens, key=lambda t: (t.hold, t.center[1] - t.offset[1], t.center[0] - t.offset[0])):
-            token.draw_on(self.screen)
+        Returns:
+            List[pygame.Rect]: the updated areas
+        """
+        for dice in self.dices:
+            dice.step()
+        self.invalid = any(dice.roll_since != -1 for dice in self.dices)
+
+        layers = self.widgets, self.token_order.tokens
+
+        dirty, self.dirty = self.dirty, []
+        for layer in layers:
+            for drawable in layer:
+                dirty += drawable.changes()
+        zoom_rect = pygame.Rect(5, self.H - self.ZOOM_H - 5, self.ZOOM_W, self.ZOOM_H)
+        if self.flag_zoom or self.zoom_shown:
+            dirty.append(zoom_rect)
+        self.zoom_shown = self.flag_zoom
+        if not dirty:
+            return []
+
+        dirty = merge_rects(dirty)
+        for rect in dirty:
+            self.screen.set_clip(rect)
+            self.screen.blit(self.bg, rect, rect)
+            for layer in layers:
+                for drawable in layer:
+                    if rect.colliderect(drawable.drawn_rect):
+                        drawable.draw_on(self.screen)
+        self.screen.set_clip(None)
 
         if self.flag_zoom:
             mouse_x, mouse_y = pygame.mouse.get_pos()
@@ -187,10 +323,66 @@ class Game:
             self.zoom.blit(self.screen, (0, 0),
                            pygame.Rect(mouse_x - self.zoom.get_width() / 2, mouse_y - self.zoom.get_height() / 2,
                                        self.zoom.get_width(), self.zoom.get_height()))
-            self.screen.blit(pygame.transform.smoothscale(self.zoom, (self.ZOOM_W, self.ZOOM_H)),
-                             (5, self.H - self.ZOOM_H - 5))
+            self.screen.blit(pygame.transform.smoothscale(self.zoom, (self.ZOOM_W, self.ZOOM_H)), zoom_rect)
+
+        pygame.display.update(dirty)
+        return dirty
+
+
+class Drawable:
+    """
+    An object drawn on the screen, that reports the screen areas it changed since it was last drawn
+
+    The subclasses implement Drawable.look, Drawable.bounds and Drawable.draw_on
 
-        pygame.display.flip()
+    Attributes:
+        drawn_look (any): what the object looked like when it was last drawn, or None
+        drawn_rect (pygame.Rect): where the object was last drawn, or None
+    """
+
+    def __init__(self):
+        self.drawn_look = None
+        self.drawn_rect = None
+
+    def look(self):
+        """
+        Returns:
+            any: what the object looks like, two equal looks drawing the same pixels
+        """
+        raise NotImplementedError
+
+    def bounds(self):
+        """
+        Returns:
+            pygame.Rect: the screen area the object draws on
+        """
+        raise NotImplementedError
+
+    def draw_on(self, surface):
+        """
+        Draw the object on the surface
+
+        Args:
+            surface (pygame.Surface)
+
+        Returns:
+            None
+        """
+        raise NotImplementedError
+
+    def changes(self):
+        """
+        Get the screen areas to redraw since the object was last drawn, the object being drawn again on the next update
+
+        Returns:
+            List[pygame.Rect]: the previous and the new areas of the object, or nothing if it looks the same
+        """
+        look = self.look()
+        if look == self.drawn_look:
+            return []
+        rects = [self.bounds()] if self.drawn_rect is None else [self.bounds(), self.drawn_rect]
+        self.drawn_look, self.drawn_rect = look, rects[0]
+        return rects
 
 
 class Area:
@@ -203,15 +395,8 @@ class Area:
     """
     WIDTH, HEIGHT = 105, 150
 
-    AREAS = [
-        ([2, 3], "Antre de\nl'ermite", "Vous pouvez\npiocher une\ncarte Vision"),
-        ([4, 5], "Porte de\nl'Outremonde", "Vous pouvez\npiocher une\ncarte dans\nla pile de\nvotre choix"),
-        ([6], "Monastère", "Vous pouvez\npiocher une\ncarte Lumière"),
-        ([8], "Cimetière", "Vous pouvez\npiocher une\ncarte Ténèbres"),
-        ([9], "Forêt hantée", "Le joueur de\nvotre choix peut\nsubir 2 blessures\nOU\nsoigner 1 blessure"),
-        ([10], "Sanctuaire\nancien", "Vous pouvez\nvoler une carte\néquipement à\nun autre joueur")
-    ]
-    """ The areas cards, stored as tuple: (values (int), name (str), description (str)) """
+    AREAS = model.AREAS
+    """ The areas cards, see model.AREAS """
 
     AREA_LOCATIONS = [(318, 32, 0), (430, 32, 0),
                       (185, 220, -70), (225, 325, -70),
@@ -232,21 +417,21 @@ class Area:
 
         area = Area.AREAS[i_area]
 
-        font = pygame.font.SysFont('dejavuserif', 20)
+        font = TEXT_CACHE.font('dejavuserif', 20)
         if len(area[0]) == 2:
             pygame.draw.circle(self.card, (100, 100, 100), (self.WIDTH / 2 - 20, 20), 15)
-            text = font.render(str(area[0][0]), True, (0, 0, 0))
+            text = TEXT_CACHE.render(str(area[0][0]), font, (0, 0, 0))
             self.card.blit(text, ((self.WIDTH - text.get_width()) / 2 - 20, 20 - text.get_height() / 2))
             pygame.draw.circle(self.card, (100, 100, 100), (self.WIDTH / 2 + 20, 20), 15)
-            text = font.render(str(area[0][1]), True, (0, 0, 0))
+            text = TEXT_CACHE.render(str(area[0][1]), font, (0, 0, 0))
             self.card.blit(text, ((self.WIDTH - text.get_width()) / 2 + 20, 20 - text.get_height() / 2))
         else:
             pygame.draw.circle(self.card, (100, 100, 100), (self.WIDTH / 2, 20), 15)
-            text = font.render(str(area[0][0]), True, (0, 0, 0))
+            text = TEXT_CACHE.render(str(area[0][0]), font, (0, 0, 0))
             self.card.blit(text, ((self.WIDTH - text.get_width()) / 2, 20 - text.get_height() / 2))
 
-        y = render_text(area[1], pygame.font.SysFont('dejavuserif', 12), (0, 0, 0), self.card, 'c', self.WIDTH / 2, 40)
-        _ = render_text(area[2], pygame.font.SysFont('dejavuserif', 10), (0, 0, 0), self.card, 'c', self.WIDTH / 2,
+        y = render_text(area[1], TEXT_CACHE.font('dejavuserif', 12), (0, 0, 0), self.card, 'c', self.WIDTH / 2, 40)
+        _ = render_text(area[2], TEXT_CACHE.font('dejavuserif', 10), (0, 0, 0), self.card, 'c', self.WIDTH / 2,
                         y + 10)
 
         self.card = pygame.transform.rotozoom(self.card, Area.AREA_LOCATIONS[i_slot][-1], 1)
@@ -264,7 +449,7 @@ class Area:
         surface.blit(self.card, self.nw_position)
 
 
-class Character:
+class Character(Drawable):
     """
     Represents a character card, and defines the data regarding the characters
 
@@ -280,134 +465,10 @@ class Character:
     WIDTH, HEIGHT = 180, 240
     MARGIN = 10
 
-    CHARACTERS = [
-        [
-            ('Métamorphe',
-             11,
-             "Tous les personnages Hunter\nsont morts ou 3 personnages\nNeutres sont morts.",
-             "Pouvoir permanent : Imitation",
-             "Vous pouvez mentir (sans\navoir à révéler votre identité)\nlorsqu'on vous donne\nune carte Vision."),
-            ('Momie',
-             11,
-             "Tous les personnages Hunter\nsont morts ou 3 personnages\nNeutres sont morts.",
-             "Capacité spéciale :\nRayon d'Outremonde",
-             "Au début de votre tour,\nvous pouvez infliger 3 Blessures\nà un joueur présent dans le Lieu\n"
-             "Porte de l'Outremonde."),
-            ('Vampire',
-             13,
-             "Tous les personnages Hunter\nsont morts ou 3 personnages\nNeutres sont morts.",
-             "Capacité spéciale : Morsure",
-             "Si vous attaquez un joueur\net lui infligez des Blessures,\nsoignez immédiatement\n2 de vos Blessures."),
-            ('Valkyrie',
-             13,
-             "Tous les personnages Hunter\nsont morts ou 3 personnages\nNeutres sont morts.",
-             "Capacité spéciale : Chant de guerre",
-             "Quand vous attaquez,\nlancez seulement le dé à 4 faces\npour déterminer les dégats."),
-            ('Loup-Garou',
-             14,
-             "Tous les personnages Hunter\nsont morts ou 3 personnages\nNeutres sont morts.",
-             "Capacité spéciale : Contre-attaque",
-             "Après avoir subi l'attaque\nd'un joueur, vous pouvez\ncontre-attaquer immédiatement."),
-            ('Liche',
-             14,
-             "Tous les personnages Hunter\nsont morts ou 3 personnages\nNeutres sont morts.",
-             "Capacité spéciale : Nécromancie",
-             "Vous pouvez rejouer autant de fois\nqu'il y a de personnages morts.\nUtilisation unique.")
-        ],
-        [
-            ('Allie',
-             8,
-             "Etre encore en vie lorsque\nla partie se termine.",
-             "Capacité spéciale : Amour maternel",
-             "Soignez toutes vos blessures.\nUtilisation unique."),
-            ('Agnes',
-             8,
-             "Le joueur à votre droite gagne.",
-             "Capacité spéciale : Caprice",
-             "Au début de votre tour, changez\nvotre condition de victoire par :\n\"Le joueur à votre gauche gagne\"."),
-            ('Daniel',
-             13,
-             "Etre le premier à mourir\nOU être en vie quand tous\nles personnages Shadow\nsont morts.",
-             "Particularité : Désespoir",
-             "Dès qu'un personnage meurt,\nvous devez révéler\nvotre identité."),
-            ('David',
-             13,
-             "Avoir au minimum 3 de ces cartes :\nCrucifix en argent, Amulette,\nLance de Longinus, Toge sainte.",
-             "Capacité spéclass :\nPilleur de tombes",
-             "Récupérez dans la défausse la\ncarte équipement de votre choix.\nUtilisation unique."),
-            ('Bob',
-             10,
-             "Posséder 5 cartes équipements\nou plus.",
-             "Capacité spéciale : Braquage",
-             "Si vous tuez un personnage,\nvous pouvez récupérer\ntoutes ses cartes équipements."),
-            ('Bryan',
-             10,
-             "Tuer un personnage de\n13 Points de Vie ou plus,\nOU être dans le Sanctuaire ancien\nà la fin du jeu.",
-             "Particularité : Oh my god !",
-             "Si vous tuez un personnage de\n12 Points de Vie ou moins,\nvous devez révéler votre identité."),
-            ('Charles',
-             11,
-             "Tuer un personnage par\nune attaque alors qu'il y a\ndéjà eu 3 morts ou plus.",
-             "Capacité spéciale : Festin sanglant",
-             "Après votre attaque, vous pouvez\nvous infliger 2 Blessures afin\nd'attaquer de nouveau\n"
-             "le même joueur."),
-            ('Catherine',
-             11,
-             "Être la première à mourir\nOU être l'un des deux\nseuls personnages en vie.",
-             "Capacité spéciale : Stigmates",
-             "Guerissez de 1 Blessure\nau début de votre tour.")
-        ],
-        [
-            ('Emi',
-             10,
-             "Tous les personnages Shadow\nsont morts.",
-             "Capacité spéciale : Téléportation",
-             "Pour vous déplacer, vous pouvez\nlancer normalement les dés,\nou vous déplacer sur\n"
-             "la carte lieu adjacente."),
-            ('Ellen',
-             10,
-             "Tous les personnages Shadow\nsont morts.",
-             "Capacité spéciale : Exorcisme",
-             "Au début de votre tour,\nvous pouvez désigner un joueur.\nIl perd sa capacité spéciale\n"
-             "jusqu'à la fin de la partie.\nUtilisation unique."),
-            ('Georges',
-             14,
-             "Tous les personnages Shadow\nsont morts.",
-             "Capacité spéciale : Démolition",
-             "Au début de votre tour, choisissez\nun joueur et infligez lui autant\nde blessures que le résultat\n"
-             "d'un dé à 4 faces.\nUtilisation unique."),
-            ('Gregor',
-             14,
-             "Tous les personnages Shadow\nsont morts.",
-             "Capacité spéciale :\nBouclier fantôme",
-             "Ce pouvoir peut s'activer à la fin\nde votre tour. Vous ne subissez\naucune Blessure jusqu'au début\n"
-             "de votre prochain tour.\nUtilisation unique."),
-            ('Franklin',
-             12,
-             "Tous les personnages Shadow\nsont morts.",
-             "Capacité spéciale : Poudre",
-             "Au début de votre tour, choisissez\nun joueur et infligez lui autant\nde blessures que le résultat\n"
-             "d'un dé à 6 faces.\nUtilisation unique."),
-            ('Fu-Ka',
-             12,
-             "Tous les personnages Shadow\nsont morts.",
-             "Capacité spéciale :\nSoins particuliers",
-             "Au début de votre tour,\nplacez le marqueur\nde Blessures d'un joueur sur 7.\nUtilisation unique.")
-        ]
-    ]
-    """
-    The playable characters, in three lists : the Shadows, the Neutrals, the Hunters.
-    A character is stored as the tuple:
-        (name (str), health points (int), victory condition (str), power name (str), power description (str))
-    """
+    CHARACTERS = model.CHARACTERS
+    """ The playable characters, see model.CHARACTERS """
 
-    CHARACTERS_REPARTITION = {
-        4: (2, 0, 2),
-        5: (2, 1, 2),
-        6: (2, 2, 2),
-        7: (3, 1, 3),
-        8: (3, 2, 3)
-    }
+    CHARACTERS_REPARTITION = model.CHARACTERS_REPARTITION
 
     def __init__(self, align, i_character, revealed, equipments, nw_position, i_player, game):
         """
@@ -420,6 +481,7 @@ class Character:
             i_player (int): the corresponding player id
             game (Game)
         """
+        super().__init__()
         self.revealed = revealed
         self.nw_position = nw_position
         self.i_player = i_player
@@ -439,20 +501,20 @@ class Character:
         character = Character.CHARACTERS[align][i_character]
 
         pygame.draw.circle(self.card, color, (30, 30), 15)
-        font = pygame.font.SysFont('dejavuserif', 20)
-        text = font.render(character[0][0], True, (0, 0, 0))
+        font = TEXT_CACHE.font('dejavuserif', 20)
+        text = TEXT_CACHE.render(character[0][0], font, (0, 0, 0))
         self.card.blit(text, (30 - text.get_width() / 2, 30 - text.get_height() / 2))
-        font = pygame.font.SysFont('dejavuserif', 14)
-        text = font.render(character[0][1:], True, (0, 0, 0))
+        font = TEXT_CACHE.font('dejavuserif', 14)
+        text = TEXT_CACHE.render(character[0][1:], font, (0, 0, 0))
         self.card.blit(text, (30 + 15, 30))
 
         pygame.draw.circle(self.card, (255, 0, 0), (self.WIDTH - 15, 25), 10)
-        text = font.render(str(character[1]), True, (0, 0, 0))
+        text = TEXT_CACHE.render(str(character[1]), font, (0, 0, 0))
         self.card.blit(text, (self.WIDTH - 15 - text.get_width() / 2, 25 - text.get_height() / 2))
-        text = font.render("PV", True, (0, 0, 0))
+        text = TEXT_CACHE.render("PV", font, (0, 0, 0))
         self.card.blit(text, (self.WIDTH - 15 - 10 - text.get_width(), 25 - text.get_height() / 2))
 
-        font = pygame.font.SysFont('dejavuserif', 10)
+        font = TEXT_CACHE.font('dejavuserif', 10)
         y = render_text("Condition de victoire :", font, color, self.card, 'c', self.MARGIN + self.WIDTH / 2, 75)
         y = render_text(character[2], font, (0, 0, 0), self.card, 'c', self.MARGIN + self.WIDTH / 2, y)
         y = render_text(character[3], font, color, self.card, 'c', self.MARGIN + self.WIDTH / 2, y + 20)
@@ -470,6 +532,16 @@ class Character:
         """
         return self.card.get_rect().collidepoint(loc[0] - self.nw_position[0], loc[1] - self.nw_position[1])
 
+    def look(self):
+        """
+        Returns:
+            bool: whether the character is shown, when revealed or hovered by its player
+        """
+        return self.revealed or (self.i_player == self.game.client.i and self.collide(pygame.mouse.get_pos()))
+
+    def bounds(self):
+        return self.card.get_rect(topleft=self.nw_position)
+
     def draw_on(self, surface):
         """
         Draw the character card on the surface
@@ -480,7 +552,7 @@ class Character:
         Returns:
             None
         """
-        if self.revealed or (self.i_player == self.game.client.i and self.collide(pygame.mouse.get_pos())):
+        if self.drawn_look:
             surface.blit(self.card, self.nw_position)
         else:
             surface.blit(self.card_back, self.nw_position)
@@ -578,7 +650,7 @@ class Character:
         return InventoryPopup(self.game, self)
 
 
-class Token:
+class Token(Drawable):
     """
     A draggable token
 
@@ -586,24 +658,93 @@ class Token:
     with two ellipses of width and height Token.SIZE, Token.SIZE / 2.
     The square and the bottom ellipse are darkened.
 
+    The token of each color is pre-rendered once, in Token.SPRITES, see Token.render
+
     Attributes:
+        order (TokenOrder): the drawing order the token belongs to, updated when the token moves, or None
         color (Tuple[int, int, int])
         center (Tuple[float, float])
+        hold (bool)
+        offset (Tuple[float, float])
+        sprite (pygame.Surface)
 
     """
     SIZE = 10
     DARKEN_FACTOR = 0.8
 
+    SPRITES = {}  # The pre-rendered tokens, by color
+
     def __init__(self, color, c_position):
         """
         Args:
             color (Tuple[int, int, int])
             c_position (Tuple[float, float]): position of the center
         """
+        super().__init__()
+        self.order = None
         self.color = color
         self.center = c_position
         self.hold = False
         self.offset = 0, 0
+        self.sprite = self.render(color)
+
+    @property
+    def center(self):
+        """
+        Tuple[float, float]: the position of the center
+        """
+        return self._center
+
+    @center.setter
+    def center(self, center):
+        self._center = center
+        if self.order is not None:
+            self.order.move(self)
+
+    @property
+    def hold(self):
+        """
+        bool: whether the token is held by the player
+        """
+        return self._hold
+
+    @hold.setter
+    def hold(self, hold):
+        self._hold = hold
+        if self.order is not None:
+            self.order.move(self)
+
+    @property
+    def offset(self):
+        """
+        Tuple[float, float]: the position of the center relatively to where the token is drawn
+        """
+        return self._offset
+
+    @offset.setter
+    def offset(self, offset):
+        self._offset = offset
+        if self.order is not None:
+            self.order.move(self)
+
+    @classmethod
+    def render(cls, color):
+        """
+        Args:
+            color (Tuple[int, int, int])
+
+        Returns:
+            pygame.Surface: the token of this color, its center being at (Token.SIZE, 3 * Token.SIZE / 2)
+        """
+        color = tuple(color)
+        if color not in cls.SPRITES:
+            sprite = pygame.Surface((2 * cls.SIZE, 3 * cls.SIZE), flags=pygame.SRCALPHA)
+            c_dark = [c * cls.DARKEN_FACTOR for c in color]
+            pygame.draw.ellipse(sprite, c_dark, pygame.Rect(0, 2 * cls.SIZE, 2 * cls.SIZE, cls.SIZE))
+            pygame.draw.rect(sprite, c_dark, pygame.Rect(0, cls.SIZE / 2, 2 * cls.SIZE, 2 * cls.SIZE))
+            pygame.draw.ellipse(sprite, color, pygame.Rect(0, 0, 2 * cls.SIZE, cls.SIZE))
+            cls.SPRITES[color] = sprite
+        return cls.SPRITES[color]
 
     def collide(self, loc):
         """
@@ -617,12 +758,31 @@ class Token:
         """
         dx = (loc[0] - self.center[0]) / self.SIZE
         dy = (loc[1] - self.center[1]) / self.SIZE
-        if (abs(dx) < 1 and abs(dy) < 1) or dx ** 2 + (2 * dy + 2) ** 2 < 1 or dx ** 2 + (2 * dy - 2) ** 2 < 1:
-            self.offset = dx * self.SIZE, dy * self.SIZE
-            return True
+        return (abs(dx) < 1 and abs(dy) < 1) or dx ** 2 + (2 * dy + 2) ** 2 < 1 or dx ** 2 + (2 * dy - 2) ** 2 < 1
 
-        self.offset = 0, 0
-        return False
+    def grab(self, loc):
+        """
+        Hold the token from the given location, see Token.collide
+
+        Args:
+            loc (Tuple[float, float])
+
+        Returns:
+            None
+        """
+        self.offset = loc[0] - self.center[0], loc[1] - self.center[1]
+        self.hold = True
+
+    def look(self):
+        """
+        Returns:
+            Tuple[float, float, bool]: where the token is drawn, and whether it is held, the held tokens being on top
+        """
+        return self.center[0] - self.offset[0], self.center[1] - self.offset[1], self.hold
+
+    def bounds(self):
+        x, y = self.center[0] - self.offset[0], self.center[1] - self.offset[1]
+        return pygame.Rect(x - self.SIZE - 1, y - 3 * self.SIZE / 2 - 1, 2 * self.SIZE + 3, 3 * self.SIZE + 3)
 
     def draw_on(self, surface):
         """
@@ -634,12 +794,8 @@ class Token:
         Returns:
             None
         """
-        x, y = self.center[0] - self.offset[0], self.center[1] - self.offset[1]
-        c_dark = [c * self.DARKEN_FACTOR for c in self.color]
-        pygame.draw.ellipse(surface, c_dark, pygame.Rect(x - self.SIZE, y + self.SIZE / 2, 2 * self.SIZE, self.SIZE))
-        pygame.draw.rect(surface, c_dark, pygame.Rect(x - self.SIZE, y - self.SIZE, 2 * self.SIZE, 2 * self.SIZE))
-        pygame.draw.ellipse(surface, self.color, pygame.Rect(x - self.SIZE, y - 3 * self.SIZE / 2,
-                                                             2 * self.SIZE, self.SIZE))
+        surface.blit(self.sprite, (self.center[0] - self.offset[0] - self.SIZE,
+                                   self.center[1] - self.offset[1] - 3 * self.SIZE / 2))
 
     def drop(self):
         """
@@ -653,7 +809,195 @@ class Token:
         self.offset = 0, 0
 
 
-class Dice:
+class TokenOrder:
+    """
+    The tokens in drawing order, from bottom to top
+
+    The held tokens are on top, then the tokens are sorted by drawn position, from top to bottom and from left to right,
+    then by order of addition. The order is kept sorted as the tokens move, see Token.center, Token.hold and
+    Token.offset, so that it never needs to be sorted again.
+
+    The tokens registered in the hit-testing index are moved in the index as well.
+
+    Attributes:
+        tokens (List[Token]): the tokens, from bottom to top
+        keys (List[tuple]): the sort keys of the tokens, in the same order
+        placed (Dict[Token, tuple]): the sort key of every token
+        index (HitGrid): the hit-testing index, or None
+    """
+
+    def __init__(self):
+        self.tokens = []
+        self.keys = []
+        self.placed = {}
+        self.index = None
+
+    @staticmethod
+    def key(token, rank):
+        """
+        Args:
+            token (Token):
+            rank (int): the order of addition of the token
+
+        Returns:
+            tuple: the sort key of the token
+        """
+        return token.hold, token.center[1] - token.offset[1], token.center[0] - token.offset[0], rank
+
+    def insert(self, token, key):
+        """
+        Args:
+            token (Token): a token, not in the order
+            key (tuple): its sort key
+
+        Returns:
+            None
+        """
+        i = bisect.bisect(self.keys, key)
+        self.keys.insert(i, key)
+        self.tokens.insert(i, token)
+        self.placed[token] = key
+
+    def add(self, token):
+        """
+        Args:
+            token (Token): a token, not in any other order
+
+        Returns:
+            None
+        """
+        self.insert(token, self.key(token, len(self.placed)))
+        token.order = self
+
+    def move(self, token):
+        """
+        Reposition a token that moved
+
+        Args:
+            token (Token):
+
+        Returns:
+            None
+        """
+        old = self.placed[token]
+        key = self.key(token, old[-1])
+        if key != old:
+            i = bisect.bisect_left(self.keys, old)
+            del self.keys[i], self.tokens[i]
+            self.insert(token, key)
+            if self.index is not None and token in self.index.entries:
+                self.index.move(token, token.bounds(), self.depth(token))
+
+    def depth(self, token):
+        """
+        Args:
+            token (Token):
+
+        Returns:
+            tuple: the depth of the token in the hit-testing index, see HitGrid
+        """
+        return (HitGrid.TOKENS,) + self.placed[token]
+
+
+class HitGrid:
+    """
+    Uniform grid index of the objects the player may click on
+
+    Every object is registered with its bounding rectangle, in every cell of HitGrid.CELL pixels it overlaps,
+    and with a depth, the topmost object having the largest depth. A location is resolved by testing only the objects
+    of its cell, with their collide method.
+
+    Attributes:
+        cells (Dict[Tuple[int, int], List[any]]): the objects overlapping every cell
+        entries (Dict[any, Tuple[pygame.Rect, tuple]]): the bounding rectangle and depth of every object
+    """
+
+    CELL = 64
+
+    STATIC, TOKENS = 0, 1  # The first element of the depths, the tokens being above the other objects
+
+    def __init__(self):
+        self.cells = {}
+        self.entries = {}
+
+    def span(self, rect):
+        """
+        Args:
+            rect (pygame.Rect):
+
+        Returns:
+            Tuple[int, int, int, int]: the first and last columns, then the first and last rows of the cells overlapped
+        """
+        return (rect.left // self.CELL, (rect.right - 1) // self.CELL,
+                rect.top // self.CELL, (rect.bottom - 1) // self.CELL)
+
+    def add(self, target, rect, depth):
+        """
+        Args:
+            target (any): an object with a collide method, see Character.collide
+            rect (pygame.Rect): its bounding rectangle
+            depth (tuple): its depth, starting with HitGrid.STATIC or HitGrid.TOKENS
+
+        Returns:
+            None
+        """
+        rect = pygame.Rect(rect)
+        self.entries[target] = rect, depth
+        x_0, x_1, y_0, y_1 = self.span(rect)
+        for x in range(x_0, x_1 + 1):
+            for y in range(y_0, y_1 + 1):
+                self.cells.setdefault((x, y), []).append(target)
+
+    def remove(self, target):
+        """
+        Args:
+            target (any): a registered object
+
+        Returns:
+            None
+        """
+        rect, _ = self.entries.pop(target)
+        x_0, x_1, y_0, y_1 = self.span(rect)
+        for x in range(x_0, x_1 + 1):
+            for y in range(y_0, y_1 + 1):
+                self.cells[x, y].remove(target)
+
+    def move(self, target, rect, depth):
+        """
+        Update the bounding rectangle and depth of a registered object, changing its cells only if needed
+
+        Args:
+            target (any): a registered object
+            rect (pygame.Rect):
+            depth (tuple):
+
+        Returns:
+            None
+        """
+        rect = pygame.Rect(rect)
+        if self.span(rect) == self.span(self.entries[target][0]):
+            self.entries[target] = rect, depth
+        else:
+            self.remove(target)
+            self.add(target, rect, depth)
+
+    def at(self, loc):
+        """
+        Args:
+            loc (Tuple[float, float])
+
+        Returns:
+            any: the topmost object colliding with the location, or None
+        """
+        found, found_depth = None, None
+        for target in self.cells.get((int(loc[0] // self.CELL), int(loc[1] // self.CELL)), ()):
+            rect, depth = self.entries[target]
+            if (found is None or depth > found_depth) and rect.collidepoint(loc) and target.collide(loc):
+                found, found_depth = target, depth
+        return found
+
+
+class Dice(Drawable):
     """
     A dice
 
@@ -661,15 +1005,19 @@ class Dice:
         n_val (int): the values on the dice are 1, ..., n_val
         roll_since (float): since when is the dice rolling, or -1 if it is not
         value (int): the current value, note that it is not the displayed value if the dice is rolling
+        shown (int): the displayed value
         center (Tuple[float, float]): the position of the dice center
-        edges (list)
+        frames (List[List[pygame.Surface]]): the rotation frames of every value, see Dice.render
+        frame (int): the displayed rotation frame
     """
     SIZE = 30
     ROLL_TIME = 1000
-    ROLL_SPEED = 0.05
+    ROLL_SPEED = 0.05  # The rotation per frame while rolling, in turns / 2
     COLOR = (0, 255, 0)
     FONT_COLOR = (255, 255, 255)
 
+    FRAMES = {}  # The pre-rendered dices, by shape and number of values, see Dice.render
+
     def __init__(self, n_shape, n_val, center, value):
         """
         Args:
@@ -678,41 +1026,84 @@ class Dice:
             center (Tuple[float, float])
             value (int)
         """
+        super().__init__()
         self.n_val = n_val
         self.roll_since = -1
         self.value = value
+        self.shown = value
 
-        angles = [math.pi * ((2 * k + 1) / n_shape + 1 / 2) for k in range(n_shape)]
         self.center = center
-        self.edges = [(self.center[0] + self.SIZE * math.cos(theta),
-                       self.center[1] + self.SIZE * math.sin(theta)) for theta in angles]
+        self.frames = self.render(n_shape, n_val)
+        self.frame = 0
 
-    def draw_on(self, surface):
+    @classmethod
+    def render(cls, n_shape, n_val):
         """
-        Draw the dice on the surface
+        Pre-render the dice turned by every multiple of Dice.ROLL_SPEED, up to the symmetry of the shape
 
         Args:
-            surface (pygame.Surface)
+            n_shape (int)
+            n_val (int)
+
+        Returns:
+            List[List[pygame.Surface]]: the rotation frames of every value, the dice center being at the center
+        """
+        if (n_shape, n_val) not in cls.FRAMES:
+            n_frames = round(2 / cls.ROLL_SPEED)
+            if n_frames % n_shape == 0:
+                n_frames //= n_shape
+            font = TEXT_CACHE.font(None, cls.SIZE)
+            frames = []
+            for value in range(1, n_val + 1):
+                text_value = TEXT_CACHE.render(str(value), font, cls.FONT_COLOR)
+                frames.append([])
+                for k in range(n_frames):
+                    sprite = pygame.Surface((2 * cls.SIZE + 1, 2 * cls.SIZE + 1), flags=pygame.SRCALPHA)
+                    angles = [math.pi * ((2 * i + 1) / n_shape + 1 / 2 - k * cls.ROLL_SPEED) for i in range(n_shape)]
+                    edges = [(cls.SIZE * (1 + math.cos(theta)), cls.SIZE * (1 + math.sin(theta))) for theta in angles]
+                    pygame.draw.polygon(sprite, cls.COLOR, edges)
+                    sprite.blit(text_value, (cls.SIZE - text_value.get_width() / 2,
+                                             cls.SIZE - text_value.get_height() / 2))
+                    frames[-1].append(sprite)
+            cls.FRAMES[n_shape, n_val] = frames
+        return cls.FRAMES[n_shape, n_val]
+
+    def step(self):
+        """
+        Animate the dice for the next frame, showing a random value and turning it while it is rolling
 
         Returns:
             None
         """
         if self.roll_since != -1 and pygame.time.get_ticks() - self.roll_since < self.ROLL_TIME:
-            value = random.randint(1, self.n_val)
-            for i in range(len(self.edges)):
-                dx, dy = self.edges[i][0] - self.center[0], self.edges[i][1] - self.center[1]
-                c, s = math.cos(self.ROLL_SPEED * math.pi), math.sin(self.ROLL_SPEED * math.pi)
-                self.edges[i] = (self.center[0] + c * dx + s * dy, self.center[1] - s * dx + c * dy)
+            self.shown = random.randint(1, self.n_val)
+            self.frame = (self.frame + 1) % len(self.frames[0])
         else:
             self.roll_since = -1
-            value = self.value
+            self.shown = self.value
 
-        font = pygame.font.Font(pygame.font.get_default_font(), self.SIZE)
-        text_value = font.render(str(value), True, self.FONT_COLOR)
+    def look(self):
+        """
+        Returns:
+            Tuple[int, int]: the displayed value and rotation frame
+        """
+        return self.shown, self.frame
+
+    def bounds(self):
+        return pygame.Rect(self.center[0] - self.SIZE - 1, self.center[1] - self.SIZE - 1,
+                           2 * self.SIZE + 3, 2 * self.SIZE + 3)
+
+    def draw_on(self, surface):
+        """
+        Draw the dice on the surface, see Dice.step
+
+        Args:
+            surface (pygame.Surface)
 
-        pygame.draw.polygon(surface, self.COLOR, self.edges, 0)
-        surface.blit(text_value, (self.center[0] - text_value.get_width() / 2,
-                                  self.center[1] - text_value.get_height() / 2))
+        Returns:
+            None
+        """
+        surface.blit(self.frames[self.shown - 1][self.frame], (self.center[0] - self.SIZE, self.center[1] - self.SIZE))
 
     def roll_to(self, value):
         """
@@ -728,7 +1119,7 @@ class Dice:
         self.value = value
 
 
-class ActivePlayer:
+class ActivePlayer(Drawable):
     """
     Manage the active player
 
@@ -749,11 +1140,11 @@ class ActivePlayer:
             i (int): the active player id
             owner (int): the id of the player owning the Game instance
         """
+        super().__init__()
         self.i = i
         self.owner = owner
 
-        font = pygame.font.Font(pygame.font.get_default_font(), self.FONT_SIZE)
-        text = font.render("Fin du tour", True, (0, 0, 0))
+        text = TEXT_CACHE.render("Fin du tour", TEXT_CACHE.font(None, self.FONT_SIZE), (0, 0, 0))
         self.end_turn = pygame.Surface((text.get_width() + 2 * self.MARGIN, text.get_height() + 2 * self.MARGIN))
         self.end_turn.fill(self.BUTTON_COLOR)
         self.end_turn.blit(text, (self.MARGIN, self.MARGIN))
@@ -772,6 +1163,32 @@ class ActivePlayer:
             loc[0] - self.S_POSITION[0] + self.end_turn.get_width() / 2,
             loc[1] - self.S_POSITION[1] + self.end_turn.get_height())
 
+    def look(self):
+        """
+        Returns:
+            int: the active player
+        """
+        return self.i
+
+    def layout(self):
+        """
+        Returns:
+            List[Tuple[pygame.Surface, Tuple[float, float]]]: the surfaces showing the active player status,
+                with their position
+        """
+        if self.i == self.owner:
+            return [(self.end_turn, (self.S_POSITION[0] - self.end_turn.get_width() / 2,
+                                     self.S_POSITION[1] - self.end_turn.get_height()))]
+        font = TEXT_CACHE.font(None, self.FONT_SIZE)
+        text = TEXT_CACHE.render("Tour du joueur : ", font, (0, 0, 0))
+        name = TEXT_CACHE.render(PLAYERS[self.i][0], font, PLAYERS[self.i][1])
+        return [(text, (self.S_POSITION[0] - text.get_width(), self.S_POSITION[1] - text.get_height())),
+                (name, (self.S_POSITION[0], self.S_POSITION[1] - name.get_height()))]
+
+    def bounds(self):
+        rects = [surface.get_rect(topleft=position) for surface, position in self.layout()]
+        return rects[0].unionall(rects[1:])
+
     def draw_on(self, surface):
         """
         Draw the active player status :
@@ -783,15 +1200,96 @@ class ActivePlayer:
         Returns:
             None
         """
-        if self.i == self.owner:
-            surface.blit(self.end_turn, (self.S_POSITION[0] - self.end_turn.get_width() / 2,
-                                         self.S_POSITION[1] - self.end_turn.get_height()))
-        else:
-            font = pygame.font.Font(pygame.font.get_default_font(), 20)
-            text = font.render("Tour du joueur : ", True, (0, 0, 0))
-            surface.blit(text, (self.S_POSITION[0] - text.get_width(), self.S_POSITION[1] - text.get_height()))
-            text = font.render(PLAYERS[self.i][0], True, PLAYERS[self.i][1])
-            surface.blit(text, (self.S_POSITION[0], self.S_POSITION[1] - text.get_height()))
+        for text, position in self.layout():
+            surface.blit(text, position)
+
+
+class TextCache:
+    """
+    Cache of the fonts and of the rendered texts, shared by the whole display
+
+    The fonts are kept by name and size. The rendered texts are kept by text, font and color, the least recently used
+    being dropped beyond TextCache.MAX_TEXTS. The rendered surfaces are shared, and must not be modified.
+
+    Attributes:
+        fonts (Dict[Tuple[str, int], pygame.font.Font]): the fonts, by name and size
+        texts (collections.OrderedDict): the rendered texts, by text, font and color, the most recently used last
+        hits (int): the number of texts found in the cache
+        misses (int): the number of texts rendered
+    """
+
+    MAX_TEXTS = 256
+
+    def __init__(self):
+        self.fonts = {}
+        self.texts = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def font(self, name, size):
+        """
+        Args:
+            name (str): a system font name, or None for the pygame default font
+            size (int)
+
+        Returns:
+            pygame.font.Font
+        """
+        font = self.fonts.get((name, size))
+        if font is None:
+            if name is None:
+                font = pygame.font.Font(pygame.font.get_default_font(), size)
+            else:
+                font = pygame.font.SysFont(name, size)
+            self.fonts[name, size] = font
+        return font
+
+    def render(self, text, font, color):
+        """
+        Args:
+            text (str): a single line of text
+            font (pygame.font.Font): a font returned by TextCache.font
+            color (Tuple[int, int, int])
+
+        Returns:
+            pygame.Surface: the antialiased text
+        """
+        key = text, font, tuple(color)
+        surface = self.texts.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.texts.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = self.texts[key] = font.render(text, True, color)
+        if len(self.texts) > self.MAX_TEXTS:
+            self.texts.popitem(last=False)
+        return surface
+
+
+TEXT_CACHE = TextCache()
+""" The text cache of the display """
+
+
+def merge_rects(rects):
+    """
+    Merge the overlapping rectangles
+
+    Args:
+        rects (List[pygame.Rect]):
+
+    Returns:
+        List[pygame.Rect]: rectangles that do not overlap, covering the given ones
+    """
+    merged = []
+    for rect in rects:
+        rect = pygame.Rect(rect)
+        i = rect.collidelist(merged)
+        while i != -1:
+            rect.union_ip(merged.pop(i))
+            i = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
 
 
 def render_text(text, font, color, surface, justify, x, y):
@@ -811,7 +1309,7 @@ def render_text(text, font, color, surface, justify, x, y):
         float: the y coordinate of the last rendered line
     """
     for line in text.split('\n'):
-        text = font.render(line, True, color)
+        text = TEXT_CACHE.render(line, font, color)
         if justify == 'l':
             surface.blit(text, (x, y))
         elif justify == 'r':
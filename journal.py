@@ -0,0 +1,247 @@
+"""
+Implements the game journal, used to recover the rooms after a crash or a restart of the server
+
+The journal of a room is an append-only file of records, each record being its length on 4 bytes then its payload,
+the event ['event', version, message] encoded by comm.BinaryCodec.
+Every Journal.SNAPSHOT_EVERY events, the whole room state is written in a snapshot file, then the journal is emptied.
+The room is rebuilt from the snapshot and the events of the journal that follow it.
+A record truncated by a crash is ignored.
+
+The records are written in batches, and synced to the disk at most Journal.FSYNC_DELAY seconds after being appended.
+The syncs and the snapshots are written in the default executor, so that they never block the event loop. The journal
+is emptied once the snapshot is on the disk, keeping the records written meanwhile, the room ignoring on recovery
+the records that the snapshot already contains.
+"""
+
+import asyncio
+import json
+import os
+import struct
+
+import comm
+
+_LENGTH = struct.Struct('<I')
+
+
+class Journal:
+    """
+    The journal of a room
+
+    Attributes:
+        path (str): the journal file
+        snapshot_path (str): the snapshot file
+        fd (int): the journal file descriptor, opened in append mode, or None once closed
+        pending (bytearray): the records waiting to be written
+        flush_timer (asyncio.TimerHandle): the timer writing the pending records, or None
+        syncs (Set[asyncio.Future]): the syncs to the disk and the snapshot writes running in the default executor
+        written (bytearray): the records written since the running snapshot started, or None if there is none
+    """
+
+    SNAPSHOT_EVERY = 1000
+    FSYNC_DELAY = 0.05
+
+    def __init__(self, directory, room_id):
+        """
+        Args:
+            directory (str): the directory of the journals
+            room_id (str):
+        """
+        name = os.path.join(directory, 'room-{0}'.format(room_id.encode().hex()))
+        self.path = name + '.journal'
+        self.snapshot_path = name + '.snapshot'
+        os.makedirs(directory, exist_ok=True)
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.pending = bytearray()
+        self.flush_timer = None
+        self.syncs = set()
+        self.written = None
+
+    def load(self):
+        """
+        Read the snapshot and the journal
+
+        Returns:
+            Tuple[dict, List[Tuple[int, list]]]: the snapshot state, or None if there is no snapshot,
+                and the journaled events with their version, in order
+        """
+        state = None
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'rb') as f:
+                state = json.loads(f.read())
+
+        events = []
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        pos = 0
+        while pos + _LENGTH.size <= len(data):
+            length, = _LENGTH.unpack_from(data, pos)
+            if pos + _LENGTH.size + length > len(data):
+                break
+            _, version, msg = comm.BinaryCodec.decode(data[pos + _LENGTH.size:pos + _LENGTH.size + length])
+            events.append((version, msg))
+            pos += _LENGTH.size + length
+        return state, events
+
+    def append(self, version, data):
+        """
+        Append an event to the journal
+
+        Args:
+            version (int): the room version after the event
+            data (list): the event
+
+        Returns:
+            None
+        """
+        payload = comm.BinaryCodec.encode(['event', version, data])
+        self.pending += _LENGTH.pack(len(payload)) + payload
+        if self.flush_timer is None:
+            self.flush_timer = asyncio.get_running_loop().call_later(self.FSYNC_DELAY, self.flush)
+
+    def flush(self, sync=False):
+        """
+        Write the pending records, and sync them to the disk without blocking the event loop
+
+        Args:
+            sync (bool): if True, sync them to the disk before returning
+
+        Returns:
+            None
+        """
+        if self.flush_timer is not None:
+            self.flush_timer.cancel()
+            self.flush_timer = None
+        if self.pending:
+            os.write(self.fd, self.pending)
+            if self.written is not None:
+                self.written += self.pending
+            self.pending.clear()
+            if sync:
+                os.fsync(self.fd)
+            else:
+                self.run_in_executor(os.fsync, self.fd)
+
+    def run_in_executor(self, func, *args):
+        """
+        Run a function in the default executor, keeping its future in Journal.syncs until it is done
+
+        Args:
+            func (Callable):
+            *args: the arguments of func
+
+        Returns:
+            asyncio.Future:
+        """
+        future = asyncio.get_running_loop().run_in_executor(None, func, *args)
+        self.syncs.add(future)
+        future.add_done_callback(self.syncs.discard)
+        return future
+
+    def snapshot(self, state):
+        """
+        Write a snapshot of the room in the default executor, then empty the journal, see Journal.write_snapshot
+
+        The snapshot is skipped if the previous one is still being written, the journal keeping every record
+
+        Args:
+            state (dict): the room state, see server.Room.state
+
+        Returns:
+            None
+        """
+        if self.written is not None:
+            return
+        self.flush()
+        self.written = bytearray()
+        self.run_in_executor(self.write_snapshot, json.dumps(state).encode()).add_done_callback(self.snapshot_written)
+
+    def write_snapshot(self, data):
+        """
+        Write a snapshot file and sync it to the disk, in the default executor
+
+        Args:
+            data (bytes): the encoded room state
+
+        Returns:
+            None
+        """
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+    def snapshot_written(self, future):
+        """
+        Empty the journal once the snapshot is on the disk, writing back the records written meanwhile
+
+        Args:
+            future (asyncio.Future): the future of Journal.write_snapshot
+
+        Returns:
+            None
+        """
+        written, self.written = self.written, None
+        if future.cancelled() or self.fd is None:
+            return
+        future.result()  # Raises if the snapshot could not be written, the journal being kept
+        os.ftruncate(self.fd, 0)
+        if written:
+            os.write(self.fd, written)
+            self.run_in_executor(os.fsync, self.fd)
+
+    def close(self):
+        """
+        Write the pending records and close the journal
+
+        Returns:
+            None
+        """
+        self.flush(sync=True)
+        fd, self.fd = self.fd, None
+        self.after_syncs(os.close, fd)
+
+    def after_syncs(self, func, *args):
+        """
+        Call a function once the running syncs and snapshot writes are done, so that they never use a closed
+        or reused descriptor, or a deleted file
+
+        Args:
+            func (Callable):
+            *args: the arguments of func
+
+        Returns:
+            None
+        """
+        if self.syncs:
+            asyncio.gather(*self.syncs, return_exceptions=True).add_done_callback(lambda _: func(*args))
+        else:
+            func(*args)
+
+    def delete(self, fd):
+        """
+        Close the journal file descriptor and delete the journal files
+
+        Args:
+            fd (int): the journal file descriptor
+
+        Returns:
+            None
+        """
+        os.close(fd)
+        for path in (self.path, self.snapshot_path, self.snapshot_path + '.tmp'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def remove(self):
+        """
+        Close the journal and delete its files
+
+        Returns:
+            None
+        """
+        if self.flush_timer is not None:
+            self.flush_timer.cancel()
+        fd, self.fd = self.fd, None
+        self.after_syncs(self.delete, fd)
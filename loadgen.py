@@ -0,0 +1,478 @@
+"""
+Puts synthetic load on a game server, to size the hardware
+
+The load generator runs headless bots, see Bot, filling rooms of --players bots each. Every bot sends actions at
+--rate actions per second, drawn at random from the --mix weights, or cycling through the actions of a --script file,
+one JSON action per line such as ["token"], ["dices"], ["draw", 0] or ["turn"].
+The bots run on asyncio event loops, spread across --processes processes, each process owning whole rooms.
+Every room may also have --spectators bots watching it, directly or through a --relay, see relay.
+
+The action-to-broadcast latency is the delay between sending an action and the first bot of the room receiving the
+resulting event. The token moves and the draws are matched exactly with their event, the token coordinates and the
+drawing player identifying them, a token move overwritten by a later move of the same token before the server broadcast
+it being ignored, while the dice rolls and the turn ends are matched in the order they were sent in the
+room, which is only an approximation when several bots of the room send them at the same time.
+The spectator latency is the delay between the first player and a spectator of the room receiving an event.
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import multiprocessing
+import random
+import time
+
+import comm
+import model
+import server
+import session
+
+_N_TYPES = len(model.CARDS)  # The number of card piles
+_N_TOKENS = 2 * server._N_PLAYERS  # The number of tokens, 2 per player
+_W, _H = model.BOARD_W, model.BOARD_H
+
+
+class RoomTracker:
+    """
+    Matches the actions sent by the bots of a room with the events they receive
+
+    Attributes:
+        version (int): the last event version received by a bot of the room
+        pending (Dict[Any, float]): the send time of the pending token moves and draws, by event
+        fifo (Dict[str, collections.deque]): the send times of the pending dice rolls and turn ends
+        samples (Dict[str, List[float]]): the latencies measured, by action
+        receipts (collections.OrderedDict): the time the last events were first received by a player, by version
+    """
+
+    RECEIPTS_SIZE = 1024
+
+    def __init__(self, samples):
+        """
+        Args:
+            samples (Dict[str, List[float]]): the latencies measured, by action, shared by the rooms
+        """
+        self.version = -1
+        self.pending = {}
+        self.fifo = collections.defaultdict(collections.deque)
+        self.samples = samples
+        self.receipts = collections.OrderedDict()
+
+    def sent(self, key, t):
+        """
+        Called when a bot sends an action
+
+        Args:
+            key (tuple): the event expected, see RoomTracker.key
+            t (float): the send time
+
+        Returns:
+            None
+        """
+        if key[0] in ('dices', 'turn'):
+            self.fifo[key[0]].append(t)
+        else:
+            self.pending[key] = t
+
+    def received(self, version, data, t):
+        """
+        Called when a bot receives an event
+
+        Args:
+            version (int): the event version
+            data (list): the event
+            t (float): the reception time
+
+        Returns:
+            None
+        """
+        if version <= self.version:
+            return
+        self.version = version
+        self.receipts[version] = t
+        if len(self.receipts) > self.RECEIPTS_SIZE:
+            self.receipts.popitem(last=False)
+        if data[0] == 'tokens':
+            for i, center in data[1]:
+                t0 = self.pending.pop(self.key(['token', i, center]), None)
+                for key in [key for key in self.pending if key[:2] == ('token', i)]:  # Coalesced by the server
+                    del self.pending[key]
+                if t0 is not None:
+                    self.samples['token'].append(t - t0)
+            return
+        if data[0] in ('dices', 'turn'):
+            t0 = self.fifo[data[0]].popleft() if self.fifo[data[0]] else None
+        else:
+            t0 = self.pending.pop(self.key(data), None)
+        if t0 is not None:
+            self.samples[data[0]].append(t - t0)
+
+    def watched(self, version, t):
+        """
+        Called when a spectator receives an event
+
+        Args:
+            version (int): the event version
+            t (float): the reception time
+
+        Returns:
+            None
+        """
+        if version in self.receipts:
+            self.samples['spectator'].append(t - self.receipts[version])
+
+    @staticmethod
+    def key(data):
+        """
+        Args:
+            data (list): an action, as sent by a bot, or an event
+
+        Returns:
+            tuple: the key identifying the event of the action
+        """
+        if data[0] == 'token':
+            return 'token', data[1], tuple(data[2])
+        if data[0] == 'draw':
+            return 'draw', data[1], data[2]
+        return data[0],
+
+
+class Bot(session.Session):
+    """
+    Headless game client, on asyncio streams, playing or watching a room
+
+    Attributes:
+        tracker (RoomTracker): the tracker of the room
+        spectator (bool): whether the bot watches the room instead of playing
+        stats (collections.Counter): the number of messages sent and received, shared by the bots
+        writer (asyncio.StreamWriter): the connection to the server
+        drawing (Dict[int, float]): the send time of the pending draws, by pile
+        exhausted (Set[int]): the piles found empty
+    """
+
+    DRAW_TIMEOUT = 1  # A draw not answered after this delay is considered to have hit an empty pile
+
+    def __init__(self, room, tracker, stats, spectator=False):
+        """
+        Args:
+            room (str): the room to join on the server
+            tracker (RoomTracker): the tracker of the room
+            stats (collections.Counter): the number of messages sent and received, shared by the bots
+            spectator (bool): whether to watch the room instead of playing
+        """
+        super().__init__(room)
+        self.tracker = tracker
+        self.spectator = spectator
+        self.stats = stats
+        self.writer = None
+        self.drawing = {}
+        self.exhausted = set()
+
+    async def run(self, host, port, actions, rate, end):
+        """
+        Connects to the server and sends actions until the end time, or only receives the events for a spectator
+
+        Args:
+            host (str):
+            port (int):
+            actions (Iterator[list]): the actions to send, see Bot.act, or None for a spectator
+            rate (float): the number of actions per second
+            end (float): the time to stop at
+
+        Returns:
+            None
+        """
+        reader, self.writer = await asyncio.open_connection(host, port)
+        self.writer.write(comm.encode(self.watch_message() if self.spectator else self.join_message()))
+        welcome = None
+        while welcome is None:
+            data = await reader.read(comm.Decoder.BUFFER_SIZE)
+            if not data:
+                raise ConnectionError("connection closed by the server")
+            self.decoder.feed(data)
+            welcome = next(self.decoder.frames(), None)
+        if not self.handle_welcome(welcome):
+            raise ConnectionError("room '{0}' denied the connection".format(self.room))
+        self.writer.write(comm.encode(self.codec_message()))
+
+        sender = asyncio.ensure_future(self.send_actions(actions, rate, end)) if not self.spectator else None
+        try:
+            while time.monotonic() < end:
+                try:
+                    data = await asyncio.wait_for(reader.read(comm.Decoder.BUFFER_SIZE), end - time.monotonic())
+                except asyncio.TimeoutError:
+                    break
+                if not data:
+                    break
+                self.decoder.feed(data)
+                for msg in self.decoder.frames():
+                    self.stats['watched' if self.spectator else 'received'] += 1
+                    self.handle_message(msg)
+        finally:
+            if sender is not None:
+                sender.cancel()
+            self.writer.close()
+
+    async def send_actions(self, actions, rate, end):
+        """
+        Sends actions at the given rate, with exponential delays between them, until the end time
+
+        Args:
+            actions (Iterator[list]): the actions to send, see Bot.act
+            rate (float): the number of actions per second
+            end (float): the time to stop at
+
+        Returns:
+            None
+        """
+        while True:
+            await asyncio.sleep(random.expovariate(rate))
+            if time.monotonic() >= end:
+                return
+            self.act(next(actions))
+
+    def act(self, action):
+        """
+        Sends an action
+
+        Args:
+            action (list): ['token'] to move a random token, ['dices'], ['turn'], or ['draw'] to draw from a random
+                non empty pile, the token or the pile may be given as second item
+
+        Returns:
+            None
+        """
+        t = time.monotonic()
+        if action[0] == 'token':
+            i = action[1] if len(action) > 1 else random.randrange(_N_TOKENS)
+            data = ['token', i, [random.randrange(_W), random.randrange(_H)]]
+        elif action[0] == 'draw':
+            for i_type, t0 in list(self.drawing.items()):
+                if t - t0 > self.DRAW_TIMEOUT:
+                    del self.drawing[i_type]
+                    self.exhausted.add(i_type)
+            piles = [i for i in range(_N_TYPES) if i not in self.drawing and i not in self.exhausted]
+            if len(action) > 1:
+                piles = [action[1]] if action[1] in piles else []
+            if not piles:
+                return
+            data = ['draw', random.choice(piles)]
+            self.drawing[data[1]] = t
+            self.tracker.sent(('draw', self.i, data[1]), t)
+            self.send_message(data)
+            return
+        else:
+            data = [action[0]]
+        self.tracker.sent(self.tracker.key(data), t)
+        self.send_message(data)
+
+    def handle_message(self, msg):
+        if msg[0] == 'event' and self.spectator:
+            self.tracker.watched(msg[1], time.monotonic())
+        elif msg[0] == 'event':
+            self.tracker.received(msg[1], msg[2], time.monotonic())
+        super().handle_message(msg)
+
+    def on_draw(self, i_player, i_type, i_card):
+        if i_player == self.i:
+            self.drawing.pop(i_type, None)
+
+    def send_message(self, data):
+        self.stats['sent'] += 1
+        self.writer.write(comm.encode(data, self.codec))
+
+
+def random_actions(mix):
+    """
+    Yields random actions
+
+    Args:
+        mix (Dict[str, float]): the weight of each action
+
+    Yields:
+        list: the action, see Bot.act
+    """
+    names, weights = list(mix), list(mix.values())
+    while True:
+        yield [random.choices(names, weights)[0]]
+
+
+def script_actions(script):
+    """
+    Yields the actions of a script, forever, starting at a random position
+
+    Args:
+        script (List[list]): the actions, see Bot.act
+
+    Yields:
+        list: the action
+    """
+    start = random.randrange(len(script))
+    while True:
+        for action in script[start:] + script[:start]:
+            yield action
+
+
+async def run_rooms(host, port, rooms, rate, duration, mix, script, spectators=0, relay=None):
+    """
+    Runs the bots of some rooms
+
+    Args:
+        host (str):
+        port (int):
+        rooms (List[Tuple[str, int]]): the rooms to fill, with their number of bots
+        rate (float): the number of actions per second of each bot
+        duration (float): the duration of the load, in seconds
+        mix (Dict[str, float]): the weight of each action, for random actions
+        script (List[list]): the actions, or None for random actions
+        spectators (int): the number of spectators of each room
+        relay (Tuple[str, int]): the relay the spectators connect to, or None to connect them to the server
+
+    Returns:
+        dict: the latencies measured by action, in seconds, and the number of messages sent, received by the players
+            and received by the spectators
+    """
+    samples = collections.defaultdict(list)
+    stats = collections.Counter()
+    end = time.monotonic() + duration
+    bots = []
+    for room, players in rooms:
+        tracker = RoomTracker(samples)
+        for _ in range(players):
+            bot = Bot(room, tracker, stats)
+            actions = random_actions(mix) if script is None else script_actions(script)
+            bots.append(bot.run(host, port, actions, rate, end))
+        for _ in range(spectators):
+            bot = Bot(room, tracker, stats, spectator=True)
+            bots.append(bot.run(*(relay or (host, port)), None, rate, end))
+    results = await asyncio.gather(*bots, return_exceptions=True)
+    errors = collections.Counter(repr(result) for result in results if isinstance(result, Exception))
+    return {'samples': dict(samples), 'sent': stats['sent'], 'received': stats['received'],
+            'watched': stats['watched'], 'errors': dict(errors)}
+
+
+def run_process(args):
+    """
+    Runs the bots of some rooms in a new event loop, for a process pool
+
+    Args:
+        args (tuple): the arguments of run_rooms
+
+    Returns:
+        dict: see run_rooms
+    """
+    return asyncio.run(run_rooms(*args))
+
+
+def percentile(samples, p):
+    """
+    Args:
+        samples (List[float]): sorted samples
+        p (float): between 0 and 100
+
+    Returns:
+        float: the nearest-rank percentile of the samples
+    """
+    return samples[min(len(samples) - 1, max(0, int(round(p / 100 * len(samples))) - 1))]
+
+
+def report(results, duration):
+    """
+    Merges the results of the processes
+
+    Args:
+        results (List[dict]): see run_rooms
+        duration (float): the duration of the load, in seconds
+
+    Returns:
+        dict: the number of latency samples, and the p50 and p99 latencies in milliseconds, by action,
+            the messages sent and received per second, and the connection errors
+    """
+    samples = collections.defaultdict(list)
+    errors = collections.Counter()
+    for result in results:
+        for action, values in result['samples'].items():
+            samples[action] += values
+        errors.update(result['errors'])
+    latency = {}
+    for action, values in sorted(samples.items()):
+        values.sort()
+        latency[action] = {'count': len(values),
+                           'p50_ms': 1000 * percentile(values, 50),
+                           'p99_ms': 1000 * percentile(values, 99)}
+    return {'latency': latency,
+            'sent_per_s': sum(result['sent'] for result in results) / duration,
+            'received_per_s': sum(result['received'] for result in results) / duration,
+            'watched_per_s': sum(result['watched'] for result in results) / duration,
+            'errors': dict(errors)}
+
+
+def parse_mix(text):
+    """
+    Args:
+        text (str): the weights as 'action=weight,...'
+
+    Returns:
+        Dict[str, float]: the weight of each action
+    """
+    mix = {}
+    for item in text.split(','):
+        action, weight = item.split('=')
+        if action not in ('token', 'dices', 'draw', 'turn'):
+            raise argparse.ArgumentTypeError("unknown action '{0}'".format(action))
+        mix[action] = float(weight)
+    return mix
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Shadow Hunters server load generator")
+    parser.add_argument('--host', default='localhost', help="the server address")
+    parser.add_argument('--port', type=int, default=1616, help="the server port")
+    parser.add_argument('--bots', type=int, default=80, help="the number of bots")
+    parser.add_argument('--players', type=int, default=8, help="the number of bots per room")
+    parser.add_argument('--rooms', default='load-', help="the prefix of the room names")
+    parser.add_argument('--rate', type=float, default=2, help="the number of actions per second of each bot")
+    parser.add_argument('--duration', type=float, default=30, help="the duration of the load, in seconds")
+    parser.add_argument('--mix', type=parse_mix, default='token=8,dices=1,draw=1,turn=1',
+                        help="the weights of the random actions, as 'action=weight,...'")
+    parser.add_argument('--script', metavar='FILE',
+                        help="cycle through the actions of this file, one JSON list per line, instead of random ones")
+    parser.add_argument('--spectators', type=int, default=0, help="the number of spectators per room")
+    parser.add_argument('--relay', metavar='HOST:PORT',
+                        help="connect the spectators to this relay instead of the server")
+    parser.add_argument('--processes', type=int, default=1, help="the number of processes running the bots")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args()
+
+    script = None
+    if args.script is not None:
+        with open(args.script) as f:
+            script = [json.loads(line) for line in f if line.strip()]
+
+    rooms = [('{0}{1}'.format(args.rooms, k), min(args.players, args.bots - k))
+             for k in range(0, args.bots, args.players)]
+    chunks = [rooms[k::args.processes] for k in range(args.processes)]
+    relay = None
+    if args.relay is not None:
+        relay_host, _, relay_port = args.relay.rpartition(':')
+        relay = relay_host or 'localhost', int(relay_port)
+    jobs = [(args.host, args.port, chunk, args.rate, args.duration, args.mix, script, args.spectators, relay)
+            for chunk in chunks if chunk]
+    if len(jobs) == 1:
+        results = [run_process(jobs[0])]
+    else:
+        with multiprocessing.Pool(len(jobs)) as pool:
+            results = pool.map(run_process, jobs)
+
+    summary = report(results, args.duration)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        for action, values in summary['latency'].items():
+            print("{0:>6}: {1:6d} samples, p50 {2:8.2f} ms, p99 {3:8.2f} ms".format(
+                action, values['count'], values['p50_ms'], values['p99_ms']))
+        print("Sent {0:.0f} msg/s, received {1:.0f} msg/s".format(summary['sent_per_s'], summary['received_per_s']))
+        if args.spectators:
+            print("Spectators received {0:.0f} msg/s".format(summary['watched_per_s']))
+        for error, count in summary['errors'].items():
+            print("{0} bots failed: {1}".format(count, error))
@@ -0,0 +1,549 @@
+"""
+Implements the game rules and data, without any display
+
+The game state is a State, holding Character objects, both with __slots__ so that many games fit in memory.
+The transition functions (deal, move, roll, reveal, turn, draw, take) change a state in place, without any IO,
+drawing their random values from the given random generator only, so that a game is reproducible from its seed and
+many games can be simulated per second, see bench. The events exchanged with the clients are applied by apply.
+
+The module does not import pygame nor tkinter, and is shared by the server, the client display and the tools.
+"""
+
+import math
+
+PLAYERS = [('Red', (255, 0, 0)), ('Green', (0, 255, 0)), ('Blue', (0, 0, 255)), ('White', (255, 255, 255)),
+           ('Orange', (250, 150, 50)), ('Yellow', (255, 255, 0)), ('Purple', (100, 0, 200)), ('Black', (20, 20, 20))]
+""" List of the player, where a player is represented by the tuple (name (str), color_rgb (Tuple[int, int, int])) """
+
+SHADOW, NEUTRAL, HUNTER = 0, 1, 2  # The alignments
+
+CHARACTERS = [
+    [
+        ('Métamorphe',
+         11,
+         "Tous les personnages Hunter\nsont morts ou 3 personnages\nNeutres sont morts.",
+         "Pouvoir permanent : Imitation",
+         "Vous pouvez mentir (sans\navoir à révéler votre identité)\nlorsqu'on vous donne\nune carte Vision."),
+        ('Momie',
+         11,
+         "Tous les personnages Hunter\nsont morts ou 3 personnages\nNeutres sont morts.",
+         "Capacité spéciale :\nRayon d'Outremonde",
+         "Au début de votre tour,\nvous pouvez infliger 3 Blessures\nà un joueur présent dans le Lieu\n"
+         "Porte de l'Outremonde."),
+        ('Vampire',
+         13,
+         "Tous les personnages Hunter\nsont morts ou 3 personnages\nNeutres sont morts.",
+         "Capacité spéciale : Morsure",
+         "Si vous attaquez un joueur\net lui infligez des Blessures,\nsoignez immédiatement\n2 de vos Blessures."),
+        ('Valkyrie',
+         13,
+         "Tous les personnages Hunter\nsont morts ou 3 personnages\nNeutres sont morts.",
+         "Capacité spéciale : Chant de guerre",
+         "Quand vous attaquez,\nlancez seulement le dé à 4 faces\npour déterminer les dégats."),
+        ('Loup-Garou',
+         14,
+         "Tous les personnages Hunter\nsont morts ou 3 personnages\nNeutres sont morts.",
+         "Capacité spéciale : Contre-attaque",
+         "Après avoir subi l'attaque\nd'un joueur, vous pouvez\ncontre-attaquer immédiatement."),
+        ('Liche',
+         14,
+         "Tous les personnages Hunter\nsont morts ou 3 personnages\nNeutres sont morts.",
+         "Capacité spéciale : Nécromancie",
+         "Vous pouvez rejouer autant de fois\nqu'il y a de personnages morts.\nUtilisation unique.")
+    ],
+    [
+        ('Allie',
+         8,
+         "Etre encore en vie lorsque\nla partie se termine.",
+         "Capacité spéciale : Amour maternel",
+         "Soignez toutes vos blessures.\nUtilisation unique."),
+        ('Agnes',
+         8,
+         "Le joueur à votre droite gagne.",
+         "Capacité spéciale : Caprice",
+         "Au début de votre tour, changez\nvotre condition de victoire par :\n\"Le joueur à votre gauche gagne\"."),
+        ('Daniel',
+         13,
+         "Etre le premier à mourir\nOU être en vie quand tous\nles personnages Shadow\nsont morts.",
+         "Particularité : Désespoir",
+         "Dès qu'un personnage meurt,\nvous devez révéler\nvotre identité."),
+        ('David',
+         13,
+         "Avoir au minimum 3 de ces cartes :\nCrucifix en argent, Amulette,\nLance de Longinus, Toge sainte.",
+         "Capacité spéclass :\nPilleur de tombes",
+         "Récupérez dans la défausse la\ncarte équipement de votre choix.\nUtilisation unique."),
+        ('Bob',
+         10,
+         "Posséder 5 cartes équipements\nou plus.",
+         "Capacité spéciale : Braquage",
+         "Si vous tuez un personnage,\nvous pouvez récupérer\ntoutes ses cartes équipements."),
+        ('Bryan',
+         10,
+         "Tuer un personnage de\n13 Points de Vie ou plus,\nOU être dans le Sanctuaire ancien\nà la fin du jeu.",
+         "Particularité : Oh my god !",
+         "Si vous tuez un personnage de\n12 Points de Vie ou moins,\nvous devez révéler votre identité."),
+        ('Charles',
+         11,
+         "Tuer un personnage par\nune attaque alors qu'il y a\ndéjà eu 3 morts ou plus.",
+         "Capacité spéciale : Festin sanglant",
+         "Après votre attaque, vous pouvez\nvous infliger 2 Blessures afin\nd'attaquer de nouveau\n"
+         "le même joueur."),
+        ('Catherine',
+         11,
+         "Être la première à mourir\nOU être l'un des deux\nseuls personnages en vie.",
+         "Capacité spéciale : Stigmates",
+         "Guerissez de 1 Blessure\nau début de votre tour.")
+    ],
+    [
+        ('Emi',
+         10,
+         "Tous les personnages Shadow\nsont morts.",
+         "Capacité spéciale : Téléportation",
+         "Pour vous déplacer, vous pouvez\nlancer normalement les dés,\nou vous déplacer sur\n"
+         "la carte lieu adjacente."),
+        ('Ellen',
+         10,
+         "Tous les personnages Shadow\nsont morts.",
+         "Capacité spéciale : Exorcisme",
+         "Au début de votre tour,\nvous pouvez désigner un joueur.\nIl perd sa capacité spéciale\n"
+         "jusqu'à la fin de la partie.\nUtilisation unique."),
+        ('Georges',
+         14,
+         "Tous les personnages Shadow\nsont morts.",
+         "Capacité spéciale : Démolition",
+         "Au début de votre tour, choisissez\nun joueur et infligez lui autant\nde blessures que le résultat\n"
+         "d'un dé à 4 faces.\nUtilisation unique."),
+        ('Gregor',
+         14,
+         "Tous les personnages Shadow\nsont morts.",
+         "Capacité spéciale :\nBouclier fantôme",
+         "Ce pouvoir peut s'activer à la fin\nde votre tour. Vous ne subissez\naucune Blessure jusqu'au début\n"
+         "de votre prochain tour.\nUtilisation unique."),
+        ('Franklin',
+         12,
+         "Tous les personnages Shadow\nsont morts.",
+         "Capacité spéciale : Poudre",
+         "Au début de votre tour, choisissez\nun joueur et infligez lui autant\nde blessures que le résultat\n"
+         "d'un dé à 6 faces.\nUtilisation unique."),
+        ('Fu-Ka',
+         12,
+         "Tous les personnages Shadow\nsont morts.",
+         "Capacité spéciale :\nSoins particuliers",
+         "Au début de votre tour,\nplacez le marqueur\nde Blessures d'un joueur sur 7.\nUtilisation unique.")
+    ]
+]
+"""
+The playable characters, in three lists : the Shadows, the Neutrals, the Hunters.
+A character is stored as the tuple:
+    (name (str), health points (int), victory condition (str), power name (str), power description (str))
+"""
+
+CHARACTERS_REPARTITION = {
+    4: (2, 0, 2),
+    5: (2, 1, 2),
+    6: (2, 2, 2),
+    7: (3, 1, 3),
+    8: (3, 2, 3)
+}
+""" The number of characters of every alignment, by number of players """
+
+AREAS = [
+    ([2, 3], "Antre de\nl'ermite", "Vous pouvez\npiocher une\ncarte Vision"),
+    ([4, 5], "Porte de\nl'Outremonde", "Vous pouvez\npiocher une\ncarte dans\nla pile de\nvotre choix"),
+    ([6], "Monastère", "Vous pouvez\npiocher une\ncarte Lumière"),
+    ([8], "Cimetière", "Vous pouvez\npiocher une\ncarte Ténèbres"),
+    ([9], "Forêt hantée", "Le joueur de\nvotre choix peut\nsubir 2 blessures\nOU\nsoigner 1 blessure"),
+    ([10], "Sanctuaire\nancien", "Vous pouvez\nvoler une carte\néquipement à\nun autre joueur")
+]
+""" The areas cards, stored as tuple: (values (int), name (str), description (str)) """
+
+SECTORS = [(0, 1), (2, 3), (4, 5)]
+""" The board sectors, as the pairs of area slots they contain, see game.Area.AREA_LOCATIONS """
+
+BOARD_W, BOARD_H = 1600, 900  # The board size, the token coordinates being on the board
+
+DICES = (4, 6)  # The number of faces of the two dices, a total designating an area, or any area for 7
+
+BLACK, VISION, WHITE = 0, 1, 2  # The card piles
+
+BLACK_CARDS = [
+    ("Chauve-souris vampire", False,
+     "Infligez 2 Blessures au joueur de votre choix, puis soignez une de vos Blessures."),
+    ("Chauve-souris vampire", False,
+     "Infligez 2 Blessures au joueur de votre choix, puis soignez une de vos Blessures."),
+    ("Chauve-souris vampire", False,
+     "Infligez 2 Blessures au joueur de votre choix, puis soignez une de vos Blessures."),
+    ("Succube tentatrice", False, "Volez une carte équipement au joueur de votre choix."),
+    ("Succube tentatrice", False, "Volez une carte équipement au joueur de votre choix."),
+    ("Araignée sanguinaire", False,
+     "Vous infligez 2 Blessures au personnage de votre choix, puis vous subissez vous-même 2 Blessures."),
+    ("Poupée démoniaque", False,
+     "Désignez un joueur et lancez le dé à 6 faces. "
+     "1 à 4 : infligez lui 3 Blessures. 5 ou 6 subissez 3 Blessures."),
+    ("Dynamite", False,
+     "Lancez les 2 dés et infligez 3 Blessures à tous les joueurs (vous compris) se trouvant dans le secteur "
+     "désigné par le total des 2 dés. Il ne se passe rien si ce total est 7."),
+    ("Rituel diabolique", False,
+     "Si vous êtes un Shadow, et si vous décidez de révéler (ou avez déjà révélé) "
+     "votre identité, soignez toutes vos Blessures."),
+    ("Peau de banane", False,
+     "Donnez une de vos cartes équipements à un autre personnage. "
+     "Si vous n'en possédez aucune, vous encaissez 1 Blessure."),
+    ("Tronçonneuse du mal", True, "Si votre attaque inflige des Blessures, la victime subit 1 Blessure en plus."),
+    ("Hachoir maudit", True, "Si votre attaque inflige des Blessures, la victime subit 1 Blessure en plus."),
+    ("Hache tueuse", True, "Si votre attaque inflige des Blessures, la victime subit 1 Blessure en plus."),
+    ("Revolver des ténèbres", True,
+     "Vous pouvez attaquer un joueur présent sur l'un des 4 lieux hors de votre secteur, "
+     "mais vous ne pouvez plus attaquer un joueur situé dans le même secteur que vous."),
+    ("Sabre hanté Masamuné", True,
+     "Vous êtes obligé d'attaquer durant votre tour. Lancez uniquement le dé à 4 faces, "
+     "le résultat indique les Blessures que vous infligez."),
+    ("Mitrailleuse funeste", True,
+     "Votre attaque affecte tous les personnages qui sont à votre porté. "
+     "Effectuez un seul jet de Blessures pour tous les joueurs concernés.")
+]
+""" The dark cards, stored as tuple: (name (str), flag equipment (bool), description (str)) """
+
+VISION_CARDS = [
+    ("Vision cupide", "Je pense que tu es Neutre ou Shadow",
+     "Si c'est le cas, tu dois : soit me donner une carte équipement, soit subir une Blessure."),
+    ("Vision cupide", "Je pense que tu es Neutre ou Shadow",
+     "Si c'est le cas, tu dois : soit me donner une carte équipement, soit subir une Blessure."),
+    ("Vision enivrante", "Je pense que tu es Neutre ou Hunter",
+     "Si c'est le cas, tu dois : soit me donner une carte équipement, soit subir une Blessure"),
+    ("Vision enivrante", "Je pense que tu es Neutre ou Hunter",
+     "Si c'est le cas, tu dois : soit me donner une carte équipement, soit subir une Blessure"),
+    ("Vision furtive", "Je pense que tu es Hunter ou Shadow",
+     "Si c'est le cas, tu dois : soit me donner une carte équipement, soit subir une Blessure."),
+    ("Vision furtive", "Je pense que tu es Hunter ou Shadow",
+     "Si c'est le cas, tu dois : soit me donner une carte équipement, soit subir une Blessure."),
+    ("Vision mortifère", "Je pense que tu es Hunter", "Si c'est le cas, subis 1 Blessure !"),
+    ("Vision mortifère", "Je pense que tu es Hunter", "Si c'est le cas, subis 1 Blessure !"),
+    ("Vision destructrice", "Je pense que tu es un personnage de 12 Points de vie ou plus",
+     "Si c'est le cas, subis 2 Blessures !"),
+    ("Vision clairvoyante", "Je pense que tu es un personnage de 11 Points de vie ou moins",
+     "Si c'est le cas, subis 1 Blessures !"),
+    ("Vision divine", "Je pense que tu es Hunter",
+     "Si c'est le cas, soigne 1 Blessure. (Toutefois, si tu n'avais aucune blessure, subis 1 Blessure !)"),
+    ("Vision réconfortante", "Je pense que tu es Neutre",
+     "Si c'est le cas, soigne 1 Blessure. (Toutefois, si tu n'avais aucune blessure, subis 1 Blessure !)"),
+    ("Vision lugubre", "Je pense que tu es Shadow",
+     "Si c'est le cas, soigne 1 Blessure. (Toutefois, si tu n'avais aucune blessure, subis 1 Blessure !)"),
+    ("Vision foudroyante", "Je pense que tu es Shadow", "Si c'est le cas, subis 1 Blessure !"),
+    ("Vision purificatrice", "Je pense que tu es Shadow", "Si c'est le cas, subis 2 Blessures !"),
+    ("Vision suprème", "", "Monte moi secrètement ta carte Personnage !")
+]
+""" The vision cards, stored as tuple: (name (str), "I think you are ..." (str), "if so, ..." (str)) """
+
+WHITE_CARDS = [
+    ("Éclair purificateur", False, "Chaque personnage, à l'exception de vous même, subit 2 Blessures."),
+    ("Eau bénite", False, "Vous êtes soigné de 2 Blessures."),
+    ("Eau bénite", False, "Vous êtes soigné de 2 Blessures."),
+    ("Savoir ancestral", False, "Lorsque votre tour est terminé, jouez immédiatement un nouveau tour."),
+    ("Avènement suprème", False,
+     "Si vous êtes un Hunter, vous pouvez révéler votre identité. Si vous le faites, ou si vous êtes déjà révélé, "
+     "vous soignez toutes vos Blessures."),
+    ("Miroir divin", False, "Si vous êtes un Shadow, autre que Métamorphe, vous devez révéler votre identité."),
+    ("Premiers secours", False,
+     "Placez le marqueur de Blessures du joueur de votre choix (y compris vous) sur le 7."),
+    ("Ange gardien", False,
+     "Les attaques ne vous infligent aucune Blessure jusqu'à la fin de votre prochain tour."),
+    ("Barre de chocolat", False,
+     "Si vous êtes Allie, Agnes, Emi, Ellen, Momie ou Métamorphe, et que vous choisissez de révéler "
+     "(ou avez déjà révélé) votre identité, vous soignez toutes vos Blessures."),
+    ("Bénédiction", False,
+     "Choisissez un joueur autre que vous même et lancez le dé à 6 faces. "
+     "Ce joueur guérit d'autant de Blessures que le résultat du dé."),
+    ("Crucifix en argent", True,
+     "Si vous attaquez et tuez un autre personnage, vous récupérez toutes ses cartes équipements."),
+    ("Toge sainte", True,
+     "Vos attaques infligent 1 Blessure en moins, et les Blessures que vous subissez sont réduites de 1."),
+    ("Lance de Longinus", True,
+     "Si vous êtes un Hunter, et que votre identité est révélée, chaque fois qu'une de vos attaque inflige des "
+     "Blessures, vous infligez 2 Blessures supplémentaires."),
+    ("Amulette", True,
+     "Vous ne subissez aucune Blessure causée par les cartes Ténèbres : "
+     "Araignée sanguinaire, Dynamite ou Chauve-souris vampire."),
+    ("Broche de chance", True,
+     "Un joueur dans la Forêt hantée ne peut pas utiliser le pouvoir du Lieu pour vous infliger des Blessures "
+     "(mais il peut toujours vous guérir)."),
+    ("Boussole mystique", True,
+     "Quand vous vous déplacez, vous pouvez lancer 2 fois les dés, et choisir quel résultat utiliser."),
+]
+""" The white cards, stored as tuple: (name (str), flag equipment (bool), description (str)) """
+
+CARDS = [BLACK_CARDS, VISION_CARDS, WHITE_CARDS]
+""" The cards of every pile, by pile index """
+
+
+class Character:
+    """
+    A playing character
+
+    Attributes:
+        align (int): 0 for Shadow, 1 for Neutral and 2 for Hunter
+        i (int): the character id in it's alignment, the character is then CHARACTERS[align][i]
+        revealed (bool)
+        equipments (List[Tuple[int, int]]): the equipment cards, as (pile, card) indices
+    """
+
+    __slots__ = ('align', 'i', 'revealed', 'equipments')
+
+    def __init__(self, align, i, revealed=False, equipments=()):
+        """
+        Args:
+            align (int):
+            i (int):
+            revealed (bool):
+            equipments (Iterable[Tuple[int, int]]):
+        """
+        self.align = align
+        self.i = i
+        self.revealed = revealed
+        self.equipments = [tuple(e) for e in equipments]
+
+    def dump(self):
+        """
+        Returns:
+            list: the character as sent to the clients, [align, i, revealed, equipments]
+        """
+        return [self.align, self.i, self.revealed, self.equipments]
+
+
+class State:
+    """
+    The game data of a table
+
+    Attributes:
+        tokens_center (List[Tuple[float, float]]): the 2 token coordinates of every player,
+            where token_center[2 * i] and token_center[2 * i + 1] belong to player i
+        dices_val (List[int]): the dice 4 and dice 6 values, in this order
+        characters (List[Character]): the character of every player
+        areas (List[int]): order of the 6 area cards
+        active_player (int): the current player
+        cards (List[List[int]]): the remaining cards of every pile, the top card being the last one
+    """
+
+    __slots__ = ('tokens_center', 'dices_val', 'characters', 'areas', 'active_player', 'cards')
+
+    def __init__(self, tokens_center, dices_val, characters, areas, active_player, cards):
+        """
+        Args:
+            tokens_center (List[Tuple[float, float]]):
+            dices_val (List[int]):
+            characters (List[Character]):
+            areas (List[int]):
+            active_player (int):
+            cards (List[List[int]]):
+        """
+        self.tokens_center = tokens_center
+        self.dices_val = dices_val
+        self.characters = characters
+        self.areas = areas
+        self.active_player = active_player
+        self.cards = cards
+
+    def dump(self):
+        """
+        Returns:
+            dict: the state, as lists that can be serialised in JSON format
+        """
+        return {'tokens_center': self.tokens_center, 'dices_val': self.dices_val,
+                'characters': [character.dump() for character in self.characters], 'areas': self.areas,
+                'active_player': self.active_player, 'cards': self.cards}
+
+    @classmethod
+    def load(cls, data):
+        """
+        Args:
+            data (dict): a state returned by State.dump
+
+        Returns:
+            State:
+        """
+        return cls(data['tokens_center'], data['dices_val'], [Character(*c) for c in data['characters']],
+                   data['areas'], data['active_player'], data['cards'])
+
+
+def is_equipment(i_type, i_card):
+    """
+    Args:
+        i_type (int): the card pile
+        i_card (int): the card index in CARDS[i_type]
+
+    Returns:
+        bool: whether the card is an equipment, kept by the player drawing it
+    """
+    return i_type != VISION and CARDS[i_type][i_card][1]
+
+
+def roll_dices(rng):
+    """
+    Args:
+        rng (random.Random):
+
+    Returns:
+        List[int]: random dice 4 and dice 6 values, in this order
+    """
+    return [rng.randint(1, n_faces) for n_faces in DICES]
+
+
+def deal(n_players, rng):
+    """
+    Start a game: place the tokens, roll the dices, deal the characters, and shuffle the areas and the card piles
+
+    Args:
+        n_players (int): from 4 to 8
+        rng (random.Random): the game random generator
+
+    Returns:
+        State:
+    """
+    tokens_center = []
+    for i in range(n_players):
+        tokens_center.append((425 + 30 * math.cos(2 * i * math.pi / n_players),
+                              270 + 30 * math.sin(2 * i * math.pi / n_players)))
+        tokens_center.append((60 + 30 * (i % (n_players / 2)),
+                              430 + 30 * (i // (n_players / 2))))
+
+    dices_val = roll_dices(rng)
+
+    characters = []
+    for align in (SHADOW, NEUTRAL, HUNTER):
+        available = list(range(len(CHARACTERS[align])))
+        if n_players >= 7 and align == NEUTRAL:  # Removing Bob for 7 and 8 players
+            available.remove(4)
+        n_avail = CHARACTERS_REPARTITION[n_players][align]
+        characters += [Character(align, i) for i in rng.sample(available, n_avail)]
+    rng.shuffle(characters)
+
+    areas = list(range(len(AREAS)))
+    rng.shuffle(areas)
+
+    cards = [list(range(len(pile))) for pile in CARDS]
+    for c in cards:
+        rng.shuffle(c)
+
+    return State(tokens_center, dices_val, characters, areas, 0, cards)  # Todo: random first player
+
+
+def move(state, i, center):
+    """
+    Move the token i
+
+    Args:
+        state (State):
+        i (int):
+        center (Tuple[float, float]):
+
+    Returns:
+        None
+    """
+    state.tokens_center[i] = center
+
+
+def roll(state, dices_val):
+    """
+    Set the dice values
+
+    Args:
+        state (State):
+        dices_val (List[int]): the dice 4 and dice 6 values, see roll_dices
+
+    Returns:
+        None
+    """
+    state.dices_val = dices_val
+
+
+def reveal(state, i_player):
+    """
+    Reveal the character of player i_player
+
+    Args:
+        state (State):
+        i_player (int):
+
+    Returns:
+        None
+    """
+    state.characters[i_player].revealed = True
+
+
+def turn(state, active_player=None):
+    """
+    End the turn
+
+    Args:
+        state (State):
+        active_player (int): the new active player, defaults to the next player
+
+    Returns:
+        int: the new active player
+    """
+    state.active_player = (state.active_player + 1) % len(state.characters) if active_player is None else active_player
+    return state.active_player
+
+
+def draw(state, i_player, i_type):
+    """
+    Draw the top card of the pile i_type, the player keeping it if it is an equipment
+
+    Args:
+        state (State):
+        i_player (int):
+        i_type (int):
+
+    Returns:
+        int: the card drawn, or -1 if the pile is empty
+    """
+    if not state.cards[i_type]:
+        return -1
+    i_card = state.cards[i_type].pop()
+    if is_equipment(i_type, i_card):
+        state.characters[i_player].equipments.append((i_type, i_card))
+    return i_card
+
+
+def take(state, i_player, i_from, i_equipment):
+    """
+    Give the equipment i_equipment of player i_from to player i_player
+
+    Args:
+        state (State):
+        i_player (int):
+        i_from (int):
+        i_equipment (int): the index of the equipment in the equipments of player i_from
+
+    Returns:
+        None
+    """
+    state.characters[i_player].equipments.append(state.characters[i_from].equipments.pop(i_equipment))
+
+
+def apply(state, data):
+    """
+    Apply an event, as broadcast by the server
+
+    Args:
+        state (State):
+        data (list): the event
+
+    Returns:
+        None
+    """
+    if data[0] == 'token':
+        move(state, data[1], data[2])
+    elif data[0] == 'tokens':
+        for i, center in data[1]:
+            move(state, i, center)
+    elif data[0] == 'dices':
+        roll(state, data[1])
+    elif data[0] == 'reveal':
+        reveal(state, data[1])
+    elif data[0] == 'turn':
+        turn(state, data[1])
+    elif data[0] == 'draw':
+        draw(state, data[1], data[2])
+    elif data[0] == 'take':
+        take(state, data[1], data[2], data[3])
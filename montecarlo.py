@@ -0,0 +1,226 @@
+"""
+Estimates the dice and area odds of the game by Monte Carlo simulation, with NumPy
+
+A move is a roll of the dices, see model.DICES, whose total designates an area, see model.AREAS, a 7 letting the player
+choose any area. A player landing on its own area rolls again. The rolls are simulated by batches of
+montecarlo.BATCH_SIZE, every batch being a few NumPy array operations, so that tens of millions of rolls take seconds.
+
+The tool reports:
+    the landing distribution of a move, from outside the board and from every area, with the repeat-roll rates
+    the Dynamite hit rate of every sector, see model.SECTORS, for every one of the 720 orders of the area cards,
+        a Dynamite total of 7 hitting nobody
+The exact probabilities are computed alongside, to give the error of the estimates.
+"""
+
+import argparse
+import itertools
+import json
+import time
+
+import numpy as np
+
+import model
+
+BATCH_SIZE = 1 << 20  # The number of rolls simulated at once
+ANY = len(model.AREAS)  # The index of the 7, that lets the player choose any area
+OUTSIDE = -1  # The area of a player that did not move yet
+
+
+def area_table():
+    """
+    Returns:
+        np.ndarray: the area designated by every dice total, or ANY
+    """
+    table = np.full(sum(model.DICES) + 1, ANY, dtype=np.int8)
+    for i_area, (values, _, _) in enumerate(model.AREAS):
+        table[values] = i_area
+    return table
+
+
+def exact_totals():
+    """
+    Returns:
+        np.ndarray: the exact probability of every dice total
+    """
+    p = np.ones(1)
+    for n_faces in model.DICES:
+        p = np.convolve(p, np.concatenate(([0.], np.full(n_faces, 1 / n_faces))))
+    return p
+
+
+def roll(rng, n):
+    """
+    Args:
+        rng (np.random.Generator):
+        n (int): the number of rolls
+
+    Returns:
+        np.ndarray: the dice totals
+    """
+    total = np.zeros(n, dtype=np.int8)
+    for n_faces in model.DICES:
+        total += rng.integers(1, n_faces + 1, n, dtype=np.int8)
+    return total
+
+
+def landing(rng, n, start, table):
+    """
+    Simulate moves from an area, rolling again while the player lands on it
+
+    Args:
+        rng (np.random.Generator):
+        n (int): the number of moves
+        start (int): the area of the player, or OUTSIDE
+        table (np.ndarray): see area_table
+
+    Returns:
+        Tuple[np.ndarray, int, int]: the number of moves ending on every area and on ANY, the number of moves that
+            needed another roll, and the total number of rolls
+    """
+    counts = np.zeros(ANY + 1, dtype=np.int64)
+    rerolled = rolls = 0
+    for k in range(0, n, BATCH_SIZE):
+        pending = min(BATCH_SIZE, n - k)
+        first = True
+        while pending:
+            areas = table[roll(rng, pending)]
+            rolls += pending
+            moved = areas[areas != start]
+            counts += np.bincount(moved, minlength=ANY + 1)
+            pending -= moved.size
+            if first:
+                rerolled += pending
+                first = False
+    return counts, rerolled, rolls
+
+
+def dynamite(p_areas):
+    """
+    Args:
+        p_areas (np.ndarray): the probability of a total designating every area, then ANY
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: the 720 orders of the area cards, as the area of every slot,
+            and the hit rate of every sector for every order
+    """
+    orders = np.array(list(itertools.permutations(range(len(model.AREAS)))))
+    return orders, p_areas[orders][:, model.SECTORS].sum(axis=-1)
+
+
+def simulate(n, seed=None):
+    """
+    Args:
+        n (int): the number of moves simulated from every starting area, and of Dynamite rolls
+        seed (int): the seed of the random generator, defaults to a random seed
+
+    Returns:
+        dict: the estimated and exact probabilities, see the module documentation
+    """
+    rng = np.random.default_rng(seed)
+    table = area_table()
+    p_totals = exact_totals()
+    p_areas = np.bincount(table, weights=p_totals[:len(table)], minlength=ANY + 1)
+
+    start_time = time.perf_counter()
+    landings = {}
+    total_rolls = n  # The Dynamite rolls
+    for start in [OUTSIDE] + list(range(len(model.AREAS))):
+        counts, rerolled, rolls = landing(rng, n, start, table)
+        total_rolls += rolls
+        exact = p_areas.copy()
+        if start != OUTSIDE:
+            exact[start] = 0
+            exact /= exact.sum()
+        landings[start] = {'landing': counts / n, 'exact': exact, 'rerolled': rerolled / n,
+                           'rolls_per_move': rolls / n}
+
+    hits = np.zeros(ANY + 1, dtype=np.int64)
+    for k in range(0, n, BATCH_SIZE):
+        hits += np.bincount(table[roll(rng, min(BATCH_SIZE, n - k))], minlength=ANY + 1)
+    orders, sectors = dynamite(hits / n)
+    _, exact_sectors = dynamite(p_areas)
+
+    return {'moves': n, 'rolls': total_rolls, 'seconds': time.perf_counter() - start_time, 'landings': landings,
+            'orders': orders, 'dynamite': sectors, 'dynamite_exact': exact_sectors}
+
+
+def area_label(i_area):
+    """
+    Args:
+        i_area (int): an area, ANY or OUTSIDE
+
+    Returns:
+        str: the dice totals designating the area
+    """
+    if i_area == OUTSIDE:
+        return 'outside'
+    if i_area == ANY:
+        return '7'
+    return '/'.join(str(value) for value in model.AREAS[i_area][0])
+
+
+def report(results):
+    """
+    Args:
+        results (dict): see simulate
+
+    Returns:
+        str: the results as text tables
+    """
+    lines = ["{0} moves per starting area and {0} Dynamite rolls, {1} rolls in {2:.2f} s"
+             .format(results['moves'], results['rolls'], results['seconds']), '',
+             "Landing probability (%), by starting area:",
+             '{0:>8}'.format('from') + ''.join('{0:>8}'.format(area_label(i)) for i in range(ANY + 1))
+             + '{0:>10}{1:>8}'.format('rerolled', 'rolls')]
+    error = 0
+    for start, landing in results['landings'].items():
+        lines.append('{0:>8}'.format(area_label(start))
+                     + ''.join('{0:8.2f}'.format(100 * p) for p in landing['landing'])
+                     + '{0:9.2f}%{1:8.3f}'.format(100 * landing['rerolled'], landing['rolls_per_move']))
+        error = max(error, np.abs(landing['landing'] - landing['exact']).max())
+    lines.append("Largest error against the exact probabilities: {0:.4f}%".format(100 * error))
+
+    lines += ['', "Dynamite hit rate (%), by sector, over the {0} orders of the area cards:"
+              .format(len(results['orders'])),
+              '{0:>8}{1:>8}{2:>8}{3:>8}   {4}'.format('sector', 'min', 'mean', 'max', "order of the max (slot areas)")]
+    sectors = results['dynamite']
+    for k in range(sectors.shape[1]):
+        best = results['orders'][sectors[:, k].argmax()]
+        lines.append('{0:>8}{1:8.2f}{2:8.2f}{3:8.2f}   {4}'.format(
+            k, 100 * sectors[:, k].min(), 100 * sectors[:, k].mean(), 100 * sectors[:, k].max(),
+            ' '.join(area_label(i_area) for i_area in best)))
+    lines.append("Largest error against the exact probabilities: {0:.4f}%"
+                 .format(100 * np.abs(sectors - results['dynamite_exact']).max()))
+    return '\n'.join(lines)
+
+
+def to_json(results):
+    """
+    Args:
+        results (dict): see simulate
+
+    Returns:
+        dict: the results, with lists instead of arrays and the areas labelled by their dice totals
+    """
+    labels = [area_label(i) for i in range(ANY + 1)]
+    return {'moves': results['moves'], 'rolls': results['rolls'], 'seconds': results['seconds'],
+            'landings': {area_label(start): {'landing': dict(zip(labels, landing['landing'].tolist())),
+                                             'exact': dict(zip(labels, landing['exact'].tolist())),
+                                             'rerolled': landing['rerolled'],
+                                             'rolls_per_move': landing['rolls_per_move']}
+                         for start, landing in results['landings'].items()},
+            'dynamite': [{'order': [labels[i] for i in order], 'sectors': sectors, 'exact': exact}
+                         for order, sectors, exact in zip(results['orders'].tolist(), results['dynamite'].tolist(),
+                                                          results['dynamite_exact'].tolist())]}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Shadow Hunters dice and area odds")
+    parser.add_argument('--moves', type=int, default=10000000,
+                        help="the number of moves simulated from every starting area, and of Dynamite rolls")
+    parser.add_argument('--seed', type=int, help="the seed of the random generator, defaults to a random seed")
+    parser.add_argument('--json', action='store_true', help="print the results as JSON, with every area order")
+    args = parser.parse_args()
+
+    simulation = simulate(args.moves, args.seed)
+    print(json.dumps(to_json(simulation), indent=2) if args.json else report(simulation))
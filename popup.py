@@ -13,6 +13,8 @@ class Popup(tkinter.Toplevel):
     """
     tkinter.Tk().wm_withdraw()  # Hide the master window
 
+    TK_TIMEOUT = 50  # The longest wait for a pygame event in ms, as the popup widgets are updated between the waits
+
     def __init__(self, game):
         super().__init__()
         self.title('')
@@ -35,7 +37,7 @@ class Popup(tkinter.Toplevel):
         """
         Shows the popup window.
 
-        Maintain the Game instance loop but discards all events
+        Maintain the Game instance loop but discards all events, see game.Game.refresh
 
         Returns:
             None
@@ -47,10 +49,10 @@ class Popup(tkinter.Toplevel):
             self.callback()
             self.update_idletasks()
             self.update()
-            pygame.event.clear()
+            for event in pygame.event.get():
+                self._game.invalidate(event.type in self._game.EXPOSE_EVENTS)
             self._game.client.poll()
-            self._game.update_display()
-            self._game.clock.tick(self._game.FRAME_RATE)
+            self._game.refresh(self.TK_TIMEOUT)
 
     def center(self):
         """
@@ -0,0 +1,372 @@
+"""
+Implements the spectator relay
+
+The relay accepts spectators, that send ['watch', room_id, features] as they would to the server, see server.
+For every watched room, the relay watches the room on the server through a single connection, a Subscription, and
+forwards its snapshot and events to every spectator of the room, so that the spectators cost the server a single
+connection per room and relay.
+
+The subscription keeps the last snapshot received and the events that followed it, the server sending a new snapshot
+every server.Room.EVENTS_SIZE events, so that a new spectator receives the snapshot and catches up with the events.
+The subscription is closed when the room has no spectator for Subscription.LINGER seconds, and its spectators are
+disconnected when the connection to the server is lost.
+"""
+
+import argparse
+import asyncio
+import logging
+
+import comm
+import session
+
+log = logging.getLogger('relay')
+
+
+class Spectator(asyncio.BufferedProtocol):
+    """
+    Handles the communications for a spectator
+
+    Attributes:
+        relay (Relay):
+        subscription (Subscription): the watched room, or None
+        features (List[str]): the protocol features supported by the spectator
+        transport (asyncio.Transport):
+        decoder (comm.Decoder):
+        codec (Union[Type[comm.JsonCodec], Type[comm.BinaryCodec]]): the codec used to send messages to the spectator
+        welcomed (bool): whether the spectator received the welcome and the snapshot
+    """
+
+    MAX_QUEUE = 1024 * 1024
+
+    def __init__(self, relay):
+        """
+        Args:
+            relay (Relay):
+        """
+        self.relay = relay
+        self.subscription = None
+        self.features = ()
+        self.transport = None
+        self.decoder = comm.Decoder()
+        self.codec = comm.JsonCodec
+        self.welcomed = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def connection_lost(self, exc):
+        if self.subscription is not None:
+            self.subscription.remove(self)
+        self.transport = None
+
+    def get_buffer(self, sizehint):
+        return self.decoder.get_buffer(sizehint)
+
+    def buffer_updated(self, nbytes):
+        """
+        Handles the messages of the spectator:
+            'watch': the spectator chooses its room and lists the features it supports, watch it
+            'codec': the spectator lists the codecs it supports, choose one and notify the spectator
+
+        Args:
+            nbytes (int):
+
+        Returns:
+            None
+        """
+        self.decoder.buffer_updated(nbytes)
+        try:
+            for msg in self.decoder.frames():
+                if self.transport is None:
+                    break
+                if not isinstance(msg, list) or not msg:
+                    continue
+                if msg[0] == 'watch' and self.subscription is None:
+                    self.features = msg[2] if len(msg) > 2 else ()
+                    self.subscription = self.relay.subscribe(str(msg[1]))
+                    self.subscription.add(self)
+                elif msg[0] == 'codec':
+                    self.codec = comm.negotiate(msg[1])
+                    self.send_frame(comm.encode(['codec', self.codec.NAME]))
+        except comm.FrameError:
+            self.transport.abort()
+
+    def messages(self, event):
+        """
+        Args:
+            event (list): an event stamped with its version
+
+        Returns:
+            List[list]: the messages sending the event to the spectator, depending on the features it supports
+        """
+        messages = [event[2]] if 'tokens' in self.features else comm.unbatch(event[2])
+        return [['event', event[1], data] for data in messages] if 'seq' in self.features else messages
+
+    def send_message(self, data):
+        """
+        Send some data to the spectator, with the negotiated codec
+
+        Args:
+            data (any):
+
+        Returns:
+            None
+        """
+        self.send_frame(comm.encode(data, self.codec))
+
+    def send_frame(self, frame):
+        """
+        Send an already encoded frame to the spectator, disconnecting it if it is too slow
+
+        Args:
+            frame (Union[bytes, memoryview]): a frame encoded with the spectator codec
+
+        Returns:
+            None
+        """
+        if self.transport is None or self.transport.is_closing():
+            return
+        self.transport.write(frame)
+        if self.transport.get_write_buffer_size() > self.MAX_QUEUE:
+            log.warning("Spectator is too slow, disconnected")
+            self.transport.abort()
+
+
+class Subscription(session.Session):
+    """
+    The connection of the relay to a room of the server, as a spectator
+
+    Attributes:
+        relay (Relay):
+        spectators (List[Spectator]): the spectators of the room
+        snapshot (list): the last snapshot received, or None
+        events (List[list]): the events received after the snapshot, stamped with their version
+        writer (asyncio.StreamWriter): the connection to the server, or None
+        task (asyncio.Task): the task reading the server messages
+        close_timer (asyncio.TimerHandle): the timer closing the subscription once without spectators, or None
+    """
+
+    LINGER = 30  # Delay before closing a subscription without spectators, in seconds
+
+    def __init__(self, relay, room):
+        """
+        Args:
+            relay (Relay):
+            room (str): the room to watch on the server
+        """
+        super().__init__(room)
+        self.relay = relay
+        self.spectators = []
+        self.snapshot = None
+        self.events = []
+        self.writer = None
+        self.close_timer = None
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def run(self):
+        """
+        Watches the room on the server, until the connection is lost or the subscription is closed
+
+        Returns:
+            None
+        """
+        try:
+            reader, self.writer = await asyncio.open_connection(*self.relay.server_address)
+            self.writer.write(comm.encode(self.watch_message()))
+            self.writer.write(comm.encode(self.codec_message()))
+            while True:
+                data = await reader.read(comm.Decoder.BUFFER_SIZE)
+                if not data:
+                    break
+                self.decoder.feed(data)
+                for msg in self.decoder.frames():
+                    if self.epoch is None:
+                        self.handle_welcome(msg)
+                    else:
+                        self.handle_message(msg)
+        except (OSError, comm.FrameError) as e:
+            log.error("Cannot watch room '%s': %s", self.room, e)
+        finally:
+            if self.writer is not None:
+                self.writer.close()
+            self.close()
+
+    def handle_message(self, msg):
+        if msg[0] == 'snapshot':
+            self.snapshot = msg
+            self.events = []
+            welcomed = [spectator for spectator in self.spectators if spectator.welcomed]
+            for spectator in self.spectators:
+                if not spectator.welcomed:
+                    self.greet(spectator)  # The greeting already holds the snapshot
+            self.publish(msg, welcomed)
+        elif msg[0] == 'event':
+            self.events.append(msg)
+            self.publish(msg, self.spectators)
+        super().handle_message(msg)
+
+    def publish(self, msg, spectators):
+        """
+        Send a message to some spectators, encoding it once per codec, stamping and batching
+
+        Args:
+            msg (list): a snapshot, or an event stamped with its version
+            spectators (List[Spectator]):
+
+        Returns:
+            None
+        """
+        frames = {}
+        for spectator in spectators:
+            key = spectator.codec, 'seq' in spectator.features, 'tokens' in spectator.features
+            if key not in frames:
+                messages = spectator.messages(msg) if msg[0] == 'event' else [msg]
+                frames[key] = [memoryview(comm.encode(message, spectator.codec)) for message in messages]
+            for frame in frames[key]:
+                spectator.send_frame(frame)
+
+    def greet(self, spectator):
+        """
+        Send the welcome, the snapshot and the following events to a new spectator
+
+        Args:
+            spectator (Spectator):
+
+        Returns:
+            None
+        """
+        spectator.send_message(['welcome', -1, self.epoch])
+        spectator.send_message(self.snapshot)
+        for event in self.events:
+            for message in spectator.messages(event):
+                spectator.send_message(message)
+        spectator.welcomed = True
+
+    def add(self, spectator):
+        """
+        Add a spectator of the room
+
+        Args:
+            spectator (Spectator):
+
+        Returns:
+            None
+        """
+        if self.close_timer is not None:
+            self.close_timer.cancel()
+            self.close_timer = None
+        self.spectators.append(spectator)
+        if self.snapshot is not None:
+            self.greet(spectator)
+
+    def remove(self, spectator):
+        """
+        Remove a spectator of the room, the subscription is closed after Subscription.LINGER seconds once empty
+
+        Args:
+            spectator (Spectator):
+
+        Returns:
+            None
+        """
+        if spectator in self.spectators:
+            self.spectators.remove(spectator)
+        if not self.spectators and self.close_timer is None and not self.task.done():
+            self.close_timer = asyncio.get_running_loop().call_later(self.LINGER, self.task.cancel)
+
+    def close(self):
+        """
+        Forget the subscription and disconnect its spectators
+
+        Returns:
+            None
+        """
+        if self.close_timer is not None:
+            self.close_timer.cancel()
+            self.close_timer = None
+        if self.relay.subscriptions.get(self.room) is self:
+            del self.relay.subscriptions[self.room]
+        for spectator in self.spectators:
+            spectator.subscription = None
+            if spectator.transport is not None:
+                spectator.transport.close()
+        self.spectators = []
+        log.info("Stopped watching room '%s'", self.room)
+
+    def send_message(self, data):
+        self.writer.write(comm.encode(data, self.codec))
+
+
+class Relay:
+    """
+    Accepts the spectators, and relays the rooms they watch
+
+    Attributes:
+        host (str):
+        port (int):
+        server_address (Tuple[str, int]): the server, or a supervisor
+        subscriptions (Dict[str, Subscription]): the watched rooms, by room id
+    """
+
+    def __init__(self, host, port, server_address):
+        """
+        Args:
+            host (str):
+            port (int):
+            server_address (Tuple[str, int]):
+        """
+        self.host = host
+        self.port = port
+        self.server_address = server_address
+        self.subscriptions = {}
+
+    def run(self):
+        """
+        Runs the relay until interrupted
+
+        Returns:
+            None
+        """
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+
+    async def serve(self):
+        """
+        Serves forever
+
+        Returns:
+            None
+        """
+        server = await asyncio.get_running_loop().create_server(lambda: Spectator(self), self.host, self.port,
+                                                                reuse_address=True, backlog=1024)
+        async with server:
+            await server.serve_forever()
+
+    def subscribe(self, room_id):
+        """
+        Get the subscription to a room, watching it if needed
+
+        Args:
+            room_id (str):
+
+        Returns:
+            Subscription:
+        """
+        if room_id not in self.subscriptions:
+            log.info("Watching room '%s'", room_id)
+            self.subscriptions[room_id] = Subscription(self, room_id)
+        return self.subscriptions[room_id]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Shadow Hunters spectator relay")
+    parser.add_argument('--host', default='', help="the address to listen on")
+    parser.add_argument('--port', type=int, default=1617, help="the port to listen on")
+    parser.add_argument('--server-host', default='localhost', help="the server address")
+    parser.add_argument('--server-port', type=int, default=1616, help="the server port")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)-7s %(message)s')
+    Relay(args.host, args.port, (args.server_host, args.server_port)).run()
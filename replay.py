@@ -0,0 +1,167 @@
+"""
+Replays a game recorded by the server with --trace, without any network
+
+A trace is a file of JSON lines: a header with the room id, seed, epoch and version, then one [time, player, message]
+line per input of the room, where the message is ['join', features, resume] or ['leave'] when the player joins or
+leaves, see server.Room.join, or ['flush'] from player -1 when the room broadcasts the coalesced token moves, and a
+footer with the final room version and state digest, written when the room or the server closes.
+
+The room is rebuilt from the same seed, and the inputs are fed in the same order to a ClientHandler per player, whose
+transport only hashes the frames sent. The coalesced token moves are broadcast where the trace records it, instead of
+on the server tick, so that the replay produces the same events. The replay checks that every player gets its recorded
+index, and that the final state matches the footer, then reports the CPU time spent, so that a recorded game can be
+used as a fixed benchmark workload.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import sys
+import time
+
+import comm
+import server
+
+
+class ReplayTransport:
+    """
+    A transport that only hashes the bytes written
+
+    Attributes:
+        hash (hashlib.sha256): the hash of every frame sent to the players, shared by the transports
+        written (int)
+    """
+
+    def __init__(self, h):
+        """
+        Args:
+            h (hashlib.sha256): the hash of every frame sent to the players
+        """
+        self.hash = h
+        self.written = 0
+
+    def write(self, data):
+        self.hash.update(data)
+        self.written += len(data)
+
+    def is_closing(self):
+        return False
+
+    def get_write_buffer_size(self):
+        return 0
+
+    def close(self):
+        pass
+
+    def abort(self):
+        pass
+
+
+def load(path):
+    """
+    Read a trace, ignoring a last line truncated by a crash
+
+    Args:
+        path (str):
+
+    Returns:
+        Tuple[dict, List[Tuple[float, int, list]], dict]: the header, the inputs, and the footer or None
+    """
+    with open(path) as f:
+        lines = f.read().splitlines()
+    header, inputs, footer = json.loads(lines[0]), [], None
+    for line in lines[1:]:
+        try:
+            item = json.loads(line)
+        except ValueError:
+            break
+        if isinstance(item, dict):
+            footer = item
+        else:
+            inputs.append(tuple(item))
+    return header, inputs, footer
+
+
+async def replay(header, inputs, realtime=False):
+    """
+    Replay the inputs of a trace
+
+    Args:
+        header (dict): the trace header
+        inputs (List[Tuple[float, int, list]]): the trace inputs
+        realtime (bool): whether to wait between the inputs as in the recorded game, instead of replaying at full speed
+
+    Returns:
+        dict: the room version and state digest, the digest and size of the frames sent, and the CPU and wall times
+    """
+    s = server.Server('', 0, token_tick=header.get('token_tick', 0))
+    room = server.Room(s, header['room'], header['seed'])
+    room.epoch = header['epoch']
+    s.rooms[room.room_id] = room
+    h = hashlib.sha256()
+    frames = [comm.encode(msg) if msg[0] not in ('join', 'leave') else None for _, _, msg in inputs]
+
+    handlers = {}
+    cpu, wall = time.process_time(), time.perf_counter()
+    for (t, i, msg), frame in zip(inputs, frames):
+        if realtime:
+            await asyncio.sleep(t - (time.perf_counter() - wall))
+        if msg[0] == 'join':
+            handler = server.ClientHandler(s)
+            handler.transport = ReplayTransport(h)
+            handler.join(room.room_id, msg[1], msg[2] if len(msg) > 2 else None)
+            if handler.i != i:
+                raise RuntimeError("player {0} joined as player {1}, the replay diverged".format(i, handler.i))
+            handlers[i] = handler
+        elif msg[0] == 'leave':
+            room.leave(handlers.pop(i))
+        elif msg[0] == 'flush':
+            room.flush_tokens()
+        else:
+            handlers[i].feed(frame)
+            if room.flush_timer is not None:  # The token moves are broadcast on the recorded flushes only
+                room.flush_timer.cancel()
+                room.flush_timer = None
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+
+    if room.close_timer is not None:
+        room.close_timer.cancel()
+    if room.flush_timer is not None:
+        room.flush_timer.cancel()
+    return {'version': room.version, 'digest': room.digest(), 'frames_digest': h.hexdigest(),
+            'bytes_sent': s.bytes_sent, 'inputs': len(inputs), 'cpu_s': cpu, 'wall_s': wall}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Shadow Hunters game replay")
+    parser.add_argument('trace', help="a trace recorded by the server with --trace")
+    parser.add_argument('--repeat', type=int, default=1, help="replay the trace this number of times, "
+                                                               "reporting the best CPU time")
+    parser.add_argument('--realtime', action='store_true', help="wait between the inputs as in the recorded game")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args()
+
+    trace_header, trace_inputs, trace_footer = load(args.trace)
+    if trace_header['version'] != 0:
+        sys.exit("The trace starts from a room restored at version {0}, it cannot be replayed"
+                 .format(trace_header['version']))
+
+    results = [asyncio.run(replay(trace_header, trace_inputs, args.realtime)) for _ in range(args.repeat)]
+    report = min(results, key=lambda result: result['cpu_s'])
+    report['reproducible'] = all(result['frames_digest'] == report['frames_digest'] for result in results)
+    if trace_footer is not None:
+        report['matches_trace'] = trace_footer == {'version': report['version'], 'digest': report['digest']}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print("Replayed {0} inputs up to version {1} in {2:.3f} s of CPU ({3:.3f} s wall)"
+              .format(report['inputs'], report['version'], report['cpu_s'], report['wall_s']))
+        print("State digest {0}, frames digest {1}".format(report['digest'], report['frames_digest']))
+        if trace_footer is None:
+            print("The trace has no footer, the final state cannot be checked")
+        elif not report['matches_trace']:
+            print("The final state differs from the recorded game")
+    if not report['reproducible'] or not report.get('matches_trace', True):
+        sys.exit(1)
@@ -1,41 +1,587 @@
 """
 Implements the game server
 
-On connect, the server sends tokens_center, dices_val, characters, areas and active_player
+The server hosts many games, each one in a Room identified by a string.
+On connect, the client sends ['join', room_id, features] to choose its room, features being the list of the protocol
+features it supports, a client not sending it within ClientHandler.JOIN_DELAY seconds joins the room
+Server.DEFAULT_ROOM without any feature.
+On joining, if the client supports the 'snapshot' feature, the server sends ['welcome', i, epoch] with the player index
+and the room epoch, then the room snapshot ['snapshot', version, tokens_center, dices_val, characters, areas,
+active_player].
+Otherwise, the server sends the player index, tokens_center, dices_val, characters, areas and active_player
+
+Every broadcast is an event of the room, numbered by the room version. A client supporting the 'seq' feature receives
+the events stamped as ['event', version, message]. A reconnecting client adds [i, epoch, version] to its join message,
+and receives only the events it missed instead of the snapshot, if they are still kept by the room.
+With --token-tick, the token moves are coalesced: only the last position of every token moved during a tick is
+broadcast, as a single ['tokens', [[i, center], ...]] event, so that the token traffic follows the tick rate instead of
+the input rate. A client supporting the 'tokens' feature receives the batch in a single frame, the others receive a
+'token' message per token moved, see Room.broadcast_tokens.
+The client may then negotiate the codec used for the following messages, see comm
+A spectator sends ['watch', room_id, features] instead of joining, and receives ['welcome', -1, epoch] then the same
+snapshot and events as the players, without the hidden information, see Room.public. It does not take a player seat,
+and the room sends it a new snapshot every Room.EVENTS_SIZE events. Many spectators should watch a room through a
+relay, see relay, that is a single spectator of the room for the server.
 Then, the communication with the client is made through the ClientHandler
+
+The server runs on an asyncio event loop, and only wakes up on network events
+
+In supervisor mode, the rooms are sharded across worker processes, each one running a Server.
+The Supervisor accepts the connections, reads the join message, and hands the connection to the worker owning the room,
+by passing its file descriptor over a Unix socket. The rooms are assigned to the workers by consistent hashing.
+
+The server keeps metrics, see Metrics, that are served in the Prometheus text format on a local HTTP or Unix socket
+endpoint when --metrics is given, each worker serving its own metrics in supervisor mode.
+
+The server logs structured records, with the room, player, message type and handling time when they apply, see
+start_logging. The records are queued and written by a background thread, so that a slow output never blocks the event
+loop, and every message handled is logged at the DEBUG level, sampled by --log-sample.
+
+Every room draws its random values from its own generator, seeded from --seed and the room id when given, so that a
+game is reproducible. With --trace, the server records the inputs of every room, that replay.py replays exactly.
 """
 
-import asyncore
-import math
+import argparse
+import asyncio
+import bisect
+import collections
+import hashlib
+import itertools
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import queue
 import random
+import socket
 import time
 
-import card
 import comm
-import game
+import journal
+import model
 
 _N_PLAYERS = 8
 
+log = logging.getLogger('server')
+_log_config = {}  # The arguments of start_logging, for the worker processes
+_log_every = 1  # Log one handled message out of _log_every, at the DEBUG level
+_log_count = itertools.count()
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Formats the records with their structured fields, as text or as JSON lines
+
+    Attributes:
+        as_json (bool):
+    """
+
+    FIELDS = ('room', 'player', 'op', 'elapsed')
+
+    def __init__(self, as_json=False):
+        """
+        Args:
+            as_json (bool): whether to format the records as JSON objects
+        """
+        super().__init__()
+        self.as_json = as_json
+
+    def format(self, record):
+        fields = {name: getattr(record, name) for name in self.FIELDS if hasattr(record, name)}
+        if self.as_json:
+            return json.dumps(dict(time=record.created, level=record.levelname, pid=record.process,
+                                   message=record.getMessage(), **fields))
+        return '{0} {1:<7} {2}{3}'.format(self.formatTime(record), record.levelname,
+                                          ''.join('{0}={1} '.format(k, v) for k, v in fields.items()),
+                                          record.getMessage())
+
+
+class LogQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queues the records without formatting them, the formatting being done by the thread writing them,
+    and drops the records when the queue is full
+
+    Attributes:
+        dropped (int): the number of dropped records
+    """
+
+    def __init__(self, q):
+        """
+        Args:
+            q (queue.Queue):
+        """
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def start_logging(level='INFO', as_json=False, sample=1, queue_size=10000):
+    """
+    Sends the server records to a queue, written on the standard output by a background thread
+
+    Args:
+        level (str): the minimum level of the records, the records below it costing a single test
+        as_json (bool): whether to write the records as JSON lines, see StructuredFormatter
+        sample (int): log one handled message out of sample, at the DEBUG level
+        queue_size (int): the maximum number of records waiting to be written, the next ones being dropped
+
+    Returns:
+        logging.handlers.QueueListener: the background thread, already started
+    """
+    global _log_every
+    _log_config.update(level=level, as_json=as_json, sample=sample, queue_size=queue_size)
+    _log_every = max(1, sample)
+
+    q = queue.Queue(queue_size)
+    output = logging.StreamHandler()
+    output.setFormatter(StructuredFormatter(as_json))
+    listener = logging.handlers.QueueListener(q, output)
+    for handler in list(log.handlers):
+        log.removeHandler(handler)
+    log.addHandler(LogQueueHandler(q))
+    log.setLevel(level)
+    log.propagate = False
+    listener.start()
+    return listener
+
+
+class Metrics:
+    """
+    Registry of the server metrics, rendered in the Prometheus text format
+
+    The metrics are identified by their name and labels, given as keyword arguments.
+
+    Attributes:
+        kinds (Dict[str, Tuple[str, str, Tuple[float]]]): the type, help text and histogram buckets, by metric name
+        values (Dict[Tuple[str, tuple], float]): the counter and gauge values, by metric name and labels
+        histograms (Dict[Tuple[str, tuple], list]): the bucket counts, then the sum and count of the observations,
+            by metric name and labels
+        collectors (List[Callable[[], None]]): called before rendering, to update the gauges
+    """
+
+    PREFIX = 'shadowhunters_'
+
+    LATENCY_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 0.1)
+    LAG_BUCKETS = (1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1)
+
+    def __init__(self):
+        self.kinds = {}
+        self.values = collections.defaultdict(float)
+        self.histograms = {}
+        self.collectors = []
+
+    def describe(self, name, kind, text, buckets=()):
+        """
+        Declare a metric
+
+        Args:
+            name (str):
+            kind (str): 'counter', 'gauge' or 'histogram'
+            text (str): the help text
+            buckets (Tuple[float]): the upper bounds of the buckets, for an histogram
+
+        Returns:
+            None
+        """
+        self.kinds[name] = kind, text, buckets
+
+    def inc(self, name, value=1, **labels):
+        """
+        Increment a counter
+
+        Args:
+            name (str):
+            value (float):
+            **labels (str):
+
+        Returns:
+            None
+        """
+        self.values[name, tuple(sorted(labels.items()))] += value
+
+    def set(self, name, value, **labels):
+        """
+        Set a gauge
+
+        Args:
+            name (str):
+            value (float):
+            **labels (str):
+
+        Returns:
+            None
+        """
+        self.values[name, tuple(sorted(labels.items()))] = value
+
+    def observe(self, name, value, **labels):
+        """
+        Add an observation to an histogram
+
+        Args:
+            name (str):
+            value (float):
+            **labels (str):
+
+        Returns:
+            None
+        """
+        key = name, tuple(sorted(labels.items()))
+        buckets = self.kinds[name][2]
+        if key not in self.histograms:
+            self.histograms[key] = (len(buckets) + 3) * [0]
+        histogram = self.histograms[key]
+        histogram[bisect.bisect_left(buckets, value)] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+
+    def forget(self, **labels):
+        """
+        Remove the metrics having all the given labels, e.g. those of a closed room
+
+        Args:
+            **labels (str):
+
+        Returns:
+            None
+        """
+        labels = set(labels.items())
+        for series in (self.values, self.histograms):
+            for key in [key for key in series if labels <= set(key[1])]:
+                del series[key]
+
+    @staticmethod
+    def format_labels(labels, *extra):
+        """
+        Args:
+            labels (Iterable[Tuple[str, str]]):
+            *extra (Tuple[str, str]): labels added after them
+
+        Returns:
+            str: the labels in the Prometheus text format, or an empty string
+        """
+        items = ['{0}="{1}"'.format(name, str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"'))
+                 for name, value in list(labels) + list(extra)]
+        return '{' + ','.join(items) + '}' if items else ''
+
+    def render(self):
+        """
+        Returns:
+            str: every metric in the Prometheus text format
+        """
+        for collector in self.collectors:
+            collector()
+        lines = []
+        for name, (kind, text, buckets) in sorted(self.kinds.items()):
+            lines.append('# HELP {0}{1} {2}'.format(self.PREFIX, name, text))
+            lines.append('# TYPE {0}{1} {2}'.format(self.PREFIX, name, kind))
+            if kind != 'histogram':
+                for (key, labels), value in sorted(self.values.items()):
+                    if key == name:
+                        lines.append('{0}{1}{2} {3}'.format(self.PREFIX, name, self.format_labels(labels), value))
+                continue
+            for (key, labels), histogram in sorted(self.histograms.items()):
+                if key != name:
+                    continue
+                total = 0
+                for bound, count in zip(buckets + ('+Inf',), histogram):
+                    total += count
+                    lines.append('{0}{1}_bucket{2} {3}'.format(self.PREFIX, name,
+                                                                self.format_labels(labels, ('le', bound)), total))
+                lines.append('{0}{1}_sum{2} {3}'.format(self.PREFIX, name, self.format_labels(labels), histogram[-2]))
+                lines.append('{0}{1}_count{2} {3}'.format(self.PREFIX, name, self.format_labels(labels),
+                                                          histogram[-1]))
+        return '\n'.join(lines) + '\n'
+
 
-class ClientHandler(asyncore.dispatcher):
+class ClientHandler(asyncio.BufferedProtocol):
     """
     Handles the communications for a client
+
+    The received bytes are written directly in the decoder buffer.
+    The messages to the client are buffered by the transport, that pauses the handler when its buffer gets over
+    ClientHandler.HIGH_WATERMARK, and resumes it when it gets under ClientHandler.LOW_WATERMARK.
+    When the handler stays paused for ClientHandler.SLOW_DELAY seconds, ClientHandler.SLOW_POLICY is applied:
+        'disconnect': the client is disconnected
+        'downgrade': the token moves are not sent to the client anymore, until the handler is resumed,
+            then the client receives every token position
+    A client whose buffer exceeds ClientHandler.MAX_QUEUE is disconnected.
+
+    Attributes:
+        server (Server):
+        room (Room): the joined room, or None
+        i (int): the player index in the room, or -1 if the client is not a player
+        features (List[str]): the protocol features supported by the client
+        join_timer (asyncio.TimerHandle): the timer joining the default room, or None
+        transport (asyncio.Transport):
+        decoder (comm.Decoder):
+        codec (Union[Type[comm.JsonCodec], Type[comm.BinaryCodec]]): the codec used to send messages to the client
+        slow_timer (asyncio.TimerHandle): the timer applying the slow client policy, or None
+        slow_since (float): since when the handler is paused, or -1 if it is not
+        downgraded (bool): whether the token moves are dropped
+        bytes_sent (int)
+        frames_sent (int)
+        frames_dropped (int)
+        max_queued (int): the maximum number of bytes ever buffered
     """
 
-    def __init__(self, s, i):
+    JOIN_DELAY = 0.5
+
+    MESSAGE_TYPES = ('join', 'watch', 'token', 'dices', 'reveal', 'turn', 'draw', 'vision', 'take', 'codec')
+
+    HIGH_WATERMARK = 64 * 1024
+    LOW_WATERMARK = 16 * 1024
+    MAX_QUEUE = 1024 * 1024
+    SLOW_DELAY = 5
+    SLOW_POLICY = 'downgrade'
+
+    def __init__(self, s):
         """
         Args:
             s (Server):
-            i (int):
         """
-        super().__init__(s.clients[i])
         self.server = s
-        self.i = i
+        self.room = None
+        self.i = -1
+        self.features = ()
+        self.join_timer = None
+        self.transport = None
+        self.decoder = comm.Decoder()
+        self.codec = comm.JsonCodec
+
+        self.slow_timer = None
+        self.slow_since = -1
+        self.downgraded = False
+
+        self.bytes_sent = 0
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.max_queued = 0
+
+    @property
+    def name(self):
+        """
+        str: the player name, or 'Spectator'
+        """
+        return model.PLAYERS[self.i][0] if self.i >= 0 else 'Spectator'
+
+    @property
+    def queued(self):
+        """
+        int: the number of bytes waiting to be sent
+        """
+        return self.transport.get_write_buffer_size() if self.transport is not None else 0
+
+    def connection_made(self, transport):
+        """
+        Called on accepting a new client
+
+        Args:
+            transport (asyncio.Transport):
+
+        Returns:
+            None
+        """
+        self.transport = transport
+        self.transport.set_write_buffer_limits(high=self.HIGH_WATERMARK, low=self.LOW_WATERMARK)
+        self.server.connections += 1
+        self.server.metrics.inc('connections_total')
+        log.info("Connection from %s", transport.get_extra_info('peername'))
+        self.join_timer = asyncio.get_running_loop().call_later(self.JOIN_DELAY, self.join, self.server.DEFAULT_ROOM)
+
+    def connection_lost(self, exc):
+        """
+        Called when the client is lost
+
+        Args:
+            exc (Exception): the error, or None on a clean end of file
+
+        Returns:
+            None
+        """
+        if self.room is not None:
+            self.log(logging.INFO, "Lost client %s", self.name)
+            self.room.leave(self)
+        if self.join_timer is not None:
+            self.join_timer.cancel()
+        if self.slow_timer is not None:
+            self.slow_timer.cancel()
+        self.server.connections -= 1
+        self.transport = None
+
+    def get_buffer(self, sizehint):
+        """
+        Args:
+            sizehint (int):
+
+        Returns:
+            memoryview: where the received bytes are written
+        """
+        return self.decoder.get_buffer(sizehint)
 
-    def handle_read(self):
+    def buffer_updated(self, nbytes):
         """
         Called when the client sends data.
 
+        Every complete message received is handled, see ClientHandler.handle_message
+
+        Args:
+            nbytes (int):
+
+        Returns:
+            None
+        """
+        self.decoder.buffer_updated(nbytes)
+        self.server.bytes_received += nbytes
+        self.handle_frames()
+
+    def feed(self, data):
+        """
+        Handles some bytes received from the client before the handler was created
+
+        Args:
+            data (bytes):
+
+        Returns:
+            None
+        """
+        self.decoder.feed(data)
+        self.server.bytes_received += len(data)
+        self.handle_frames()
+
+    def handle_frames(self):
+        """
+        Handles every complete message in the decoder buffer, measuring the time spent on each one
+
+        Returns:
+            None
+        """
+        metrics = self.server.metrics
+        try:
+            for msg in self.decoder.frames():
+                if self.transport is None:
+                    break
+                kind = msg[0] if isinstance(msg, list) and msg and msg[0] in self.MESSAGE_TYPES else 'invalid'
+                room = self.room
+                if room is not None and room.trace is not None and self.i >= 0:
+                    room.record(self.i, msg)
+                start = time.perf_counter()
+                self.handle_message(msg)
+                elapsed = time.perf_counter() - start
+                metrics.inc('messages_received_total', type=kind)
+                metrics.observe('handler_seconds', elapsed, type=kind)
+                if room is not None:
+                    metrics.inc('room_messages_received_total', room=room.room_id)
+                    metrics.inc('room_handler_seconds_total', elapsed, room=room.room_id)
+                if log.isEnabledFor(logging.DEBUG) and next(_log_count) % _log_every == 0:
+                    self.log(logging.DEBUG, "Handled %s", kind, op=kind, elapsed=round(elapsed, 6))
+        except comm.FrameError as e:
+            self.disconnect("Invalid stream: {0}".format(e))
+
+    def pause_writing(self):
+        """
+        Called when the transport buffer gets over the high watermark
+
+        Returns:
+            None
+        """
+        self.slow_since = time.monotonic()
+        self.slow_timer = asyncio.get_running_loop().call_later(self.SLOW_DELAY, self.slow)
+
+    def resume_writing(self):
+        """
+        Called when the transport buffer gets under the low watermark
+
+        Returns:
+            None
+        """
+        self.slow_since = -1
+        if self.slow_timer is not None:
+            self.slow_timer.cancel()
+            self.slow_timer = None
+        if self.downgraded and self.room is not None:
+            self.log(logging.INFO, "Client %s recovered", self.name)
+            self.downgraded = False
+            for i in range(len(self.room.game.tokens_center)):
+                self.send_message(['token', i, self.room.game.tokens_center[i]])
+
+    def slow(self):
+        """
+        Called when the handler stays paused for ClientHandler.SLOW_DELAY seconds, applies the slow client policy
+
+        Returns:
+            None
+        """
+        self.slow_timer = None
+        if self.SLOW_POLICY == 'disconnect':
+            self.disconnect("Client {0} is too slow, disconnected".format(self.name))
+        elif not self.downgraded:
+            self.log(logging.WARNING, "Client %s is too slow, downgraded", self.name)
+            self.downgraded = True
+
+    def disconnect(self, reason):
+        """
+        Disconnect the client, dropping the pending data
+
+        Args:
+            reason (str): logged message
+
+        Returns:
+            None
+        """
+        self.log(logging.WARNING, reason)
+        if self.room is not None:
+            self.room.leave(self)
+        if self.transport is not None:
+            self.transport.abort()
+
+    def join(self, room_id, features=(), resume=None):
+        """
+        Join a room
+
+        Args:
+            room_id (str):
+            features (List[str]): the protocol features supported by the client
+            resume (List[int, str, int]): the player index, room epoch and version known by a reconnecting client
+
+        Returns:
+            None
+        """
+        if self.join_timer is not None:
+            self.join_timer.cancel()
+            self.join_timer = None
+        if self.room is None and self.transport is not None:
+            self.server.room(room_id).join(self, features, resume)
+
+    def watch(self, room_id, features=()):
+        """
+        Watch a room as a spectator
+
+        Args:
+            room_id (str):
+            features (List[str]): the protocol features supported by the client
+
+        Returns:
+            None
+        """
+        if self.join_timer is not None:
+            self.join_timer.cancel()
+            self.join_timer = None
+        if self.room is None and self.transport is not None:
+            self.server.room(room_id).watch(self, features)
+
+    def handle_message(self, msg):
+        """
+        Handles a message from the client
+
         The message should be a list, where the first item is a string specifying the client request:
             'token': the client moved it's token, send the new token coordinates to every other client
             'dices': the client rolled the dices, notify every client and send the dice values
@@ -44,164 +590,1146 @@ class ClientHandler(asyncore.dispatcher):
             'draw': the client draw a card, choose which and notify every client
             'vision: the client send a vision card, to another client, notify the other client
             'take': the client takes an equipment from another player, notify every client
+            'codec': the client lists the codecs it supports, choose one and notify the client
+        Before joining a room, the only accepted messages are:
+            'join': the client chooses its room and lists the features it supports, join it
+            'watch': the client chooses its room and lists the features it supports, watch it as a spectator
+        A spectator may only send 'codec'.
+
+        Args:
+            msg (list):
 
         Returns:
             None
         """
-        msg = comm.recv(self)
-        if msg == b'':
-            print("Lost client {0}".format(game.PLAYERS[self.i][0]))
-            self.server.clients[self.i] = None
-            self.close()
-            return
-
-        if msg[0] == 'token':
-            print("Player {0} moved it's {1} token"
-                  .format(game.PLAYERS[self.i][0], 'second' if msg[1] % 2 else 'first'))
-            self.server.tokens_center[msg[1]] = msg[2]
-            for client in self.server.clients:
-                if client is not None and client is not self.server.clients[self.i]:
-                    comm.send(client, msg)
+        if self.room is None:
+            if msg[0] == 'join':
+                self.join(str(msg[1]), msg[2] if len(msg) > 2 else (), msg[3] if len(msg) > 3 else None)
+            elif msg[0] == 'watch':
+                self.watch(str(msg[1]), msg[2] if len(msg) > 2 else ())
+            else:
+                self.log(logging.WARNING, "Cannot handle %s before joining a room", msg[0])
+        elif self.i < 0 and msg[0] != 'codec':
+            self.log(logging.WARNING, "Spectators cannot send %s", msg[0])
+        elif msg[0] == 'token':
+            if log.isEnabledFor(logging.DEBUG):
+                self.log(logging.DEBUG, "Player %s moved it's %s token",
+                         self.name, 'second' if msg[1] % 2 else 'first', op='token')
+            self.room.move_token(self, msg)
         elif msg[0] == 'dices':
-            print("Player {0} rolled the dices".format(game.PLAYERS[self.i][0]))
-            self.server.dices_val = [random.randint(1, 4), random.randint(1, 6)]
-            for client in self.server.clients:
-                if client is not None:
-                    comm.send(client, ['dices', self.server.dices_val])
+            self.log(logging.INFO, "Player %s rolled the dices", self.name, op='dices')
+            self.room.event(['dices', self.room.roll_dices()])
         elif msg[0] == 'reveal':
-            print("Player {0} came out of the closet".format(game.PLAYERS[self.i][0]))
-            self.server.characters[self.i][2] = True
-            for client in self.server.clients:
-                if client is not None:
-                    comm.send(client, ['reveal', self.i])
+            self.log(logging.INFO, "Player %s came out of the closet", self.name, op='reveal')
+            self.room.event(['reveal', self.i])
         elif msg[0] == 'turn':
-            print("Player {0} ended it's turn".format(game.PLAYERS[self.i][0]))
-            self.server.active_player = (self.server.active_player + 1) % _N_PLAYERS
-            for client in self.server.clients:
-                if client is not None:
-                    comm.send(client, ['turn', self.server.active_player])
+            self.log(logging.INFO, "Player %s ended it's turn", self.name, op='turn')
+            self.room.event(['turn', (self.room.game.active_player + 1) % _N_PLAYERS])
         elif msg[0] == 'draw':
-            if self.server.cards[msg[1]]:
-                print("Player {0} draw a card".format(game.PLAYERS[self.i][0]))
-                i_card = self.server.cards[msg[1]].pop()
-                if card.TYPES[msg[1]] != card.CardVision and card.TYPES[msg[1]].CARDS[i_card][1]:
-                    self.server.characters[self.i][3].append((msg[1], i_card))
-                for client in self.server.clients:
-                    if client is not None:
-                        comm.send(client, ['draw', self.i, msg[1], i_card])
+            if self.room.game.cards[msg[1]]:
+                self.log(logging.INFO, "Player %s draw a card", self.name, op='draw')
+                self.room.event(['draw', self.i, msg[1], self.room.game.cards[msg[1]][-1]])
             else:
-                print("Cannot draw card of type {0}".format(msg[1]))
+                self.log(logging.WARNING, "Cannot draw card of type %s", msg[1], op='draw')
         elif msg[0] == 'vision':
-            if self.server.clients[msg[2]]:
-                print("Player {0} send vision card to player {1}"
-                      .format(game.PLAYERS[self.i][0], game.PLAYERS[msg[2]][0]))
-                comm.send(self.server.clients[msg[2]], ['vision', msg[1], self.i])
+            if self.room.clients[msg[2]]:
+                self.log(logging.INFO, "Player %s send vision card to player %s",
+                         self.name, model.PLAYERS[msg[2]][0], op='vision')
+                self.room.clients[msg[2]].send_message(['vision', msg[1], self.i])
+                if self.room.journal is not None:
+                    self.room.journal.append(self.room.version, ['vision', msg[2], msg[1], self.i])
             else:
-                print("Error: Client {0} is not connected".format(msg[2]))
+                self.log(logging.ERROR, "Client %s is not connected", msg[2], op='vision')
         elif msg[0] == 'take':
-            self.server.characters[self.i][3].append(self.server.characters[msg[1]][3].pop(msg[2]))
-            for client in self.server.clients:
-                if client is not None:
-                    comm.send(client, ['take', self.i, msg[1], msg[2]])
+            self.room.event(['take', self.i, msg[1], msg[2]])
+        elif msg[0] == 'codec':
+            self.codec = comm.negotiate(msg[1])
+            self.send_frame(memoryview(comm.encode(['codec', self.codec.NAME])))
+
+    def log(self, level, msg, *args, **fields):
+        """
+        Log a record with the room and the player of the client
+
+        Args:
+            level (int):
+            msg (str): the message, formatted with the args in the logging thread
+            *args (any):
+            **fields (any): the other structured fields, see StructuredFormatter
+
+        Returns:
+            None
+        """
+        if log.isEnabledFor(level):
+            if self.room is not None:
+                fields.update(room=self.room.room_id, player=self.i)
+            log.log(level, msg, *args, extra=fields)
+
+    def send_message(self, data):
+        """
+        Send some data to the client, with the negotiated codec
+
+        Args:
+            data (any):
+
+        Returns:
+            None
+        """
+        self.send_frame(memoryview(comm.encode(data, self.codec)))
+
+    def send_frame(self, frame, droppable=False):
+        """
+        Send an already encoded frame to the client
+
+        Args:
+            frame (memoryview): a frame encoded with the client codec
+            droppable (bool): whether the frame may be dropped if the client is downgraded
+
+        Returns:
+            None
+        """
+        if self.transport is None or self.transport.is_closing():
+            return
+        if droppable and self.downgraded:
+            self.frames_dropped += 1
+            self.server.metrics.inc('frames_dropped_total')
+            return
+        self.transport.write(frame)
+        self.server.bytes_sent += len(frame)
+        self.bytes_sent += len(frame)
+        self.frames_sent += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        if self.queued > self.MAX_QUEUE:
+            self.disconnect("Client {0} is too slow, disconnected".format(self.name))
 
 
-class Server(asyncore.dispatcher):
+class Room:
     """
-    The Server handles incoming connections by giving them a GameHandler.
-    It also maintains the game data.
+    A game table, that maintains the game data
 
     Attributes:
-        clients (List[socket.socket]): list of size _N_PLAYERS, containing the connected clients, or None
-        tokens_center (List[Tuples[float, float]]): the 2 * _N_PLAYERS token coordinates,
-            stored as tuples of length 2, where token_center[2 * i] and token_center[2 * i + 1] belong to player i
-        dices_val (List[int]): the dice 4 and dice 6 values, in this order
-        characters (List[List[int, int, bool, List[Tuple[int, int]]]]): the playing characters,
-            stored as (alignment, i, flag_revealed, equipments),
-            the character is then game.Character.CHARACTERS[alignment][i], and is revealed if flag_revealed == True
-        areas (List[int]): order of the 6 area cards
-        active_player (int): the current player
-        cards (List[List[int]]): the remaining cards in the decks
+        server (Server):
+        room_id (str):
+        clients (List[ClientHandler]): list of size _N_PLAYERS, containing the connected clients, or None
+        spectators (List[ClientHandler]): the connected spectators
+        game (model.State): the game data
+        epoch (str): a random identifier of the room instance
+        version (int): the state version, incremented on every event, that is on every change of the game data
+        events (Deque[Tuple[int, list]]): the last Room.EVENTS_SIZE events, with their version
+        snapshots (Dict[Tuple[Type, bool], Tuple[int, memoryview]]): the last encoded snapshot and its version,
+            by codec and whether it is the public snapshot
+        journal (journal.Journal): the room journal, or None if the server does not journal the games
+        close_timer (asyncio.TimerHandle): the timer closing the room once empty, or None
+        seed (int): the seed of the room random generator
+        random (random.Random): the room random generator, drawing every random value of the game
+        trace (io.TextIOWrapper): the file recording the room inputs, or None if the server does not trace the games
+        trace_start (float): when the room started being traced
+        moves (Dict[int, Tuple[List[float, float], ClientHandler]]): the last position of the tokens moved since the
+            last tick, and the client that moved them, by token index
+        flush_timer (asyncio.TimerHandle): the timer broadcasting the token moves at the end of the tick, or None
     """
 
-    DELAY = 0.1  # Approximate delay between two asyncore.poll
+    EVENTS_SIZE = 256
 
-    def __init__(self, host, port):
+    def __init__(self, s, room_id, seed=None):
         """
         Args:
-            host:
-            port:
+            s (Server):
+            room_id (str):
+            seed (int): the seed of the random generator, defaults to a seed derived from Server.seed and the room id
         """
-        super().__init__()
-        self.create_socket()
-        self.set_reuse_addr()
-        self.bind((host, port))
-        self.listen(_N_PLAYERS)
+        self.server = s
+        self.room_id = room_id
         self.clients = _N_PLAYERS * [None]
+        self.spectators = []
+        self.epoch = os.urandom(8).hex()
+        self.version = 0
+        self.events = collections.deque(maxlen=self.EVENTS_SIZE)
+        self.snapshots = {}
+        self.close_timer = None
+        self.moves = {}
+        self.flush_timer = None
 
-        self.tokens_center = []
-        for i in range(_N_PLAYERS):
-            self.tokens_center.append((425 + 30 * math.cos(2 * i * math.pi / _N_PLAYERS),
-                                       270 + 30 * math.sin(2 * i * math.pi / _N_PLAYERS)))
-            self.tokens_center.append((60 + 30 * (i % (_N_PLAYERS / 2)),
-                                       430 + 30 * (i // (_N_PLAYERS / 2))))
-
-        self.dices_val = [random.randint(1, 4), random.randint(1, 6)]
+        if seed is not None:
+            self.seed = seed
+        elif s.seed is None:
+            self.seed = random.SystemRandom().getrandbits(64)
+        else:
+            self.seed = int.from_bytes(hashlib.sha256('{0}/{1}'.format(s.seed, room_id).encode()).digest()[:8], 'big')
+        self.random = random.Random(self.seed)
 
-        self.characters = []
-        if _N_PLAYERS >= 7:  # Removing Bob for 7 and 8 players
-            game.Character.CHARACTERS[1 + 0].pop(4)
-        for align in (0, 1, 2):
-            n_total = len(game.Character.CHARACTERS[align])
-            n_avail = game.Character.CHARACTERS_REPARTITION[_N_PLAYERS][align]
-            self.characters += [[align, i, False, []] for i in random.sample(range(n_total), n_avail)]
-        random.shuffle(self.characters)
+        self.game = model.deal(_N_PLAYERS, self.random)
 
-        self.areas = list(range(6))
-        random.shuffle(self.areas)
-
-        self.active_player = 0  # Todo
-        # self.active_player = random.randrange(_N_PLAYERS)
+        self.journal = None
+        if s.journal_dir is not None:
+            self.journal = journal.Journal(s.journal_dir, room_id)
+            state, events = self.journal.load()
+            if state is None:
+                self.journal.snapshot(self.state())
+            else:
+                self.restore(state, events)
+        log.info("Room seed is %d", self.seed, extra={'room': room_id})
 
-        self.cards = [list(range(len(card_type.CARDS))) for card_type in card.TYPES]
-        for c in self.cards:
-            random.shuffle(c)
+        self.trace = None
+        self.trace_start = time.monotonic()
+        if s.trace_dir is not None:
+            os.makedirs(s.trace_dir, exist_ok=True)
+            self.trace = open(os.path.join(s.trace_dir, 'room-{0}-{1}.trace'.format(room_id.encode().hex(),
+                                                                                   self.epoch)), 'w')
+            self.trace.write(json.dumps({'room': room_id, 'seed': self.seed, 'epoch': self.epoch,
+                                         'version': self.version, 'token_tick': s.token_tick}) + '\n')
 
-        try:
-            while True:
-                asyncore.poll()
-                time.sleep(self.DELAY)
-        except KeyboardInterrupt:
-            pass
+    def state(self):
+        """
+        Returns:
+            dict: the whole room state, hidden data and random generator state included
+        """
+        return dict(epoch=self.epoch, version=self.version, **self.game.dump(),
+                    seed=self.seed, random=self.random.getstate())
 
-    def handle_accepted(self, sock, addr):
+    def restore(self, state, events):
         """
-        Called on accepting a new client
+        Restore the room from a state and the events that followed it
 
         Args:
-            sock (socket.socket):
-            addr (Tuple[str, int]):
+            state (dict): a state returned by Room.state
+            events (List[Tuple[int, list]]): the events, with the room version after each one
 
         Returns:
             None
         """
+        self.epoch = state['epoch']
+        self.version = state['version']
+        self.game = model.State.load(state)
+        if 'random' in state:
+            self.seed = state['seed']
+            self.random.setstate((state['random'][0], tuple(state['random'][1]), state['random'][2]))
+        for version, data in events:
+            if version > self.version and data[0] != 'vision':
+                if data[0] == 'dices':
+                    self.roll_dices()  # Draws the same values again, to restore the random generator state
+                self.apply(data)
+                self.version = version
+                self.events.append((version, data))
+        log.info("Restored room at version %d", self.version, extra={'room': self.room_id})
 
-        print("Connection from {0} ...".format(addr), end='', flush=True)
-        try:
-            i = self.clients.index(None)
-        except ValueError:
-            print(" denied")
-            comm.send(sock, -1)
-            return
-        print(" granted as player {0}".format(game.PLAYERS[i][0]))
-        self.clients[i] = sock
-        comm.send(sock, i)
-        comm.send(sock, self.tokens_center)
-        comm.send(sock, self.dices_val)
-        comm.send(sock, self.characters)
-        comm.send(sock, self.areas)
-        comm.send(sock, self.active_player)
-        ClientHandler(self, i)
+    def digest(self):
+        """
+        Returns:
+            str: a hash of the whole room state, identical for identical games
+        """
+        return hashlib.sha256(json.dumps(self.state(), sort_keys=True).encode()).hexdigest()
 
+    def end_trace(self):
+        """
+        Record the room version and state digest at the end of the trace, then close it
 
-if __name__ == '__main__':
-    Server('', 1616)
+        Returns:
+            None
+        """
+        self.trace.write(json.dumps({'version': self.version, 'digest': self.digest()}) + '\n')
+        self.trace.close()
+
+    def roll_dices(self):
+        """
+        Returns:
+            List[int]: random dice 4 and dice 6 values, in this order
+        """
+        return model.roll_dices(self.random)
+
+    def record(self, i, msg):
+        """
+        Record an input of the room in its trace
+
+        Args:
+            i (int): the player index, or -1 for the room itself
+            msg (list): the message from the player, or ['join', features, resume] or ['leave'] when the player joins
+                or leaves, see Room.join, or ['flush'] when the room broadcasts the token moves of the tick
+
+        Returns:
+            None
+        """
+        self.trace.write(json.dumps([round(time.monotonic() - self.trace_start, 6), i, msg]) + '\n')
+
+    def apply(self, data):
+        """
+        Apply an event to the game data
+
+        Args:
+            data (list): the event, as broadcast to the clients
+
+        Returns:
+            None
+        """
+        model.apply(self.game, data)
+
+    def event(self, data, exclude=(), droppable=False):
+        """
+        Apply an event to the game data, record it and broadcast it
+
+        The event increments the room version, and is kept in the room events and journal
+
+        Args:
+            data (list): the event
+            exclude (Iterable[ClientHandler]): the clients that should not receive the event
+            droppable (bool): whether the event may be dropped for the downgraded clients, see ClientHandler
+
+        Returns:
+            None
+        """
+        self.advance(data)
+        self.broadcast(data, exclude, droppable)
+
+    def advance(self, data):
+        """
+        Apply an event to the game data and record it, without broadcasting it
+
+        Args:
+            data (list): the event
+
+        Returns:
+            None
+        """
+        self.apply(data)
+        self.version += 1
+        self.events.append((self.version, data))
+        if self.journal is not None:
+            self.journal.append(self.version, data)
+            if self.version % self.journal.SNAPSHOT_EVERY == 0:
+                self.journal.snapshot(self.state())
+        self.server.metrics.inc('room_events_total', room=self.room_id)
+
+    def move_token(self, client, data):
+        """
+        Broadcast a token move, or keep it until the end of the tick if the server coalesces the token moves
+
+        Args:
+            client (ClientHandler): the client moving the token
+            data (list): the token move, ['token', i, center]
+
+        Returns:
+            None
+        """
+        if not self.server.token_tick:
+            self.event(data, exclude=(client,), droppable=True)
+            return
+        self.moves[data[1]] = data[2], client
+        if self.flush_timer is None:
+            self.flush_timer = asyncio.get_running_loop().call_later(self.server.token_tick, self.flush_tokens)
+
+    def flush_tokens(self):
+        """
+        Broadcast the last position of the tokens moved during the tick, as a single event
+
+        Returns:
+            None
+        """
+        self.flush_timer = None
+        if not self.moves:
+            return
+        if self.trace is not None:
+            self.record(-1, ['flush'])
+        data = ['tokens', [[i, center] for i, (center, _) in self.moves.items()]]
+        senders = [client for _, client in self.moves.values()]
+        self.moves = {}
+        self.advance(data)
+        self.broadcast_tokens(data, senders)
+
+    def join(self, client, features, resume=None):
+        """
+        Called when a client joins the room
+
+        A reconnecting client gets back its player index if it is free,
+        and only receives the events it missed if they are still kept.
+
+        Args:
+            client (ClientHandler):
+            features (List[str]): the protocol features supported by the client
+            resume (List[int, str, int]): the player index, room epoch and version known by a reconnecting client
+
+        Returns:
+            None
+        """
+        try:
+            if resume is not None and 0 <= resume[0] < _N_PLAYERS and self.clients[resume[0]] is None:
+                i = resume[0]
+            else:
+                i = self.clients.index(None)
+        except ValueError:
+            log.warning("Room is full, client denied", extra={'room': self.room_id})
+            client.send_message(-1)
+            client.transport.close()
+            return
+        log.info("Client granted as player %s", model.PLAYERS[i][0], extra={'room': self.room_id, 'player': i})
+        if self.close_timer is not None:
+            self.close_timer.cancel()
+            self.close_timer = None
+        client.room = self
+        client.i = i
+        client.features = features
+        self.clients[i] = client
+        if self.trace is not None:
+            self.record(i, ['join', features, resume])
+        if 'snapshot' in features:
+            client.send_message(['welcome', i, self.epoch])
+            missed = self.missed_events(resume) if resume is not None and resume[:2] == [i, self.epoch] else None
+            if missed is None:
+                client.send_frame(self.snapshot(client.codec))
+            else:
+                for version, data in missed:
+                    for message in [data] if 'tokens' in features else comm.unbatch(data):
+                        client.send_message(['event', version, message])
+        else:
+            client.send_message(i)
+            client.send_message(self.game.tokens_center)
+            client.send_message(self.game.dices_val)
+            client.send_message([character.dump() for character in self.game.characters])
+            client.send_message(self.game.areas)
+            client.send_message(self.game.active_player)
+
+    def watch(self, client, features):
+        """
+        Called when a spectator starts watching the room
+
+        Args:
+            client (ClientHandler):
+            features (List[str]): the protocol features supported by the spectator
+
+        Returns:
+            None
+        """
+        log.info("Spectator granted", extra={'room': self.room_id})
+        if self.close_timer is not None:
+            self.close_timer.cancel()
+            self.close_timer = None
+        client.room = self
+        client.i = -1
+        client.features = features
+        self.spectators.append(client)
+        client.send_message(['welcome', -1, self.epoch])
+        client.send_frame(self.snapshot(client.codec, public=True))
+
+    def public(self, data):
+        """
+        Remove the hidden information from an event, for the spectators
+
+        The revealed character is added to the 'reveal' event, as the spectators do not know the unrevealed characters,
+        and the vision card is removed from the 'draw' event.
+
+        Args:
+            data (list): the event
+
+        Returns:
+            list: the event the spectators may see
+        """
+        if data[0] == 'reveal':
+            return data + [self.game.characters[data[1]].align, self.game.characters[data[1]].i]
+        if data[0] == 'draw' and data[2] == model.VISION:
+            return data[:3] + [-1]
+        return data
+
+    def missed_events(self, resume):
+        """
+        Get the events missed by a reconnecting client
+
+        Args:
+            resume (List[int, str, int]): the player index, room epoch and version known by the client
+
+        Returns:
+            List[Tuple[int, list]]: the missed events with their version,
+                or None if they are not kept anymore and the client needs a snapshot
+        """
+        version = resume[2]
+        if version == self.version:
+            return []
+        if not self.events or not self.events[0][0] <= version + 1 <= self.version:
+            return None
+        return list(self.events)[version + 1 - self.events[0][0]:]
+
+    def snapshot(self, codec, public=False):
+        """
+        Get the encoded snapshot of the game data, encoding it only if the state changed since the last call
+
+        Args:
+            codec (Union[Type[comm.JsonCodec], Type[comm.BinaryCodec]]):
+            public (bool): whether to hide the unrevealed characters, for the spectators
+
+        Returns:
+            memoryview: the snapshot frame
+        """
+        version, frame = self.snapshots.get((codec, public), (-1, None))
+        if version != self.version:
+            characters = [c.dump() if c.revealed or not public else [-1, -1, False, c.equipments]
+                          for c in self.game.characters]
+            frame = memoryview(comm.encode(['snapshot', self.version, self.game.tokens_center, self.game.dices_val,
+                                            characters, self.game.areas, self.game.active_player], codec))
+            self.snapshots[codec, public] = self.version, frame
+        return frame
+
+    def leave(self, client):
+        """
+        Called when a client or a spectator leaves the room,
+        the room is closed after Server.ROOM_TIMEOUT seconds once empty
+
+        Args:
+            client (ClientHandler):
+
+        Returns:
+            None
+        """
+        if client.i < 0:
+            self.spectators.remove(client)
+        elif self.clients[client.i] is client:
+            self.clients[client.i] = None
+            if self.trace is not None:
+                self.record(client.i, ['leave'])
+        client.room = None
+        if not any(self.clients) and not self.spectators:
+            self.close_timer = asyncio.get_running_loop().call_later(self.server.ROOM_TIMEOUT,
+                                                                     self.server.close_room, self.room_id)
+
+    def broadcast(self, data, exclude=(), droppable=False):
+        """
+        Send the last event to every connected client and spectator
+
+        The data is encoded once per codec in use, and stamped or not with the version for the clients supporting it,
+        and the same frame is sent to every client using that codec.
+        The spectators receive the public event, see Room.public, and a public snapshot every Room.EVENTS_SIZE events
+
+        Args:
+            data (any):
+            exclude (Iterable[ClientHandler]): the clients that should not receive the data
+            droppable (bool): whether the data may be dropped for the downgraded clients, see ClientHandler
+
+        Returns:
+            None
+        """
+        frames = {}
+        for client in list(self.clients):  # A client going over ClientHandler.MAX_QUEUE leaves the room
+            if client is not None and client not in exclude:
+                key = client.codec, 'seq' in client.features
+                if key not in frames:
+                    frames[key] = memoryview(comm.encode(['event', self.version, data] if key[1] else data,
+                                                         client.codec))
+                client.send_frame(frames[key], droppable)
+        if self.spectators:
+            public = self.public(data)
+            frames = {}
+            for client in list(self.spectators):
+                key = client.codec, 'seq' in client.features
+                if key not in frames:
+                    frames[key] = memoryview(comm.encode(['event', self.version, public] if key[1] else public,
+                                                         client.codec))
+                client.send_frame(frames[key], droppable)
+                if self.version % self.EVENTS_SIZE == 0:
+                    client.send_frame(self.snapshot(client.codec, public=True))
+
+    def broadcast_tokens(self, data, senders):
+        """
+        Send the last batch of token moves to every connected client and spectator
+
+        A client does not receive the moves of its own tokens. A client supporting the 'tokens' feature receives the
+        batch in a single frame, the others receive a 'token' message per move. The frames are encoded once per codec,
+        stamping, batching, and sender of some moves.
+
+        Args:
+            data (list): the batch, ['tokens', [[i, center], ...]]
+            senders (List[ClientHandler]): the client that moved each token of the batch
+
+        Returns:
+            None
+        """
+        frames = {}
+        for client in list(itertools.chain(self.clients, self.spectators)):  # The slow clients leave the room
+            if client is None:
+                continue
+            key = (client.codec, 'seq' in client.features, 'tokens' in client.features,
+                   client if client in senders else None)
+            if key not in frames:
+                moves = [move for move, sender in zip(data[1], senders) if sender is not client]
+                messages = [['tokens', moves]] if key[2] else comm.unbatch(['tokens', moves])
+                frames[key] = [memoryview(comm.encode(['event', self.version, message] if key[1] else message,
+                                                      client.codec)) for message in messages if moves]
+            for frame in frames[key]:
+                client.send_frame(frame, droppable=True)
+            if client.i < 0 and self.version % self.EVENTS_SIZE == 0:
+                client.send_frame(self.snapshot(client.codec, public=True))
+
+
+class Server:
+    """
+    The Server handles incoming connections by giving them a ClientHandler, and hosts the rooms.
+
+    Attributes:
+        host (str):
+        port (int):
+        rooms (Dict[str, Room]): the open rooms, by room id
+        journal_dir (str): the directory of the room journals, or None to disable the journals, see journal
+        metrics_address (str): the metrics endpoint, 'host:port' for HTTP or the path of a Unix socket, or None
+        metrics (Metrics):
+        connections (int): the number of connected clients
+        bytes_received (int): the number of bytes received from the clients
+        bytes_sent (int): the number of bytes sent to the clients
+        seed (int): the seed of the room random generators, or None to seed them randomly
+        trace_dir (str): the directory of the room traces, or None to disable the traces
+        token_tick (float): the period of the token moves broadcast, in seconds, or 0 to broadcast every move
+    """
+
+    DEFAULT_ROOM = ''
+    ROOM_TIMEOUT = 600  # Delay before closing an empty room, in seconds
+    LAG_INTERVAL = 0.25  # Period of the event loop lag measure, in seconds
+
+    def __init__(self, host, port, journal_dir=None, metrics_address=None, seed=None, trace_dir=None, token_tick=0.):
+        """
+        Args:
+            host (str):
+            port (int):
+            journal_dir (str):
+            metrics_address (str):
+            seed (int):
+            trace_dir (str):
+            token_tick (float):
+        """
+        self.host = host
+        self.port = port
+        self.rooms = {}
+        self.journal_dir = journal_dir
+        self.metrics_address = metrics_address
+        self.seed = seed
+        self.trace_dir = trace_dir
+        self.token_tick = token_tick
+        self.connections = 0
+        self.bytes_received = 0
+        self.bytes_sent = 0
+
+        self.metrics = Metrics()
+        self.metrics.describe('connections', 'gauge', "Connected clients")
+        self.metrics.describe('connections_total', 'counter', "Accepted connections")
+        self.metrics.describe('rooms', 'gauge', "Open rooms")
+        self.metrics.describe('bytes_received_total', 'counter', "Bytes received from the clients")
+        self.metrics.describe('bytes_sent_total', 'counter', "Bytes sent to the clients")
+        self.metrics.describe('frames_dropped_total', 'counter', "Token moves dropped for the downgraded clients")
+        self.metrics.describe('messages_received_total', 'counter', "Messages received, by type")
+        self.metrics.describe('handler_seconds', 'histogram', "Time spent handling a message, by type",
+                              Metrics.LATENCY_BUCKETS)
+        self.metrics.describe('room_players', 'gauge', "Connected players, by room")
+        self.metrics.describe('room_spectators', 'gauge', "Connected spectators, by room")
+        self.metrics.describe('room_messages_received_total', 'counter', "Messages received, by room")
+        self.metrics.describe('room_handler_seconds_total', 'counter', "Time spent handling messages, by room")
+        self.metrics.describe('room_events_total', 'counter', "Events broadcast, by room")
+        self.metrics.describe('room_queued_bytes', 'gauge', "Bytes waiting to be sent to the clients, by room")
+        self.metrics.describe('room_max_queued_bytes', 'gauge',
+                              "Bytes waiting to be sent to the most late client, by room")
+        self.metrics.describe('event_loop_lag_seconds', 'histogram', "Delay of the event loop timers",
+                              Metrics.LAG_BUCKETS)
+        self.metrics.collectors.append(self.collect_metrics)
+
+    def run(self, channel=None, log_config=None):
+        """
+        Runs the server until interrupted
+
+        Args:
+            channel (socket.socket): if given, the connections are received from a Supervisor on this Unix socket,
+                instead of being accepted on host and port
+            log_config (dict): if given, the arguments of start_logging, for a worker process
+
+        Returns:
+            None
+        """
+        listener = start_logging(**log_config) if log_config else None
+        try:
+            asyncio.run(self.serve() if channel is None else self.serve_channel(channel))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for room in self.rooms.values():
+                if room.journal is not None:
+                    room.journal.close()
+                if room.trace is not None:
+                    room.end_trace()
+            if listener is not None:
+                listener.stop()
+
+    async def serve(self):
+        """
+        Serves forever
+
+        Returns:
+            None
+        """
+        await self.start_monitoring()
+        server = await asyncio.get_running_loop().create_server(lambda: ClientHandler(self), self.host, self.port,
+                                                                reuse_address=True, backlog=128)
+        async with server:
+            await server.serve_forever()
+
+    async def serve_channel(self, channel):
+        """
+        Serves the connections received from a Supervisor, until the Supervisor closes the channel
+
+        Every message on the channel carries the file descriptor of an accepted connection,
+        with the bytes already received from the client, starting with a join message
+
+        Args:
+            channel (socket.socket):
+
+        Returns:
+            None
+        """
+        await self.start_monitoring()
+        loop = asyncio.get_running_loop()
+        closed = loop.create_future()
+
+        def receive():
+            data, fds, _, _ = socket.recv_fds(channel, Supervisor.MAX_PAYLOAD, 1)
+            if not fds:
+                loop.remove_reader(channel)
+                closed.set_result(None)
+                return
+            loop.create_task(self.accept(socket.socket(fileno=fds[0]), data))
+
+        channel.setblocking(False)
+        loop.add_reader(channel, receive)
+        await closed
+
+    async def accept(self, sock, data):
+        """
+        Accepts a connection handed by a Supervisor
+
+        Args:
+            sock (socket.socket): the client socket
+            data (bytes): the bytes already received from the client
+
+        Returns:
+            None
+        """
+        _, client = await asyncio.get_running_loop().connect_accepted_socket(lambda: ClientHandler(self), sock)
+        client.feed(data)
+
+    def room(self, room_id):
+        """
+        Get a room, opening it if needed
+
+        Args:
+            room_id (str):
+
+        Returns:
+            Room:
+        """
+        if room_id not in self.rooms:
+            log.info("Opening room", extra={'room': room_id})
+            self.rooms[room_id] = Room(self, room_id)
+        return self.rooms[room_id]
+
+    def close_room(self, room_id):
+        """
+        Close a room
+
+        Args:
+            room_id (str):
+
+        Returns:
+            None
+        """
+        log.info("Closing room", extra={'room': room_id})
+        room = self.rooms.pop(room_id)
+        self.metrics.forget(room=room_id)
+        if room.flush_timer is not None:
+            room.flush_timer.cancel()
+        if room.journal is not None:
+            room.journal.remove()
+        if room.trace is not None:
+            room.end_trace()
+
+    async def start_monitoring(self):
+        """
+        Starts serving the metrics and measuring the event loop lag if Server.metrics_address is set,
+        so that the loop has no periodic wakeup otherwise
+
+        Returns:
+            None
+        """
+        if self.metrics_address is None:
+            return
+        asyncio.get_running_loop().create_task(self.monitor_lag())
+        host, _, port = self.metrics_address.rpartition(':')
+        if port.isdigit():
+            await asyncio.start_server(self.serve_metrics, host or 'localhost', int(port), reuse_address=True)
+        else:
+            if os.path.exists(self.metrics_address):
+                os.remove(self.metrics_address)
+            await asyncio.start_unix_server(self.serve_metrics, self.metrics_address)
+        log.info("Serving metrics on %s", self.metrics_address)
+
+    async def monitor_lag(self):
+        """
+        Measures forever how late the event loop runs a timer
+
+        Returns:
+            None
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.LAG_INTERVAL)
+            self.metrics.observe('event_loop_lag_seconds', max(0., loop.time() - start - self.LAG_INTERVAL))
+
+    async def serve_metrics(self, reader, writer):
+        """
+        Answers an HTTP request with the metrics, whatever the request
+
+        Args:
+            reader (asyncio.StreamReader):
+            writer (asyncio.StreamWriter):
+
+        Returns:
+            None
+        """
+        try:
+            await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 5)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            writer.close()
+            return
+        body = self.metrics.render().encode()
+        writer.write(b'HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n'
+                     b'Content-Length: ' + str(len(body)).encode() + b'\r\n\r\n' + body)
+        await writer.drain()
+        writer.close()
+
+    def collect_metrics(self):
+        """
+        Updates the gauges, before the metrics are rendered
+
+        Returns:
+            None
+        """
+        self.metrics.set('connections', self.connections)
+        self.metrics.set('bytes_received_total', self.bytes_received)
+        self.metrics.set('bytes_sent_total', self.bytes_sent)
+        self.metrics.set('rooms', len(self.rooms))
+        for room_id, room in self.rooms.items():
+            players = [client for client in room.clients if client is not None]
+            clients = players + room.spectators
+            self.metrics.set('room_players', len(players), room=room_id)
+            self.metrics.set('room_spectators', len(room.spectators), room=room_id)
+            self.metrics.set('room_queued_bytes', sum(client.queued for client in clients), room=room_id)
+            self.metrics.set('room_max_queued_bytes', max((client.queued for client in clients), default=0),
+                             room=room_id)
+
+
+class HashRing:
+    """
+    Consistent hashing of the room ids on the workers
+
+    Every worker is placed on the ring at HashRing.REPLICAS pseudo-random points,
+    and a room belongs to the worker of the first point following the room hash.
+
+    Attributes:
+        points (List[int]): the sorted points
+        nodes (List[int]): the worker owning each point
+    """
+
+    REPLICAS = 64
+
+    def __init__(self, n_nodes):
+        """
+        Args:
+            n_nodes (int): the number of workers
+        """
+        ring = sorted((self.hash('{0}-{1}'.format(node, k)), node)
+                      for node in range(n_nodes) for k in range(self.REPLICAS))
+        self.points = [point for point, _ in ring]
+        self.nodes = [node for _, node in ring]
+
+    @staticmethod
+    def hash(key):
+        """
+        A hash stable across processes
+
+        Args:
+            key (str):
+
+        Returns:
+            int:
+        """
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+    def lookup(self, key):
+        """
+        Args:
+            key (str):
+
+        Returns:
+            int: the worker owning the key
+        """
+        return self.nodes[bisect.bisect(self.points, self.hash(key)) % len(self.points)]
+
+
+class Router(asyncio.BufferedProtocol):
+    """
+    Reads the join or watch message of a new connection for the Supervisor
+
+    Attributes:
+        supervisor (Supervisor):
+        transport (asyncio.Transport):
+        decoder (comm.Decoder):
+        join_timer (asyncio.TimerHandle): the timer routing the connection to the default room
+    """
+
+    def __init__(self, supervisor):
+        """
+        Args:
+            supervisor (Supervisor):
+        """
+        self.supervisor = supervisor
+        self.transport = None
+        self.decoder = comm.Decoder()
+        self.join_timer = None
+
+    def connection_made(self, transport):
+        """
+        Args:
+            transport (asyncio.Transport):
+
+        Returns:
+            None
+        """
+        self.transport = transport
+        self.join_timer = asyncio.get_running_loop().call_later(ClientHandler.JOIN_DELAY, self.route,
+                                                                ['join', Server.DEFAULT_ROOM])
+
+    def connection_lost(self, exc):
+        """
+        Args:
+            exc (Exception):
+
+        Returns:
+            None
+        """
+        self.join_timer.cancel()
+        self.transport = None
+
+    def get_buffer(self, sizehint):
+        """
+        Args:
+            sizehint (int):
+
+        Returns:
+            memoryview:
+        """
+        return self.decoder.get_buffer(sizehint)
+
+    def buffer_updated(self, nbytes):
+        """
+        Args:
+            nbytes (int):
+
+        Returns:
+            None
+        """
+        self.decoder.buffer_updated(nbytes)
+        try:
+            for msg in self.decoder.frames():
+                if isinstance(msg, list) and len(msg) > 1 and msg[0] in ('join', 'watch'):
+                    self.route(msg)
+                else:
+                    self.transport.abort()
+                break
+        except comm.FrameError:
+            self.transport.abort()
+
+    def route(self, join):
+        """
+        Hands the connection to the worker owning the room
+
+        Args:
+            join (list): the join or watch message
+
+        Returns:
+            None
+        """
+        self.join_timer.cancel()
+        if self.transport is None:
+            return
+        self.transport.pause_reading()
+        data = comm.encode(join) + self.decoder.buffer[self.decoder.start:self.decoder.end]
+        fd = os.dup(self.transport.get_extra_info('socket').fileno())
+        try:
+            self.supervisor.handoff(str(join[1]), fd, data)
+        finally:
+            os.close(fd)
+        self.transport.abort()
+
+
+class Supervisor:
+    """
+    Accepts the connections and hands them to worker processes, restarting the crashed workers
+
+    Attributes:
+        host (str):
+        port (int):
+        n_workers (int):
+        journal_dir (str): the directory of the room journals, or None
+        metrics_address (str): the metrics endpoint of the first worker, the next workers using the next ports,
+            or the same Unix socket path suffixed by their number, or None
+        seed (int): the seed of the room random generators, or None
+        trace_dir (str): the directory of the room traces, or None
+        token_tick (float): the period of the token moves broadcast, in seconds, or 0
+        ring (HashRing):
+        workers (List[multiprocessing.Process]):
+        channels (List[socket.socket]): the Unix sockets to the workers
+    """
+
+    MAX_PAYLOAD = 256 * 1024  # Maximum size of the data handed with a connection
+
+    def __init__(self, host, port, n_workers, journal_dir=None, metrics_address=None, seed=None, trace_dir=None,
+                 token_tick=0.):
+        """
+        Args:
+            host (str):
+            port (int):
+            n_workers (int):
+            journal_dir (str):
+            metrics_address (str):
+            seed (int):
+            trace_dir (str):
+            token_tick (float):
+        """
+        self.host = host
+        self.port = port
+        self.n_workers = n_workers
+        self.journal_dir = journal_dir
+        self.metrics_address = metrics_address
+        self.seed = seed
+        self.trace_dir = trace_dir
+        self.token_tick = token_tick
+        self.ring = HashRing(n_workers)
+        self.workers = n_workers * [None]
+        self.channels = n_workers * [None]
+
+    def run(self):
+        """
+        Runs the supervisor until interrupted
+
+        Returns:
+            None
+        """
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for k in range(self.n_workers):
+                if self.workers[k] is not None:
+                    self.workers[k].terminate()
+
+    async def serve(self):
+        """
+        Serves forever
+
+        Returns:
+            None
+        """
+        for k in range(self.n_workers):
+            self.spawn(k)
+        server = await asyncio.get_running_loop().create_server(lambda: Router(self), self.host, self.port,
+                                                                reuse_address=True, backlog=1024)
+        async with server:
+            await server.serve_forever()
+
+    def spawn(self, k):
+        """
+        Starts the worker k
+
+        Args:
+            k (int):
+
+        Returns:
+            None
+        """
+        metrics_address = None
+        if self.metrics_address is not None:
+            host, _, port = self.metrics_address.rpartition(':')
+            if port.isdigit():
+                metrics_address = '{0}:{1}'.format(host, int(port) + k)
+            else:
+                metrics_address = '{0}.{1}'.format(self.metrics_address, k)
+        channel, worker_channel = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        s = Server(self.host, self.port, self.journal_dir, metrics_address, self.seed, self.trace_dir, self.token_tick)
+        worker = multiprocessing.Process(target=s.run, args=(worker_channel, dict(_log_config)), daemon=True)
+        worker.start()
+        worker_channel.close()
+        self.workers[k] = worker
+        self.channels[k] = channel
+        asyncio.get_running_loop().add_reader(worker.sentinel, self.handle_exit, k)
+        log.info("Started worker %d (pid %d)", k, worker.pid)
+
+    def handle_exit(self, k):
+        """
+        Called when the worker k exits, restarts it
+
+        Args:
+            k (int):
+
+        Returns:
+            None
+        """
+        worker = self.workers[k]
+        asyncio.get_running_loop().remove_reader(worker.sentinel)
+        worker.join()
+        self.channels[k].close()
+        log.error("Worker %d exited with code %s, restarting", k, worker.exitcode)
+        self.spawn(k)
+
+    def handoff(self, room_id, fd, data):
+        """
+        Hands a connection to the worker owning the room
+
+        Args:
+            room_id (str):
+            fd (int): the file descriptor of the client socket
+            data (bytes): the bytes already received from the client, starting with a join message
+
+        Returns:
+            None
+        """
+        socket.send_fds(self.channels[self.ring.lookup(room_id)], [data], [fd])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Shadow Hunters game server")
+    parser.add_argument('--host', default='', help="the address to listen on")
+    parser.add_argument('--port', type=int, default=1616, help="the port to listen on")
+    parser.add_argument('--supervisor', action='store_true',
+                        help="shard the rooms across worker processes, see Supervisor")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="the number of worker processes in supervisor mode, defaults to the CPU count")
+    parser.add_argument('--journal', metavar='DIR',
+                        help="journal the games in this directory, to recover them after a restart")
+    parser.add_argument('--metrics', metavar='ADDRESS',
+                        help="serve the metrics on this 'host:port' or Unix socket path, in supervisor mode the worker "
+                             "k serves them on port + k or path.k")
+    parser.add_argument('--seed', type=int,
+                        help="seed the random generator of every room from this seed and the room id, defaults to "
+                             "random seeds")
+    parser.add_argument('--trace', metavar='DIR', help="record the inputs of every room in this directory, see replay")
+    parser.add_argument('--token-tick', type=float, default=25, metavar='MS',
+                        help="broadcast the last position of the tokens moved every MS milliseconds, 0 broadcasting "
+                             "every move, defaults to 25")
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help="the minimum level of the logged records, the token moves and the handled messages being "
+                             "logged at the DEBUG level")
+    parser.add_argument('--log-json', action='store_true', help="log the records as JSON lines")
+    parser.add_argument('--log-sample', type=int, default=1, metavar='N',
+                        help="log one handled message out of N, at the DEBUG level")
+    args = parser.parse_args()
+
+    log_listener = start_logging(args.log_level, args.log_json, args.log_sample)
+    try:
+        if args.supervisor:
+            Supervisor(args.host, args.port, args.workers, args.journal, args.metrics, args.seed, args.trace,
+                       args.token_tick / 1000).run()
+        else:
+            Server(args.host, args.port, args.journal, args.metrics, args.seed, args.trace,
+                   args.token_tick / 1000).run()
+    finally:
+        log_listener.stop()
@@ -0,0 +1,315 @@
+"""
+Implements the client side of the protocol, without any display
+
+A Session keeps the protocol state (player index, room epoch and version, codec) and dispatches the server messages
+to the on_* methods, that do nothing by default. It does not perform any IO: the subclasses implement
+Session.send_message, and feed the received messages to Session.handle_message.
+"""
+
+import comm
+
+
+class Session:
+    """
+    Client side of the protocol
+
+    Attributes:
+        room (str): the room on the server
+        i (int): the client index in the server, or -1 for a spectator
+        epoch (str): the room epoch, or None if the server does not send it
+        version (int): the version of the last game state or event received, or -1 if the server does not send it
+        decoder (comm.Decoder): the decoder for the messages from the server
+        codec (Union[Type[comm.JsonCodec], Type[comm.BinaryCodec]]): the codec used to send messages to the server
+    """
+
+    FEATURES = ['snapshot', 'seq', 'tokens']  # The protocol features supported by the client, see server
+
+    def __init__(self, room=''):
+        """
+        Args:
+            room (str): the room to join on the server
+        """
+        self.room = room
+        self.i = -1
+        self.epoch = None
+        self.version = -1
+        self.decoder = comm.Decoder()
+        self.codec = comm.JsonCodec
+
+    def join_message(self, resume=False):
+        """
+        Args:
+            resume (bool): whether to resume from the last received event, when reconnecting
+
+        Returns:
+            list: the join message, see server
+        """
+        if resume and self.epoch is not None:
+            return ['join', self.room, self.FEATURES, [self.i, self.epoch, self.version]]
+        return ['join', self.room, self.FEATURES]
+
+    def watch_message(self):
+        """
+        Returns:
+            list: the message to watch the room as a spectator, see server
+        """
+        return ['watch', self.room, self.FEATURES]
+
+    @staticmethod
+    def codec_message():
+        """
+        Returns:
+            list: the codec negotiation message, see comm
+        """
+        return ['codec', [codec.NAME for codec in comm.CODECS]]
+
+    def handle_welcome(self, msg):
+        """
+        Handles the first message from the server
+
+        Args:
+            msg (any):
+
+        Returns:
+            bool: False if the server denied the connection or does not support snapshots
+        """
+        if isinstance(msg, list) and msg[0] == 'welcome':
+            self.i = msg[1]
+            self.epoch = msg[2] if len(msg) > 2 else None
+            return True
+        return False
+
+    def handle_message(self, msg):
+        """
+        Handles a message from the server
+
+        Args:
+            msg (list):
+
+        Returns:
+            None
+        """
+        if msg[0] == 'token':
+            self.on_token(msg[1], msg[2])
+        elif msg[0] == 'tokens':
+            for i, center in msg[1]:
+                self.on_token(i, center)
+        elif msg[0] == 'dices':
+            self.on_dices(msg[1])
+        elif msg[0] == 'reveal':
+            self.on_reveal(msg[1], msg[2:] or None)
+        elif msg[0] == 'turn':
+            self.on_turn(msg[1])
+        elif msg[0] == 'draw':
+            self.on_draw(msg[1], msg[2], msg[3])
+        elif msg[0] == 'vision':
+            self.on_vision(msg[1], msg[2])
+        elif msg[0] == 'take':
+            self.on_take(msg[1], msg[2], msg[3])
+        elif msg[0] == 'event':
+            self.version = msg[1]
+            self.handle_message(msg[2])
+        elif msg[0] == 'snapshot':
+            self.version = msg[1]
+            self.on_snapshot(*msg[2:])
+        elif msg[0] == 'codec':
+            self.codec = comm.negotiate([msg[1]])
+        else:
+            print(msg)
+
+    def on_token(self, i, center):
+        """
+        Called when a player moved the token i
+
+        Args:
+            i (int):
+            center (List[float, float]):
+
+        Returns:
+            None
+        """
+        pass
+
+    def on_dices(self, dices_val):
+        """
+        Called when a player rolled the dices
+
+        Args:
+            dices_val (List[int]): the dice 4 and dice 6 values, in this order
+
+        Returns:
+            None
+        """
+        pass
+
+    def on_reveal(self, i, character=None):
+        """
+        Called when the player i revealed its character
+
+        Args:
+            i (int):
+            character (List[int, int]): the alignment and index of the character, only sent to the spectators
+
+        Returns:
+            None
+        """
+        pass
+
+    def on_turn(self, active_player):
+        """
+        Called when a player ended its turn
+
+        Args:
+            active_player (int): the new active player
+
+        Returns:
+            None
+        """
+        pass
+
+    def on_draw(self, i_player, i_type, i_card):
+        """
+        Called when the player i_player draws the card i_card from pile i_type
+
+        Args:
+            i_player (int):
+            i_type (int):
+            i_card (int):
+
+        Returns:
+            None
+        """
+        pass
+
+    def on_vision(self, i_card, i_from):
+        """
+        Called when the player i_from gives the vision i_card
+
+        Args:
+            i_card (int):
+            i_from (int):
+
+        Returns:
+            None
+        """
+        pass
+
+    def on_take(self, i_player, i_from, i_equipment):
+        """
+        Called when the player i_player takes the equipment i_equipment of player i_from
+
+        Args:
+            i_player (int):
+            i_from (int):
+            i_equipment (int):
+
+        Returns:
+            None
+        """
+        pass
+
+    def on_snapshot(self, tokens_center, dices_val, characters, areas, active_player):
+        """
+        Called when the server sends the whole game state
+
+        Args:
+            tokens_center (List[Tuple[float, float]]):
+            dices_val (List[int]):
+            characters (List[List[int, int, bool, List[Tuple[int, int]]]]):
+            areas (List[int]):
+            active_player (int):
+
+        Returns:
+            None
+        """
+        pass
+
+    def send_message(self, data):
+        """
+        Send some data to the server, with the negotiated codec
+
+        Args:
+            data (any):
+
+        Returns:
+            None
+        """
+        raise NotImplementedError
+
+    def move_token(self, i, center):
+        """
+        Send the coordinates of the token i
+
+        Args:
+            i (int):
+            center (Tuple[float, float]):
+
+        Returns:
+            None
+        """
+        self.send_message(['token', i, center])
+
+    def roll_dice(self):
+        """
+        Ask for a dice roll
+
+        Returns:
+            None
+        """
+        self.send_message(['dices'])
+
+    def reveal(self):
+        """
+        Ask to reveal the character
+
+        Returns:
+            None
+        """
+        self.send_message(['reveal'])
+
+    def end_turn(self):
+        """
+        Ask to end the turn
+
+        Returns:
+            None
+        """
+        self.send_message(['turn'])
+
+    def draw(self, i):
+        """
+        Ask to draw a card from pile i
+
+        Args:
+            i (int):
+
+        Returns:
+            None
+        """
+        self.send_message(['draw', i])
+
+    def send_vision(self, i_vision, i_player):
+        """
+        Send the vision i_vision to the player i_player
+
+        Args:
+            i_vision (int):
+            i_player (int):
+
+        Returns:
+            None
+        """
+        self.send_message(['vision', i_vision, i_player])
+
+    def take_equipment(self, i_player, i_equipment):
+        """
+        Ask to take the equipment i_equipment of player i_player
+
+        Args:
+            i_player (int):
+            i_equipment (int):
+
+        Returns:
+            None
+        """
+        self.send_message(['take', i_player, i_equipment])